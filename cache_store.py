@@ -0,0 +1,542 @@
+# cache_store.py
+# SQLite store for cached results and stage outputs, shared by every worker process
+import os
+import json
+import time
+import zlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+
+from logging_utils import setup_logger, log_warning
+from version import VERSION
+
+logger = setup_logger("cache_store")
+
+# Writes are held back and committed together, at most this many per transaction
+WRITE_BATCH_SIZE = 32
+# How long a writer waits for another process's transaction before giving up
+BUSY_TIMEOUT_SECONDS = 30
+# zlib level for stored payloads; OCR text typically shrinks to a quarter
+COMPRESSION_LEVEL = 6
+# Compressed payloads kept in memory so a rerun in the same session does not read the database
+MEMORY_CACHE_BYTES = 64 * 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    document_key TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    status TEXT,
+    filename TEXT,
+    payload TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    accessed_at REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (document_key, fingerprint)
+);
+CREATE INDEX IF NOT EXISTS results_status ON results (status);
+CREATE INDEX IF NOT EXISTS results_fingerprint ON results (fingerprint);
+CREATE INDEX IF NOT EXISTS results_filename ON results (filename);
+CREATE TABLE IF NOT EXISTS stages (
+    stage TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    document_key TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    accessed_at REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (stage, version, document_key)
+);
+CREATE TABLE IF NOT EXISTS pages (
+    page_key TEXT NOT NULL PRIMARY KEY,
+    payload TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    accessed_at REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS failures (
+    document_key TEXT NOT NULL PRIMARY KEY,
+    payload TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    accessed_at REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS digests (
+    path TEXT NOT NULL PRIMARY KEY,
+    payload TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    accessed_at REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed_at);
+CREATE INDEX IF NOT EXISTS stages_accessed ON stages (accessed_at);
+CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed_at);
+"""
+
+_TABLES = ("results", "stages", "pages", "failures", "digests")
+_KEY_COLUMNS = {
+    "results": ("document_key", "fingerprint"),
+    "stages": ("stage", "version", "document_key"),
+    "pages": ("page_key",),
+    "failures": ("document_key",),
+    "digests": ("path",),
+}
+# Why a result lookup missed
+MISS_NEW = "new"
+MISS_CHANGED = "changed"
+MISS_PATTERN_CHANGE = "pattern change"
+MISS_CORRUPT = "corrupt"
+MISS_FORCED = "re-run"
+MISS_UNREADABLE = "unreadable"
+
+# Every row ends with (payload, updated_at, accessed_at)
+_COLUMNS = {
+    "results": ("document_key", "fingerprint", "status", "filename", "payload", "updated_at", "accessed_at"),
+    "stages": ("stage", "version", "document_key", "payload", "updated_at", "accessed_at"),
+    "pages": ("page_key", "payload", "updated_at", "accessed_at"),
+    "failures": ("document_key", "payload", "updated_at", "accessed_at"),
+    "digests": ("path", "payload", "updated_at", "accessed_at"),
+}
+
+# Bundles carry only what depends on nothing but the PDFs themselves: extracted text and page OCR
+BUNDLE_FORMAT = "kyo-qa-cache-bundle"
+BUNDLE_VERSION = 1
+_BUNDLE_TABLES = ("stages", "pages")
+
+
+def _encode(value) -> bytes:
+    return zlib.compress(json.dumps(value).encode("utf-8"), COMPRESSION_LEVEL)
+
+
+def _decode(payload):
+    """Payloads are zlib-compressed JSON; plain JSON text is still read from older databases."""
+    if isinstance(payload, bytes):
+        payload = zlib.decompress(payload).decode("utf-8")
+    return json.loads(payload)
+
+
+def _bump_generation(conn) -> int:
+    """Tells every process using the database to drop its in-memory copies; call inside the deleting transaction."""
+    generation = conn.execute("PRAGMA user_version").fetchone()[0] + 1
+    conn.execute(f"PRAGMA user_version = {generation}")
+    return generation
+
+
+class CacheStore:
+    """One SQLite database in WAL mode holding cached results, stage outputs and OCR text of page images.
+
+    Each process opens its own connection on first use, so the store can be
+    created at import time and shared by pool workers. Writes are buffered
+    and committed in one transaction when ``batch_size`` of them are waiting
+    or ``flush`` is called; buffered entries are already visible to ``get``
+    calls in the same process. A database that cannot be read or written is
+    logged and treated as a cache miss, never as a processing error.
+
+    Payloads are stored zlib-compressed and only decompressed by the ``get``
+    that needs them: a cached result is served without ever inflating the
+    document's text, which is only read back for a re-harvest.
+
+    Payloads read or written recently are also kept in memory, least recently
+    used first out once they pass ``memory_bytes``. The store lives as long as
+    its process, so a rerun in the same session is served from memory. Every
+    delete bumps the database's ``user_version``. ``refresh`` compares it
+    once per work unit or job and drops the in-memory copies when another
+    process deleted entries, so a hit in memory never touches the database.
+    """
+
+    def __init__(self, db_path, batch_size: int = WRITE_BATCH_SIZE, memory_bytes: int = MEMORY_CACHE_BYTES):
+        self.db_path = Path(db_path)
+        self.batch_size = max(1, batch_size)
+        self.memory_bytes = memory_bytes
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._generation = None
+        self._lock = threading.RLock()
+        self._conn = None
+        self._pid = None
+        self._pending = {table: {} for table in _TABLES}
+        # Keys read since the last flush; their access time is bumped with the next write
+        self._touched = {table: set() for table in _TABLES}
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            # A connection must never be used across a fork; start afresh in a new process
+            self._pending = {table: {} for table in _TABLES}
+            self._touched = {table: set() for table in _TABLES}
+            self._conn, self._pid = self._open(), os.getpid()
+            self._generation = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        return self._conn
+
+    def _open(self) -> sqlite3.Connection:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_SECONDS, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        for table in _TABLES:
+            columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if columns and "accessed_at" not in columns:
+                # Databases written before eviction existed
+                with conn:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN accessed_at REAL NOT NULL DEFAULT 0")
+                    conn.execute(f"UPDATE {table} SET accessed_at = updated_at")
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def _remember(self, table: str, key: tuple, payload):
+        old = self._memory.pop((table, key), None)
+        if old is not None:
+            self._memory_size -= len(old)
+        if len(payload) > self.memory_bytes:
+            return
+        self._memory[(table, key)] = payload
+        self._memory_size += len(payload)
+        while self._memory_size > self.memory_bytes:
+            _, dropped = self._memory.popitem(last=False)
+            self._memory_size -= len(dropped)
+
+    def _forget(self):
+        self._memory.clear()
+        self._memory_size = 0
+
+    def refresh(self):
+        """Drops the in-memory copies if any process deleted cache entries since the last check."""
+        with self._lock:
+            try:
+                generation = self._connection().execute("PRAGMA user_version").fetchone()[0]
+            except sqlite3.Error:
+                generation = None
+            if generation != self._generation:
+                self._forget()
+                self._generation = generation
+
+    def _recall(self, table: str, key: tuple):
+        payload = self._memory.get((table, key))
+        if payload is not None:
+            self._memory.move_to_end((table, key))
+            self._touched[table].add(key)
+        return payload
+
+    def _fetch_payload(self, table: str, key: tuple):
+        where = " AND ".join(f"{column} = ?" for column in _KEY_COLUMNS[table])
+        try:
+            row = self._connection().execute(f"SELECT payload FROM {table} WHERE {where}", key).fetchone()
+        except sqlite3.Error as e:
+            log_warning(logger, f"Cache lookup failed in {self.db_path.name}: {e}")
+            return None
+        if row is None:
+            return None
+        try:
+            payload = _decode(row[0])
+        except (zlib.error, UnicodeDecodeError, json.JSONDecodeError):
+            return None
+        self._touched[table].add(key)
+        self._remember(table, key, row[0])
+        return payload
+
+    def _get(self, table: str, key: tuple):
+        with self._lock:
+            pending = self._pending[table].get(key)
+            if pending is not None:
+                return _decode(pending[-3])
+            payload = self._recall(table, key)
+            if payload is not None:
+                return _decode(payload)
+            return self._fetch_payload(table, key)
+
+    def _put(self, table: str, key: tuple, extra: tuple, value):
+        now = time.time()
+        with self._lock:
+            payload = _encode(value)
+            self._pending[table][key] = (*key, *extra, payload, now, now)
+            self._remember(table, key, payload)
+            if sum(len(rows) for rows in self._pending.values()) >= self.batch_size:
+                self.flush()
+
+    def get_result(self, document_key: str, fingerprint: str):
+        """Returns the cached result for a document under the given fingerprint, or None."""
+        return self._get("results", (document_key, fingerprint))
+
+    def lookup_result(self, document_key: str, fingerprint: str, filename: str = None) -> tuple:
+        """Returns (result, None) on a hit, or (None, reason) saying why there was no usable result.
+
+        The reason is MISS_PATTERN_CHANGE when the document is cached under
+        another fingerprint, MISS_CHANGED when a file of the same name was
+        cached with other content, MISS_CORRUPT when the entry cannot be
+        decoded, and MISS_NEW otherwise.
+        """
+        with self._lock:
+            key = (document_key, fingerprint)
+            pending = self._pending["results"].get(key)
+            try:
+                if pending is not None:
+                    return _decode(pending[-3]), None
+                payload = self._recall("results", key)
+                if payload is not None:
+                    return _decode(payload), None
+                row = self._connection().execute("SELECT payload FROM results WHERE document_key = ? AND fingerprint = ?", key).fetchone()
+                if row is not None:
+                    try:
+                        result = _decode(row[0])
+                    except (zlib.error, UnicodeDecodeError, json.JSONDecodeError):
+                        return None, MISS_CORRUPT
+                    self._touched["results"].add(key)
+                    self._remember("results", key, row[0])
+                    return result, None
+                conn = self._connection()
+                if conn.execute("SELECT 1 FROM results WHERE document_key = ? LIMIT 1", (document_key,)).fetchone():
+                    return None, MISS_PATTERN_CHANGE
+                if filename and conn.execute("SELECT 1 FROM results WHERE filename = ? LIMIT 1", (filename,)).fetchone():
+                    return None, MISS_CHANGED
+            except sqlite3.Error as e:
+                log_warning(logger, f"Cache lookup failed in {self.db_path.name}: {e}")
+                return None, MISS_CORRUPT
+            return None, MISS_NEW
+
+    def put_result(self, document_key: str, fingerprint: str, result: dict):
+        self._put("results", (document_key, fingerprint), (result.get("status"), result.get("filename")), result)
+
+    def get_stage(self, stage: str, version: int | str, document_key: str):
+        return self._get("stages", (stage, version, document_key))
+
+    def put_stage(self, stage: str, version: int | str, document_key: str, outputs: dict):
+        self._put("stages", (stage, version, document_key), (), outputs)
+
+    def get_page_text(self, page_key: str):
+        """Returns the OCR text of a page image seen before in any document, or None."""
+        return self._get("pages", (page_key,))
+
+    def put_page_text(self, page_key: str, text: str):
+        self._put("pages", (page_key,), (), text)
+
+    def get_failure(self, document_key: str):
+        """Returns what was recorded when this exact content could not be read, or None."""
+        return self._get("failures", (document_key,))
+
+    def put_failure(self, document_key: str, failure: dict):
+        self._put("failures", (document_key,), (), failure)
+
+    def get_digest(self, path: str, stamp: tuple):
+        """Returns the content hash recorded for ``path`` while its (mtime_ns, size, inode) was ``stamp``, or None."""
+        memo = self._get("digests", (path,))
+        if memo is None or tuple(memo["stamp"]) != tuple(stamp):
+            return None
+        return memo["digest"]
+
+    def put_digest(self, path: str, stamp: tuple, digest: str):
+        self._put("digests", (path,), (), {"stamp": list(stamp), "digest": digest})
+
+    def clear_failures(self) -> int:
+        """Forgets every known-bad document, and its cached result, so the next job tries them again."""
+        self._delete("DELETE FROM results WHERE document_key IN (SELECT document_key FROM failures)")
+        return self._delete("DELETE FROM failures")
+
+    def flush(self):
+        """Commits every buffered write, and the access times of entries read since, in a single transaction."""
+        with self._lock:
+            touched = {table: keys for table, keys in self._touched.items() if keys}
+            pending = {table: list(rows.values()) for table, rows in self._pending.items() if rows}
+            if not pending and not touched:
+                return
+            self._pending = {table: {} for table in _TABLES}
+            self._touched = {table: set() for table in _TABLES}
+            now = time.time()
+            try:
+                conn = self._connection()
+                with conn:
+                    for table, rows in pending.items():
+                        placeholders = ", ".join("?" * len(_COLUMNS[table]))
+                        conn.executemany(f"INSERT OR REPLACE INTO {table} VALUES ({placeholders})", rows)
+                    for table, keys in touched.items():
+                        where = " AND ".join(f"{column} = ?" for column in _KEY_COLUMNS[table])
+                        conn.executemany(f"UPDATE {table} SET accessed_at = ? WHERE {where}", [(now, *key) for key in keys])
+                    # A result hit skips the pipeline, so keep the document's extracted text just as fresh
+                    conn.executemany("UPDATE stages SET accessed_at = ? WHERE document_key = ?", {(now, key[0]) for key in touched.get("results", ())})
+            except sqlite3.Error as e:
+                log_warning(logger, f"Could not write {sum(len(rows) for rows in pending.values())} cache entries to {self.db_path.name}: {e}")
+
+    def _delete(self, sql: str, params: tuple = ()) -> int:
+        with self._lock:
+            self.flush()
+            try:
+                conn = self._connection()
+                with conn:
+                    count = conn.execute(sql, params).rowcount
+                    self._generation = _bump_generation(conn)
+                self._forget()
+                return count
+            except sqlite3.Error as e:
+                log_warning(logger, f"Could not invalidate cache entries in {self.db_path.name}: {e}")
+                return 0
+
+    def invalidate(self, status: str = None, fingerprint: str = None) -> int:
+        """Deletes cached results with the given status and/or fingerprint; returns how many went."""
+        clauses, params = [], []
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        if fingerprint is not None:
+            clauses.append("fingerprint = ?")
+            params.append(fingerprint)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._delete(f"DELETE FROM results{where}", tuple(params))
+
+    def invalidate_stale(self, current_fingerprint: str) -> int:
+        """Deletes results cached under any fingerprint other than the current one."""
+        return self._delete("DELETE FROM results WHERE fingerprint != ?", (current_fingerprint,))
+
+    def clear_results(self) -> int:
+        return self.invalidate()
+
+    def evict(self, max_bytes: int = None, ttl_seconds: float = None) -> tuple:
+        """Removes expired entries, then least recently used ones until the cache fits ``max_bytes``.
+
+        Results, extracted text and page OCR are ranked together by last access, so text
+        that keeps being reused outlives documents that were seen once. Runs
+        on its own connection, so it can be called from a background thread
+        while the store is in use. Returns (entries removed, bytes freed).
+        """
+        removed = freed = 0
+        try:
+            conn = self._open()
+        except sqlite3.Error as e:
+            log_warning(logger, f"Could not open {self.db_path.name} for eviction: {e}")
+            return removed, freed
+        try:
+            with conn:
+                if ttl_seconds:
+                    cutoff = time.time() - ttl_seconds
+                    for table in _TABLES:
+                        count, size = conn.execute(f"SELECT COUNT(*), COALESCE(SUM(length(payload)), 0) FROM {table} WHERE accessed_at < ?", (cutoff,)).fetchone()
+                        conn.execute(f"DELETE FROM {table} WHERE accessed_at < ?", (cutoff,))
+                        removed += count
+                        freed += size
+                    if removed:
+                        _bump_generation(conn)
+            if max_bytes is None:
+                return removed, freed
+            total = sum(conn.execute(f"SELECT COALESCE(SUM(length(payload)), 0) FROM {table}").fetchone()[0] for table in _TABLES)
+            if total <= max_bytes:
+                return removed, freed
+            entries = conn.execute(
+                " UNION ALL ".join(f"SELECT '{table}', rowid, length(payload), accessed_at AS used FROM {table}" for table in _TABLES) + " ORDER BY used"
+            ).fetchall()
+            doomed = {table: [] for table in _TABLES}
+            for table, rowid, size, _ in entries:
+                if total <= max_bytes:
+                    break
+                doomed[table].append((rowid,))
+                total -= size
+                freed += size
+                removed += 1
+            with conn:
+                for table, rowids in doomed.items():
+                    conn.executemany(f"DELETE FROM {table} WHERE rowid = ?", rowids)
+                _bump_generation(conn)
+        except sqlite3.Error as e:
+            log_warning(logger, f"Cache eviction failed in {self.db_path.name}: {e}")
+        finally:
+            conn.close()
+            if removed:
+                # This process's in-memory copies of evicted entries go too
+                self.refresh()
+        return removed, freed
+
+    def evict_in_background(self, max_bytes: int = None, ttl_seconds: float = None) -> threading.Thread:
+        thread = threading.Thread(target=self.evict, args=(max_bytes, ttl_seconds), name="cache-eviction", daemon=True)
+        thread.start()
+        return thread
+
+    def compact(self, max_bytes: int = None, ttl_seconds: float = None) -> tuple:
+        """Evicts, then rewrites the database file so the freed space goes back to the disk."""
+        self.flush()
+        removed, freed = self.evict(max_bytes, ttl_seconds)
+        conn = self._open()
+        try:
+            conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        finally:
+            conn.close()
+        return removed, freed
+
+    def export_bundle(self, bundle_path) -> int:
+        """Writes the cached text and page OCR to a single portable file; returns how many entries it holds.
+
+        Results are left out: they depend on this machine's patterns and
+        point at its review files.
+        """
+        bundle_path = Path(bundle_path)
+        self.flush()
+        if bundle_path.exists():
+            bundle_path.unlink()
+        bundle = sqlite3.connect(bundle_path)
+        try:
+            with bundle:
+                bundle.executescript(_SCHEMA)
+                bundle.execute("CREATE TABLE bundle_info (key TEXT PRIMARY KEY, value TEXT)")
+                bundle.executemany("INSERT INTO bundle_info VALUES (?, ?)", [
+                    ("format", BUNDLE_FORMAT),
+                    ("format_version", str(BUNDLE_VERSION)),
+                    ("tool_version", VERSION),
+                    ("created", datetime.now().isoformat(timespec="seconds")),
+                ])
+        finally:
+            bundle.close()
+        return self._copy_with_bundle(bundle_path, "INSERT INTO bundle.{table} SELECT * FROM main.{table}")
+
+    def import_bundle(self, bundle_path) -> int:
+        """Merges a bundle from export_bundle into this cache and returns how many entries were new.
+
+        Entries already cached here win, so importing the same bundle twice,
+        or bundles that overlap, adds nothing twice. Imported entries count
+        as just used, so eviction does not drop them straight away.
+        """
+        bundle_path = Path(bundle_path)
+        try:
+            check = sqlite3.connect(f"{bundle_path.resolve().as_uri()}?mode=ro", uri=True)
+            try:
+                info = dict(check.execute("SELECT key, value FROM bundle_info").fetchall())
+            finally:
+                check.close()
+        except sqlite3.Error:
+            info = {}
+        if info.get("format") != BUNDLE_FORMAT:
+            raise ValueError(f"{bundle_path.name} is not a cache bundle.")
+        if int(info.get("format_version", 0)) > BUNDLE_VERSION:
+            raise ValueError(f"{bundle_path.name} was written by a newer version of the tool ({info.get('tool_version')}).")
+        self.flush()
+        return self._copy_with_bundle(bundle_path, "INSERT OR IGNORE INTO main.{table} ({columns}) SELECT {imported} FROM bundle.{table}")
+
+    def _copy_with_bundle(self, bundle_path: Path, statement: str) -> int:
+        copied = 0
+        conn = self._open()
+        try:
+            conn.execute("ATTACH DATABASE ? AS bundle", (str(bundle_path),))
+            with conn:
+                for table in _BUNDLE_TABLES:
+                    columns = _COLUMNS[table]
+                    imported = ", ".join((*columns[:-1], str(time.time())))
+                    copied += conn.execute(statement.format(table=table, columns=", ".join(columns), imported=imported)).rowcount
+            conn.execute("DETACH DATABASE bundle")
+        finally:
+            conn.close()
+        return copied
+
+    def size_on_disk(self) -> int:
+        return sum(path.stat().st_size for path in (self.db_path, self.db_path.with_name(self.db_path.name + "-wal")) if path.exists())
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self.flush()
+                self._conn.close()
+            self._conn = self._pid = None
+
+
+class StoreStageCache:
+    """Adapts a CacheStore to the ``get``/``put`` interface the pipeline expects of a stage cache."""
+
+    def __init__(self, store: CacheStore):
+        self.store = store
+
+    def get(self, stage, document_key: str):
+        return self.store.get_stage(stage.name, stage.version, document_key)
+
+    def put(self, stage, document_key: str, outputs: dict):
+        self.store.put_stage(stage.name, stage.version, document_key, outputs)
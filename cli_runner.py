@@ -3,9 +3,11 @@ import argparse
 from datetime import datetime
 from pathlib import Path
 
-from processing_engine import process_folder, process_zip_archive
+from config import OUTPUT_DIR
+from processing_engine import CACHE_STORE, cache_budget, process_folder, process_zip_archive, merge_partial_results
 from logging_utils import setup_logger
 from file_utils import ensure_folders
+from sharding import parse_shard
 
 logger = setup_logger("cli")
 
@@ -20,30 +22,128 @@ def main():
     parser.add_argument("--folder", help="Path to folder of PDFs")
     parser.add_argument("--zip", help="Path to a zip file of PDFs")
     parser.add_argument("--excel", help="Path to existing Excel template")
+    parser.add_argument("--shard", help="Process only shard i of N (e.g. 2/4) and write partial results instead of a workbook")
+    parser.add_argument("--partial-out", help="Where to write the shard's partial results (default: output/partial_<i>_of_<N>.json)")
+    parser.add_argument("--merge", nargs="+", metavar="PARTIAL", help="Apply partial results files to a clone of --excel")
+    parser.add_argument("--compact-cache", action="store_true", help="Evict expired and least recently used cache entries, then shrink the cache file")
+    parser.add_argument("--warm-cache", metavar="FOLDER", help="Extract and OCR a folder's PDFs into the cache at low priority, without touching any workbook")
+    parser.add_argument("--export-cache", metavar="BUNDLE", help="Write the cached text and page OCR to a bundle file for another workstation")
+    parser.add_argument("--import-cache", nargs="+", metavar="BUNDLE", help="Merge cache bundles from other workstations into this one")
+    parser.add_argument("--retry-failed", action="store_true", help="Process PDFs again that earlier runs found corrupt, locked or blank")
     args = parser.parse_args()
 
     # Ensure required output folders exist before processing
     ensure_folders()
 
+    if args.compact_cache:
+        compact_cache()
+        return
+
+    if args.warm_cache:
+        warm_cache(args.warm_cache)
+        return
+
+    if args.export_cache:
+        count = CACHE_STORE.export_bundle(args.export_cache)
+        print(f"Exported {count} cache entr{'y' if count == 1 else 'ies'} to: {args.export_cache}")
+        return
+
+    if args.import_cache:
+        import_cache(args.import_cache)
+        return
+
+    if args.shard:
+        run_shard(args)
+        return
+
     if not args.excel or not Path(args.excel).exists():
         print("\nERROR: You must provide a valid Excel file using --excel\n")
         return
 
+    if args.merge:
+        print(f"Merging {len(args.merge)} partial result file(s) into a copy of: {args.excel}")
+        status = merge_partial_results(args.merge, args.excel, print, print, print, print, lambda: False)
+        print(f"\nMerge finished. Status: {status}")
+        return
+
     output_excel = timestamped_copy(args.excel)
     Path(args.excel).rename(output_excel)
     print(f"Using working copy: {output_excel}")
+    job_options = {"retry_failed": True} if args.retry_failed else {}
 
     if args.folder:
         print(f"Processing folder: {args.folder}")
-        process_folder(args.folder, output_excel, print, print, print, print, lambda: False)
+        process_folder(args.folder, output_excel, print, print, print, print, lambda: False, **job_options)
     elif args.zip:
         print(f"Processing zip archive: {args.zip}")
-        process_zip_archive(args.zip, output_excel, print, print, print, print, lambda: False)
+        process_zip_archive(args.zip, output_excel, print, print, print, print, lambda: False, **job_options)
     else:
         print("\nERROR: You must specify either --folder or --zip\n")
         return
 
     print("\n✅ Done. Updated Excel saved to:", output_excel)
 
+def compact_cache():
+    """Applies the configured cache budget now and returns the freed space to the disk."""
+    before = CACHE_STORE.size_on_disk()
+    removed, _ = CACHE_STORE.compact(*cache_budget())
+    after = CACHE_STORE.size_on_disk()
+    print(f"Cache compacted: {removed} entr{'y' if removed == 1 else 'ies'} evicted, {before / 1048576:.1f} MB -> {after / 1048576:.1f} MB")
+
+def warm_cache(folder):
+    """Fills the text cache for every PDF in ``folder`` on low-priority workers; safe to stop and rerun."""
+    from worker_pool import WorkerPool, lower_process_priority, warm_pdf_batch
+
+    folder = Path(folder)
+    if not folder.is_dir():
+        print(f"\nERROR: Folder not found: {folder}\n")
+        return
+    pdf_files = sorted(f for f in folder.iterdir() if f.suffix.lower() == ".pdf")
+    print(f"Warming the cache for {len(pdf_files)} PDF(s) in: {folder}")
+    lower_process_priority()
+    pool = WorkerPool(low_priority=True)
+    counts = {}
+    try:
+        for i, (outcome, _) in enumerate(pool.imap_pdfs(pdf_files, task=warm_pdf_batch), start=1):
+            counts[outcome["status"]] = counts.get(outcome["status"], 0) + 1
+            print(f"[{i}/{len(pdf_files)}] {outcome['filename']}: {outcome['status']}")
+    except KeyboardInterrupt:
+        print("\nWarm-up interrupted; run the same command again to resume.")
+    finally:
+        pool.shutdown(wait=True)
+    print("\nWarm-up finished: " + ", ".join(f"{count} {status.lower()}" for status, count in sorted(counts.items())))
+
+def import_cache(bundle_paths):
+    """Merges each bundle into the local cache, skipping entries that are already here."""
+    for bundle_path in bundle_paths:
+        try:
+            added = CACHE_STORE.import_bundle(bundle_path)
+        except (OSError, ValueError) as e:
+            print(f"\nERROR: Could not import {bundle_path}: {e}\n")
+            continue
+        print(f"Imported {added} new cache entr{'y' if added == 1 else 'ies'} from: {bundle_path}")
+
+def run_shard(args):
+    """Processes one shard of the input and writes a portable partial results file."""
+    try:
+        index, count = parse_shard(args.shard)
+    except ValueError as e:
+        print(f"\nERROR: {e}\n")
+        return
+    partial_out = Path(args.partial_out) if args.partial_out else OUTPUT_DIR / f"partial_{index}_of_{count}.json"
+    job_options = {"shard": (index, count), "partial_results_path": partial_out, "retry_failed": args.retry_failed}
+
+    if args.folder:
+        print(f"Processing shard {index}/{count} of folder: {args.folder}")
+        status = process_folder(args.folder, None, print, print, print, print, lambda: False, **job_options)
+    elif args.zip:
+        print(f"Processing shard {index}/{count} of zip archive: {args.zip}")
+        status = process_zip_archive(args.zip, None, print, print, print, print, lambda: False, **job_options)
+    else:
+        print("\nERROR: You must specify either --folder or --zip\n")
+        return
+
+    print(f"\nShard finished. Status: {status}. Partial results: {partial_out}")
+
 if __name__ == "__main__":
     main()
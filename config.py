@@ -5,6 +5,27 @@ from pathlib import Path
 BASE_DIR = Path(__file__).parent
 OUTPUT_DIR = BASE_DIR / "output"
 PDF_TXT_DIR = BASE_DIR / "review_files"
+CACHE_DIR = BASE_DIR / ".cache"
+CACHE_DB_PATH = CACHE_DIR / "cache.sqlite3"
+
+# Cache budget: least recently used entries are evicted once cached data passes
+# CACHE_MAX_MB, and entries unused for CACHE_TTL_DAYS are dropped (0 keeps them forever)
+CACHE_MAX_MB = 1024
+CACHE_TTL_DAYS = 0
+# Recently used cache entries each engine and worker process keeps in memory across jobs
+CACHE_MEMORY_MB = 64
+
+# Scanned pages are OCR'd at the first DPI and rendered again at the next one only while
+# Tesseract's mean word confidence (0-100) stays below OCR_MIN_CONFIDENCE
+OCR_DPI_LADDER = (150, 300)
+OCR_MIN_CONFIDENCE = 80
+# OCR only a scanned page's header block and ruled tables when OpenCV finds them
+OCR_LAYOUT_REGIONS = True
+# Clean-up applied to each rendered page before OCR (see image_preprocessing.py)
+OCR_TRIM_MARGINS = True
+OCR_DENOISE = True
+OCR_DESKEW = True
+OCR_BINARIZE = True
 
 # Column name for models/metadata in Excel sheet
 # This is the column where model information will be stored
@@ -22,4 +22,8 @@ class PatternMatchError(KYOQAToolError):
 
 class ConfigurationError(KYOQAToolError):
     """Raised when there's a configuration issue."""
+    pass
+
+class ProcessingCancelled(KYOQAToolError):
+    """Raised inside a job when the user cancels it."""
     pass
\ No newline at end of file
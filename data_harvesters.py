@@ -1,7 +1,10 @@
 # data_harvesters.py
+import hashlib
 import logging
 import pandas as pd
 import re
+import runpy
+from pathlib import Path
 
 logger = logging.getLogger(__name__)
 KNOWLEDGE_BASE_FIELDS = ['number', 'short_description', 'kb_knowledge_base']
@@ -48,6 +51,68 @@ QA_NUMBER_PATTERNS = [
     # Add any other QA number patterns here
 ]
 
+AUTHOR_PATTERN = r'(?:Author|Written by|Prepared by|Created by)[:\s]+([A-Z][a-z]+ [A-Z][a-z]+)'
+
+def compile_patterns(patterns, flags=re.IGNORECASE):
+    """Compile a list of regex strings once so repeated harvests reuse them."""
+    return tuple(re.compile(pattern, flags) for pattern in patterns)
+
+# Compiled at import time so warm worker processes pay this cost only once
+COMPILED_MODEL_PATTERNS = compile_patterns(MODEL_PATTERNS)
+COMPILED_QA_NUMBER_PATTERNS = compile_patterns(QA_NUMBER_PATTERNS)
+COMPILED_AUTHOR_PATTERN = re.compile(AUTHOR_PATTERN)
+
+# Written by the Review window; relative to the working directory like the window itself
+CUSTOM_PATTERNS_PATH = Path("custom_patterns.py")
+_custom_patterns = {"stamp": None, "MODEL_PATTERNS": (), "QA_NUMBER_PATTERNS": ()}
+
+def _compile_custom(patterns):
+    compiled = []
+    for pattern in patterns:
+        try:
+            compiled.append(re.compile(pattern, re.IGNORECASE))
+        except re.error as e:
+            logger.warning(f"Skipping invalid custom pattern '{pattern}': {e}")
+    return tuple(compiled)
+
+def refresh_custom_patterns(path=None):
+    """Reloads custom_patterns.py when it has changed since the last harvest.
+
+    Long-lived worker processes call this before every document, so patterns
+    saved from the Review window apply without restarting the pool.
+    """
+    path = Path(path or CUSTOM_PATTERNS_PATH)
+    try:
+        stat = path.stat()
+        stamp = (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        stamp = None
+    if stamp == _custom_patterns["stamp"]:
+        return
+    namespace = {}
+    if stamp is not None:
+        try:
+            namespace = runpy.run_path(str(path))
+        except Exception as e:
+            logger.warning(f"Could not load custom patterns from {path}: {e}")
+    _custom_patterns["stamp"] = stamp
+    for name in ("MODEL_PATTERNS", "QA_NUMBER_PATTERNS"):
+        _custom_patterns[name] = _compile_custom(namespace.get(name, []))
+
+def pattern_fingerprint():
+    """Identifies the active built-in and custom pattern set, so cached results can be invalidated when it changes."""
+    refresh_custom_patterns()
+    patterns = (
+        COMPILED_MODEL_PATTERNS + _custom_patterns["MODEL_PATTERNS"]
+        + COMPILED_QA_NUMBER_PATTERNS + _custom_patterns["QA_NUMBER_PATTERNS"]
+        + (COMPILED_AUTHOR_PATTERN,)
+    )
+    return hashlib.sha256("\n".join(p.pattern for p in patterns).encode("utf-8")).hexdigest()
+
+def _match_value(match):
+    """Uses the first capture group when a pattern has one; custom patterns usually don't."""
+    return match.group(1) if match.re.groups else match.group(0)
+
 def bulletproof_extraction(text_content, filename=None):
     """
     Extract models and other metadata from document text using regex patterns.
@@ -63,23 +128,25 @@ def bulletproof_extraction(text_content, filename=None):
     if not text_content or not isinstance(text_content, str):
         return {"models": "Not Found", "author": "", "short_description": filename or "Unknown"}
     
+    refresh_custom_patterns()
+
     # Attempt to find all models mentioned in the text
     all_models = []
-    for pattern in MODEL_PATTERNS:
-        matches = re.finditer(pattern, text_content, re.IGNORECASE)
+    for pattern in COMPILED_MODEL_PATTERNS + _custom_patterns["MODEL_PATTERNS"]:
+        matches = pattern.finditer(text_content)
         for match in matches:
-            model = match.group(1).strip()
+            model = _match_value(match).strip()
             if model and model not in all_models and len(model) >= 4:  # Minimum length check
                 all_models.append(model)
     
     # Look for QA number references
     qa_number = ""
     full_qa_number = ""
-    for pattern in QA_NUMBER_PATTERNS:
-        matches = re.finditer(pattern, text_content, re.IGNORECASE)
+    for pattern in COMPILED_QA_NUMBER_PATTERNS + _custom_patterns["QA_NUMBER_PATTERNS"]:
+        matches = pattern.finditer(text_content)
         for match in matches:
-            if match.group(1).isdigit():
-                qa_number = match.group(1)
+            if _match_value(match).isdigit():
+                qa_number = _match_value(match)
                 full_qa_number = match.group(0)
                 break
             else:
@@ -92,8 +159,7 @@ def bulletproof_extraction(text_content, filename=None):
     
     # Extract potential author name (simple heuristic)
     author = ""
-    author_pattern = r'(?:Author|Written by|Prepared by|Created by)[:\s]+([A-Z][a-z]+ [A-Z][a-z]+)'
-    author_match = re.search(author_pattern, text_content)
+    author_match = COMPILED_AUTHOR_PATTERN.search(text_content)
     if author_match:
         author = author_match.group(1)
     
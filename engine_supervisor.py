@@ -0,0 +1,166 @@
+# engine_supervisor.py
+# Runs the processing engine in its own process and relays its events to the GUI
+import queue
+import threading
+import multiprocessing
+
+from job_control import JobControl
+from logging_utils import setup_logger, log_info, log_warning, log_error
+
+logger = setup_logger("engine_supervisor")
+
+ENGINE_STOPPED_STATUS = "Error: the processing engine stopped unexpectedly"
+
+
+def _forward_events(conn, events: queue.Queue):
+    """The only thread that writes to the pipe, so messages never interleave."""
+    while True:
+        message = events.get()
+        if message is None:
+            return
+        try:
+            conn.send(message)
+        except (OSError, EOFError):
+            return
+
+
+def _post_recheck(events: queue.Queue, pdf_path: str, future):
+    error = future.exception()
+    result = None if error else future.result()[0]
+    events.put({"type": "recheck_result", "pdf_path": pdf_path, "result": result, "error": str(error) if error else None})
+
+
+def _supervisor_main(conn, control: JobControl, max_workers=None):
+    """Entry point of the engine process: owns the worker pool and runs one job at a time.
+
+    Commands arrive over ``conn`` as dicts; every progress event the engine
+    produces is sent back over the same pipe. The process exits when told to
+    or when the GUI end of the pipe goes away.
+    """
+    from processing_engine import run_processing_job
+    from worker_pool import WorkerPool
+
+    events = queue.Queue()
+    forwarder = threading.Thread(target=_forward_events, args=(conn, events), name="engine-events", daemon=True)
+    forwarder.start()
+    pool = WorkerPool(max_workers=max_workers, control=control)
+    pool.start_in_background()
+    job_thread = None
+    try:
+        while True:
+            try:
+                command = conn.recv()
+            except (EOFError, OSError):
+                break
+            kind = command.get("cmd")
+            if kind == "job":
+                if job_thread is not None and job_thread.is_alive():
+                    events.put({"type": "log", "tag": "warning", "msg": "A job is already running; request ignored."})
+                    continue
+                job_thread = threading.Thread(target=run_processing_job, args=(command["job"], events, control, pool), name="engine-job", daemon=True)
+                job_thread.start()
+            elif kind == "recheck":
+                future = pool.submit_interactive(command["pdf_path"])
+                future.add_done_callback(lambda done, path=command["pdf_path"]: _post_recheck(events, path, done))
+            elif kind == "shutdown":
+                break
+    finally:
+        control.cancel()
+        pool.shutdown(wait=False)
+        events.put(None)
+        forwarder.join(timeout=5)
+        conn.close()
+
+
+class EngineSupervisor:
+    """GUI-side handle on the engine process.
+
+    Jobs and re-checks are sent to a separate process, so regex and MuPDF
+    work never competes with Tk for the GIL. A reader thread copies the
+    engine's events into ``response_queue``. If the engine dies, a running
+    job finishes with an error and the next request starts a fresh engine.
+    """
+
+    def __init__(self, response_queue, control: JobControl, max_workers=None):
+        self.response_queue = response_queue
+        self.control = control
+        self.max_workers = max_workers
+        self._mp_context = multiprocessing.get_context("spawn")
+        self._process = None
+        self._conn = None
+        # The engine process running the current job, if any
+        self._job_process = None
+        self._lock = threading.Lock()
+
+    def start(self) -> "EngineSupervisor":
+        with self._lock:
+            if self._process is not None and self._process.is_alive():
+                return self
+            gui_end, engine_end = self._mp_context.Pipe()
+            self._process = self._mp_context.Process(
+                target=_supervisor_main,
+                args=(engine_end, self.control, self.max_workers),
+                name="kyo-qa-engine",
+            )
+            self._process.start()
+            engine_end.close()
+            self._conn = gui_end
+            threading.Thread(target=self._read_events, args=(gui_end, self._process), name="engine-reader", daemon=True).start()
+        log_info(logger, f"Processing engine started (pid {self._process.pid})")
+        return self
+
+    def _send(self, command: dict):
+        self.start()
+        with self._lock:
+            self._conn.send(command)
+
+    def start_job(self, job_info: dict):
+        self.start()
+        with self._lock:
+            self._job_process = self._process
+            self._conn.send({"cmd": "job", "job": job_info})
+
+    def recheck_file(self, pdf_path):
+        self._send({"cmd": "recheck", "pdf_path": str(pdf_path)})
+
+    def _read_events(self, conn, process):
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                break
+            if message.get("type") == "finish":
+                with self._lock:
+                    if self._job_process is process:
+                        self._job_process = None
+            self.response_queue.put(message)
+        process.join(timeout=5)
+        with self._lock:
+            if self._process is not process:
+                # Shut down on purpose, or already replaced by a fresh engine
+                return
+            self._process = None
+            job_lost = self._job_process is process
+            if job_lost:
+                self._job_process = None
+        log_error(logger, f"Processing engine exited unexpectedly (exit code {process.exitcode})")
+        self.response_queue.put({"type": "log", "tag": "error", "msg": "The processing engine stopped unexpectedly. It will be restarted for the next job."})
+        if job_lost:
+            self.response_queue.put({"type": "finish", "status": ENGINE_STOPPED_STATUS})
+
+    def shutdown(self, timeout: float = 5):
+        """Asks the engine to stop its workers and exit, terminating it if it does not."""
+        with self._lock:
+            process, conn = self._process, self._conn
+            self._process = self._conn = None
+        if process is None:
+            return
+        try:
+            conn.send({"cmd": "shutdown"})
+        except (OSError, EOFError):
+            pass
+        process.join(timeout)
+        if process.is_alive():
+            log_warning(logger, "Processing engine did not stop in time; terminating it.")
+            process.terminate()
+        conn.close()
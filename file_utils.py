@@ -1,5 +1,6 @@
 # file_utils.py
 import os
+import hashlib
 import shutil
 import tempfile
 from pathlib import Path
@@ -97,4 +98,36 @@ def get_file_extension(filename):
     """Returns the file extension in lowercase, e.g., '.pdf'."""
     if not filename or not isinstance(filename, str):
         return ""
-    return os.path.splitext(filename)[1].lower()
\ No newline at end of file
+    return os.path.splitext(filename)[1].lower()
+
+def content_hash(filepath, chunk_size=1024 * 1024):
+    """Returns the SHA-256 hex digest of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# path -> ((mtime_ns, size, inode), digest) for files hashed by this process
+_content_hash_memo = {}
+
+def cached_content_hash(filepath, data: bytes = None, memo=None):
+    """Like content_hash, but skips re-reading a file whose mtime, size and inode are unchanged.
+
+    ``data`` may hold the file's bytes when they are already in memory.
+    ``memo`` (e.g. a CacheStore) keeps digests across processes and sessions
+    through ``get_digest`` and ``put_digest``.
+    """
+    stat = os.stat(filepath)
+    stamp = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    key = os.path.abspath(filepath)
+    known = _content_hash_memo.get(key)
+    if known is not None and known[0] == stamp:
+        return known[1]
+    digest = memo.get_digest(key, stamp) if memo is not None else None
+    if digest is None:
+        digest = hashlib.sha256(data).hexdigest() if data is not None else content_hash(filepath)
+        if memo is not None:
+            memo.put_digest(key, stamp, digest)
+    _content_hash_memo[key] = (stamp, digest)
+    return digest
@@ -0,0 +1,60 @@
+# job_control.py
+# Cancel and pause tokens shared by the engine, worker processes and OCR
+import threading
+import multiprocessing
+
+from custom_exceptions import ProcessingCancelled
+
+
+class JobControl:
+    """Cancel and pause state for a processing job.
+
+    ``resume_event`` is set while the job may run and cleared while it is
+    paused, so paused code blocks in ``Event.wait()`` instead of polling.
+    Cancelling also sets it, which wakes every paused waiter at once.
+    """
+
+    def __init__(self, cancel_event=None, resume_event=None):
+        self.cancel_event = cancel_event if cancel_event is not None else threading.Event()
+        if resume_event is None:
+            resume_event = threading.Event()
+            resume_event.set()
+        self.resume_event = resume_event
+
+    @classmethod
+    def for_processes(cls, mp_context=None) -> "JobControl":
+        """Builds a token backed by multiprocessing events so worker processes can share it."""
+        mp_context = mp_context or multiprocessing.get_context("spawn")
+        resume_event = mp_context.Event()
+        resume_event.set()
+        return cls(mp_context.Event(), resume_event)
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    @property
+    def paused(self) -> bool:
+        return not self.resume_event.is_set()
+
+    def cancel(self):
+        self.cancel_event.set()
+        self.resume_event.set()
+
+    def pause(self):
+        if not self.cancelled:
+            self.resume_event.clear()
+
+    def resume(self):
+        self.resume_event.set()
+
+    def reset(self):
+        """Clears a previous cancel or pause before the next job starts."""
+        self.cancel_event.clear()
+        self.resume_event.set()
+
+    def check(self):
+        """Blocks while paused, then raises ProcessingCancelled if the job was cancelled."""
+        self.resume_event.wait()
+        if self.cancelled:
+            raise ProcessingCancelled("Processing was cancelled.")
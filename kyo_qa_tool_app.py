@@ -3,12 +3,13 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 from pathlib import Path
-import threading
+import multiprocessing
 import queue
 import time
 
 from config import BRAND_COLORS
-from processing_engine import run_processing_job
+from engine_supervisor import EngineSupervisor
+from job_control import JobControl
 from file_utils import open_file, ensure_folders, cleanup_temp_files
 from kyo_review_tool import ReviewWindow
 from version import VERSION
@@ -25,13 +26,18 @@ class KyoQAToolApp(tk.Tk):
         self.reviewable_files = []
         self.start_time = None
         self.last_run_info = {}
+        # Shared with the workers so Pause/Cancel reach documents mid-OCR
+        self.job_control = JobControl.for_processes()
 
         # --- Communication Queues & UI Vars ---
         self.response_queue = queue.Queue()
-        self.cancel_event = threading.Event()
+        # The engine and its warm worker pool live in a separate process for the whole session
+        self.engine = EngineSupervisor(self.response_queue, self.job_control)
         self.selected_folder = tk.StringVar()
         self.selected_excel = tk.StringVar()
         self.selected_files_list = []
+        # Known-bad PDFs are skipped until the user asks to retry them
+        self.retry_failed = tk.BooleanVar(value=False)
         self.status_current_file = tk.StringVar(value="Idle")
         self.progress_value = tk.DoubleVar(value=0)
         self.time_remaining_var = tk.StringVar(value="")
@@ -41,6 +47,7 @@ class KyoQAToolApp(tk.Tk):
         self.count_fail = tk.IntVar(value=0)
         self.count_review = tk.IntVar(value=0)
         self.count_ocr = tk.IntVar(value=0)
+        self.count_cached = tk.IntVar(value=0)
         self.led_status_var = tk.StringVar(value="[Idle]")
 
         # --- Setup ---
@@ -48,6 +55,7 @@ class KyoQAToolApp(tk.Tk):
         self._setup_styles()
         self._create_widgets()
         ensure_folders()
+        self.engine.start()
         self.after(100, self.process_response_queue)
 
     def _setup_window(self):
@@ -125,17 +133,25 @@ class KyoQAToolApp(tk.Tk):
         self.process_btn = ttk.Button(controls_frame, text="▶ START PROCESSING", command=self.start_processing, style="Red.TButton", padding=(10,8))
         self.process_btn.grid(row=0, column=0, padx=5, pady=5, sticky="ew")
         
+        self.pause_btn = ttk.Button(controls_frame, text="⏸ Pause", command=self.toggle_pause, state=tk.DISABLED)
+        self.pause_btn.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
+
+        self.cancel_btn = ttk.Button(controls_frame, text="⏹ Cancel", command=self.cancel_processing, state=tk.DISABLED)
+        self.cancel_btn.grid(row=0, column=2, padx=5, pady=5, sticky="ew")
+
         self.rerun_btn = ttk.Button(controls_frame, text="🔄 Re-run Last Process", command=self.rerun_last_job, state=tk.DISABLED)
-        self.rerun_btn.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
+        self.rerun_btn.grid(row=0, column=3, padx=5, pady=5, sticky="ew")
         
         self.open_result_btn = ttk.Button(controls_frame, text="📂 Open Result", command=self.open_result, state=tk.DISABLED)
-        self.open_result_btn.grid(row=0, column=2, padx=5, pady=5, sticky="ew")
+        self.open_result_btn.grid(row=0, column=4, padx=5, pady=5, sticky="ew")
 
         self.review_btn = ttk.Button(controls_frame, text="⚙️ Pattern Manager", command=self.open_pattern_manager)
-        self.review_btn.grid(row=0, column=3, padx=5, pady=5, sticky="ew")
+        self.review_btn.grid(row=0, column=5, padx=5, pady=5, sticky="ew")
 
         self.exit_btn = ttk.Button(controls_frame, text="❌ Exit", command=self.on_closing)
-        self.exit_btn.grid(row=0, column=4, padx=15, pady=5, sticky="e")
+        self.exit_btn.grid(row=0, column=6, padx=15, pady=5, sticky="e")
+
+        ttk.Checkbutton(controls_frame, text="Retry known-bad PDFs", variable=self.retry_failed).grid(row=1, column=0, columnspan=2, padx=5, sticky="w")
 
     def _create_status_and_log_section(self, parent):
         container = ttk.LabelFrame(parent, text="3. Live Status & Activity Log", padding=10)
@@ -171,6 +187,8 @@ class KyoQAToolApp(tk.Tk):
         ttk.Label(summary_frame, textvariable=self.count_review, style="Status.TLabel", foreground=BRAND_COLORS["warning_yellow"]).pack(side="left", padx=(0,10))
         ttk.Label(summary_frame, text="OCR Used:", style="Status.Header.TLabel").pack(side="left", padx=(10,2))
         ttk.Label(summary_frame, textvariable=self.count_ocr, style="Status.TLabel", foreground=BRAND_COLORS["accent_blue"]).pack(side="left", padx=(0,10))
+        ttk.Label(summary_frame, text="Cached:", style="Status.Header.TLabel").pack(side="left", padx=(10,2))
+        ttk.Label(summary_frame, textvariable=self.count_cached, style="Status.TLabel", foreground=BRAND_COLORS["accent_grey"]).pack(side="left", padx=(0,10))
         
         review_frame = ttk.Frame(container, style="Dark.TFrame", padding=(5, 10))
         review_frame.grid(row=2, column=0, sticky="ew", padx=5, pady=(5,0))
@@ -209,9 +227,9 @@ class KyoQAToolApp(tk.Tk):
                         counter_var.set(counter_var.get() + 1)
                 elif msg_type == "file_complete":
                     counter_var = None
-                    status = response.get("status")
+                    status = response.get("status") or ""
                     if status == "Pass": counter_var = self.count_pass
-                    elif status == "Fail": counter_var = self.count_fail
+                    elif status.startswith("Fail"): counter_var = self.count_fail
                     elif status == "Needs Review": counter_var = self.count_review
                     if counter_var: counter_var.set(counter_var.get() + 1)
                 elif msg_type == "log":
@@ -230,11 +248,15 @@ class KyoQAToolApp(tk.Tk):
                     self.reviewable_files.append(response["data"])
                     item = response["data"]
                     self.review_tree.insert('', 'end', values=(item['filename'], item['reason']))
+                elif msg_type == "recheck_result":
+                    self.show_recheck_result(response)
                 elif msg_type == "result_path":
                     self.result_file_path = response["path"]
                 elif msg_type == "finish":
                     self.is_processing = False
-                    self.cancel_event.clear()
+                    self.job_control.reset()
+                    self.pause_btn.config(state=tk.DISABLED, text="⏸ Pause")
+                    self.cancel_btn.config(state=tk.DISABLED)
                     self.progress_value.set(100)
                     self.time_remaining_var.set("Complete!")
                     self.status_current_file.set("Idle")
@@ -273,8 +295,11 @@ class KyoQAToolApp(tk.Tk):
             self.count_fail.set(0)
             self.count_review.set(0)
             self.count_ocr.set(0)
+            self.count_cached.set(0)
             
             self.process_btn.config(state=tk.DISABLED)
+            self.pause_btn.config(state=tk.NORMAL, text="⏸ Pause")
+            self.cancel_btn.config(state=tk.NORMAL)
             self.rerun_btn.config(state=tk.DISABLED)
             self.exit_btn.config(state=tk.DISABLED)
             self.open_result_btn.config(state=tk.DISABLED)
@@ -299,23 +324,62 @@ class KyoQAToolApp(tk.Tk):
             if not excel_path:
                 messagebox.showwarning("Input Missing", "Please select a base Excel file to clone.")
                 return
-            job_request = {"excel_path": excel_path, "input_path": input_path}
+            job_request = {"excel_path": excel_path, "input_path": input_path, "retry_failed": self.retry_failed.get()}
             self.last_run_info = job_request
+        self.job_control.reset()
         self.update_ui_for_processing(True)
         self.log_message("Starting processing job...", "info")
         self.start_time = time.time()
-        self.processing_thread = threading.Thread(target=run_processing_job, args=(job_request, self.response_queue, self.cancel_event), daemon=True)
-        self.processing_thread.start()
+        self.engine.start_job(job_request)
+
+    def toggle_pause(self):
+        if not self.is_processing: return
+        if self.job_control.paused:
+            self.job_control.resume()
+            self.pause_btn.config(text="⏸ Pause")
+            self.set_led_status("Queued")
+            self.log_message("Processing resumed.", "info")
+        else:
+            self.job_control.pause()
+            self.pause_btn.config(text="▶ Resume")
+            self.set_led_status("Paused")
+            self.log_message("Processing paused. Workers stop at the next page.", "warning")
+
+    def cancel_processing(self):
+        if not self.is_processing: return
+        self.job_control.cancel()
+        self.pause_btn.config(state=tk.DISABLED)
+        self.cancel_btn.config(state=tk.DISABLED)
+        self.log_message("Cancelling... current documents stop at the next page.", "warning")
 
     def rerun_last_job(self):
         if self.last_run_info:
             self.log_message("Re-running the last process with updated patterns...", "info")
             job = dict(self.last_run_info)
             job["is_rerun"] = True
+            job["retry_failed"] = self.retry_failed.get()
             self.start_processing(job_request=job)
         else:
             messagebox.showwarning("No Previous Job", "Please run a process first before using the re-run feature.")
     
+    def recheck_file(self, pdf_path):
+        """Re-processes one file in the priority lane; a running batch keeps going behind it."""
+        self.log_message(f"Re-checking {Path(pdf_path).name} with the updated patterns...", "info")
+        self.engine.recheck_file(pdf_path)
+
+    def show_recheck_result(self, response):
+        filename, result = Path(response["pdf_path"]).name, response["result"]
+        if result is None:
+            self.log_message(f"Re-check of {filename} failed: {response['error']}", "error")
+            return
+        status = result.get("status", "")
+        self.log_message(f"Re-check of {filename}: {status} (models: {result.get('models', '')}). Re-run to update the workbook.", "success" if status == "Pass" else "warning")
+        if status != "Needs Review":
+            self.reviewable_files = [f for f in self.reviewable_files if f["filename"] != filename]
+            for item in self.review_tree.get_children():
+                if self.review_tree.item(item)["values"][0] == filename:
+                    self.review_tree.delete(item)
+
     def open_pattern_manager(self):
         dialog = tk.Toplevel(self)
         dialog.title("Pattern Manager")
@@ -383,12 +447,16 @@ class KyoQAToolApp(tk.Tk):
     def on_closing(self):
         if self.is_processing:
             if messagebox.askyesno("Confirm Exit", "Processing is still in progress. Are you sure you want to exit?"):
-                self.cancel_event.set()
+                self.job_control.cancel()
                 self.destroy()
+            else:
+                return
         else:
             self.destroy()
+        self.engine.shutdown()
         cleanup_temp_files()
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     app = KyoQAToolApp()
     app.mainloop()
\ No newline at end of file
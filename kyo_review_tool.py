@@ -84,6 +84,10 @@ class ReviewWindow(tk.Toplevel):
         ttk.Button(test_save_frame, text="Update List", command=self.update_pattern_in_list).pack(side="left", padx=5)
         
         ttk.Button(manager_frame, text="Save All Patterns", style="Red.TButton", command=self.save_patterns_to_config).grid(row=6, column=0, columnspan=2, pady=10, sticky="ew")
+        self.recheck_btn = ttk.Button(manager_frame, text="Save & Re-check File", command=self.save_and_recheck_file)
+        self.recheck_btn.grid(row=7, column=0, columnspan=2, sticky="ew")
+        if not (self.file_info and self.file_info.get("pdf_path") and hasattr(parent, "recheck_file")):
+            self.recheck_btn.config(state=tk.DISABLED)
 
         self.pdf_text = tk.Text(text_frame, wrap="word", font=("Consolas", 9), relief="solid", borderwidth=1)
         self.pdf_text.pack(fill="both", expand=True, side="left")
@@ -117,10 +121,21 @@ class ReviewWindow(tk.Toplevel):
     
     def save_patterns_to_config(self):
         """Re-writes all pattern lists into the custom_patterns.py file correctly."""
+        if self._write_patterns_file():
+            messagebox.showinfo("Success", "Custom patterns saved successfully!\nChanges will apply on the next run.", parent=self)
+            self.destroy()
+
+    def save_and_recheck_file(self):
+        """Saves the patterns, then re-processes the selected file ahead of any running batch."""
+        if self._write_patterns_file():
+            self.master.recheck_file(self.file_info["pdf_path"])
+            self.destroy()
+
+    def _write_patterns_file(self) -> bool:
         all_patterns_in_listbox = self.pattern_listbox.get(0, tk.END)
         msg = f"This will save {len(all_patterns_in_listbox)} patterns to the {self.pattern_name} list in custom_patterns.py.\n\nAre you sure?"
         if not messagebox.askyesno("Confirm Save", msg, parent=self):
-            return
+            return False
 
         try:
             all_lists_to_save = {self.pattern_name: list(all_patterns_in_listbox)}
@@ -148,10 +163,10 @@ class ReviewWindow(tk.Toplevel):
                 file_content += "]\n"
             
             self.custom_patterns_path.write_text(file_content, encoding='utf-8')
-            messagebox.showinfo("Success", "Custom patterns saved successfully!\nChanges will apply on the next run.", parent=self)
-            self.destroy()
+            return True
         except Exception as e:
             messagebox.showerror("Save Failed", f"Could not save patterns to file:\n{e}", parent=self)
+            return False
 
     def update_pattern_in_list(self):
         new_pattern = self.pattern_entry.get().strip()
@@ -0,0 +1,93 @@
+# layout_analysis.py
+# Finds the regions of a scanned page worth OCR'ing: the header block and ruled tables
+from image_preprocessing import to_gray
+from logging_utils import setup_logger, log_warning
+
+logger = setup_logger("layout_analysis")
+
+# Pages are analysed at about this width in pixels, whatever they were rendered at
+LAYOUT_WIDTH = 500
+# QA and SB numbers, titles and model lines sit in the top part of a bulletin
+HEADER_FRACTION = 0.3
+# Margin kept around each region, as a fraction of the page width
+REGION_PADDING = 0.01
+# When the regions would cover more of the page than this, OCR the whole page instead
+MAX_REGION_COVERAGE = 0.6
+
+
+def select_regions(text_blocks, tables, width: int, height: int) -> list:
+    """Picks the header text blocks and the tables, padded, merged and scaled to fractions of the page.
+
+    Boxes are (x, y, w, h) in pixels of a ``width`` by ``height`` image.
+    Returns (x0, y0, x1, y1) rectangles between 0 and 1, top to bottom, or
+    an empty list when there is nothing to gain over OCR'ing the whole page.
+    """
+    picked = [box for box in text_blocks if box[1] < HEADER_FRACTION * height] + list(tables)
+    pad = REGION_PADDING * width
+    rects = [
+        (max(0.0, x - pad), max(0.0, y - pad), min(float(width), x + w + pad), min(float(height), y + h + pad))
+        for x, y, w, h in picked
+    ]
+    merged = _merge_overlapping(rects)
+    covered = sum((r[2] - r[0]) * (r[3] - r[1]) for r in merged)
+    if not merged or covered > MAX_REGION_COVERAGE * width * height:
+        return []
+    return [(r[0] / width, r[1] / height, r[2] / width, r[3] / height) for r in sorted(merged, key=lambda r: (r[1], r[0]))]
+
+
+def _merge_overlapping(rects) -> list:
+    merged = list(rects)
+    i = 0
+    while i < len(merged):
+        a = merged[i]
+        for j in range(i + 1, len(merged)):
+            b = merged[j]
+            if a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]:
+                merged[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                del merged[j]
+                break
+        else:
+            i += 1
+    return merged
+
+
+def find_target_regions(samples, width: int, height: int, channels: int, stride: int) -> list:
+    """Locates the header block and ruled tables on a rendered page with OpenCV.
+
+    Takes raw 8-bit pixel rows (e.g. a pixmap's ``samples_mv``) and returns
+    the regions from select_regions, or an empty list when OpenCV is not
+    installed or nothing useful was found.
+    """
+    try:
+        import cv2
+    except ImportError:
+        log_warning(logger, "OpenCV not installed; OCR reads whole pages.")
+        return []
+
+    gray = to_gray(samples, width, height, channels, stride)
+    scale = min(1.0, LAYOUT_WIDTH / width)
+    if scale < 1.0:
+        gray = cv2.resize(gray, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    small_h, small_w = gray.shape
+    _, ink = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+
+    # Table rules are long straight runs of ink; text is not
+    horizontal = cv2.morphologyEx(ink, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (max(10, small_w // 8), 1)))
+    vertical = cv2.morphologyEx(ink, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (1, max(10, small_h // 30))))
+    grid = cv2.dilate(cv2.bitwise_or(horizontal, vertical), cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3)))
+    tables = []
+    for contour in cv2.findContours(grid, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]:
+        x, y, w, h = cv2.boundingRect(contour)
+        if w > small_w // 4 and h > small_h // 30 and horizontal[y:y + h, x:x + w].any() and vertical[y:y + h, x:x + w].any():
+            tables.append((x, y, w, h))
+
+    # Smear letters into words and words into lines and blocks
+    text_only = cv2.subtract(ink, cv2.bitwise_or(horizontal, vertical))
+    smeared = cv2.dilate(text_only, cv2.getStructuringElement(cv2.MORPH_RECT, (max(3, small_w // 40), max(2, small_h // 150))), iterations=2)
+    blocks = []
+    for contour in cv2.findContours(smeared, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]:
+        x, y, w, h = cv2.boundingRect(contour)
+        if w * h >= small_w * small_h // 2000 and h >= 3:
+            blocks.append((x, y, w, h))
+
+    return select_regions(blocks, tables, small_w, small_h)
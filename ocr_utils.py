@@ -2,16 +2,39 @@
 # KYO QA ServiceNow OCR Utilities - Fixed for PyMuPDF compatibility
 import fitz # PyMuPDF
 import os
+import hashlib
+import subprocess
+import tempfile
 from pathlib import Path
+from config import OCR_BINARIZE, OCR_DENOISE, OCR_DESKEW, OCR_DPI_LADDER, OCR_LAYOUT_REGIONS, OCR_MIN_CONFIDENCE, OCR_TRIM_MARGINS
+from custom_exceptions import ProcessingCancelled
 from logging_utils import setup_logger, log_info, log_error, log_warning
 
 logger = setup_logger("ocr_utils")
 
+# Set by the parent process once Tesseract has been located so that worker
+# processes reuse the result instead of probing again. An empty value means
+# the parent already looked and found no Tesseract.
+TESSERACT_CMD_ENV = "KYO_TESSERACT_CMD"
+
+# How often a running tesseract process checks whether the job was cancelled
+CANCEL_CHECK_SECONDS = 0.25
+
+# OCR pages in a Tesseract engine kept loaded in each process (tesseract_api.py) when
+# libtesseract can be found; otherwise a tesseract process is started per page
+USE_TESSERACT_API = True
+
 def init_tesseract():
     """Initialize Tesseract OCR if available."""
     try:
         import pytesseract
 
+        resolved_cmd = os.environ.get(TESSERACT_CMD_ENV)
+        if resolved_cmd is not None:
+            if resolved_cmd:
+                pytesseract.pytesseract.tesseract_cmd = resolved_cmd
+            return bool(resolved_cmd)
+
         portable_path = Path(__file__).parent / "tesseract" / "tesseract.exe"
         if portable_path.exists():
             pytesseract.pytesseract.tesseract_cmd = str(portable_path)
@@ -48,14 +71,30 @@ def init_tesseract():
 
 TESSERACT_AVAILABLE = init_tesseract()
 
-def _is_ocr_needed(pdf_path: Path | str) -> bool:
+def get_tesseract_cmd() -> str:
+    """Returns the resolved Tesseract command, or an empty string if OCR is unavailable."""
+    if not TESSERACT_AVAILABLE:
+        return ""
+    try:
+        import pytesseract
+        return str(pytesseract.pytesseract.tesseract_cmd)
+    except ImportError:
+        return ""
+
+def _open_pdf(source):
+    """Opens a PDF from a path, or from bytes already read into memory (see prefetch.py)."""
+    if isinstance(source, (bytes, bytearray)):
+        return fitz.open(stream=source, filetype="pdf")
+    # FIXED: Use simple fitz.open() without password parameter
+    return fitz.open(str(source))
+
+def _is_ocr_needed(pdf_path: Path | str, source: bytes | None = None) -> bool:
     """
     Pre-checks a PDF to see if it's image-based and likely requires OCR.
     It does this by checking the amount of extractable text.
     """
     try:
-        # FIXED: Use simple fitz.open() without password parameter
-        with fitz.open(str(pdf_path)) as doc:
+        with _open_pdf(source if source is not None else pdf_path) as doc:
             if not doc.is_pdf:
                 return False
 
@@ -70,14 +109,237 @@ def _is_ocr_needed(pdf_path: Path | str) -> bool:
         return True
     return False
 
-def extract_text_from_pdf(pdf_path: Path | str) -> str:
-    """Extract text from a PDF file, using OCR if needed."""
+def diagnose_unreadable_pdf(pdf_path: Path | str, source: bytes | None = None, ocr_pages: list | None = None) -> str | None:
+    """Explains why a PDF gave no text, or returns None if another run might still succeed.
+
+    Only problems that retrying cannot fix are reported: a file MuPDF cannot
+    parse, a password, no pages, or no text even after OCR. An empty scan is
+    only diagnosed when ``ocr_pages`` (as filled by extract_text_with_ocr)
+    shows at least one page that Tesseract read without an error; a missing
+    or failing Tesseract could still be fixed before the next run.
+    """
+    try:
+        with _open_pdf(source if source is not None else pdf_path) as doc:
+            if doc.needs_pass:
+                return "Password protected"
+            if not doc.is_pdf:
+                return "Not a PDF"
+            if len(doc) == 0:
+                return "No pages"
+    except OSError:
+        return None
+    except Exception as exc:
+        return f"Corrupt PDF ({exc})"
+    if any("error" not in page for page in ocr_pages or ()):
+        return "No text found, even with OCR"
+    return None
+
+def _mean_confidence(tsv: str) -> float:
+    """Mean confidence of the recognised words in tesseract's TSV output, 0 when there are none."""
+    scores = []
+    for line in tsv.splitlines()[1:]:
+        fields = line.split("\t")
+        if len(fields) == 12 and fields[11].strip():
+            try:
+                confidence = float(fields[10])
+            except ValueError:
+                continue
+            if confidence >= 0:
+                scores.append(confidence)
+    return sum(scores) / len(scores) if scores else 0.0
+
+def _run_tesseract(img, control=None, dpi: int = None) -> tuple:
+    """OCR one page image in a tesseract process that is killed as soon as the job is cancelled.
+
+    Returns (text, mean word confidence from 0 to 100); the text and the
+    word confidences come from the same run.
+    """
+    with tempfile.TemporaryDirectory(prefix="kyo_ocr_") as tmp_dir:
+        image_path = Path(tmp_dir) / "page.png"
+        output_base = Path(tmp_dir) / "page"
+        img.save(image_path)
+        command = [get_tesseract_cmd(), str(image_path), str(output_base)]
+        if dpi:
+            command += ["--dpi", str(dpi)]
+        proc = subprocess.Popen(
+            command + ["txt", "tsv"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
+        )
+        while True:
+            try:
+                stdout, stderr = proc.communicate(timeout=CANCEL_CHECK_SECONDS)
+                break
+            except subprocess.TimeoutExpired:
+                if control is not None and control.cancelled:
+                    proc.kill()
+                    proc.communicate()
+                    raise ProcessingCancelled("OCR cancelled.")
+
+        if proc.returncode != 0:
+            raise RuntimeError(stderr.decode("utf-8", errors="replace").strip() or f"tesseract exited with {proc.returncode}")
+        text = output_base.with_suffix(".txt").read_text(encoding="utf-8", errors="replace")
+        tsv = output_base.with_suffix(".tsv").read_text(encoding="utf-8", errors="replace")
+    return text, _mean_confidence(tsv)
+
+def page_image_key(page) -> str | None:
+    """Identifies a scanned page by its one embedded image, without rendering it.
+
+    Cover pages, disclaimers and back pages shared by many leaflets embed the
+    same image stream, so they get the same key in every document. Pages with
+    a text layer or several images return None and are keyed by their pixels.
+    """
+    images = page.get_images(full=True)
+    if len(images) != 1 or page.get_text("text").strip():
+        return None
+    xref = images[0][0]
+    rects = page.get_image_rects(xref)
+    if len(rects) != 1:
+        return None
+    digest = hashlib.sha256(page.parent.xref_stream_raw(xref)).hexdigest()
+    placement = ",".join(str(round(v)) for v in (*rects[0], page.rect.width, page.rect.height, page.rotation))
+    return f"img:{_ocr_settings()}:{digest}:{placement}"
+
+def pixmap_key(pix) -> str:
+    """Identifies a rendered page by a hash of its pixels (rendered at the lowest DPI on the ladder)."""
+    return f"pix:{_ocr_settings()}:{pix.width}x{pix.height}:{hashlib.sha256(_samples_view(pix)).hexdigest()}"
+
+def _ocr_settings() -> str:
+    """The part of a page cache key that changes whenever the DPI ladder, confidence threshold or page clean-up do."""
+    steps = "".join(flag for flag, on in (("t", OCR_TRIM_MARGINS), ("n", OCR_DENOISE), ("s", OCR_DESKEW), ("b", OCR_BINARIZE)) if on)
+    return f"{'-'.join(str(dpi) for dpi in OCR_DPI_LADDER)}@{OCR_MIN_CONFIDENCE}{'+roi' if OCR_LAYOUT_REGIONS else ''}{'+' + steps if steps else ''}"
+
+# PIL modes for a pixmap's number of components (colour channels plus alpha)
+_PIXMAP_MODES = {1: "L", 2: "LA", 3: "RGB", 4: "RGBA"}
+
+def _samples_view(pix):
+    """The pixmap's pixel buffer without copying it; ``samples`` alone makes a copy of the whole bitmap."""
+    view = getattr(pix, "samples_mv", None)
+    return view if view is not None else pix.samples
+
+def _pixmap_image(pix):
+    """Wraps a pixmap's pixels in a PIL image directly, instead of encoding and decoding a PNG."""
+    from PIL import Image
+    mode = _PIXMAP_MODES[pix.n]
+    return Image.frombuffer(mode, (pix.width, pix.height), _samples_view(pix), "raw", mode, pix.stride, 1)
+
+def _ocr_image(img, control=None, dpi: int = None) -> tuple:
+    """OCR one page image; returns (text, confidence). With a job control the tesseract process can be cancelled mid-page."""
+    return _run_tesseract(img, control, dpi)
+
+def _tesseract_engine():
+    """This process's loaded Tesseract engine, or None to run the tesseract command per page."""
+    if not USE_TESSERACT_API:
+        return None
+    from tesseract_api import get_engine
+    return get_engine(get_tesseract_cmd())
+
+def _ocr_pixmap(pix, control=None, dpi: int = None) -> tuple:
+    """OCR one rendered page, handing its pixels straight to the in-process engine when there is one."""
+    engine = _tesseract_engine()
+    if engine is not None:
+        # The engine reads the pixels where MuPDF rendered them
+        samples = getattr(pix, "samples_ptr", None) or pix.samples
+        return engine.recognize(samples, pix.width, pix.height, pix.n, pix.stride, control, dpi)
+    return _ocr_image(_pixmap_image(pix), control, dpi)
+
+def _prepare_pixmap(pix):
+    """The page trimmed, denoised, deskewed and binarized for OCR as configured, or ``pix`` itself if that fails."""
+    try:
+        from image_preprocessing import preprocess_page
+        return preprocess_page(pix)
+    except Exception as e:
+        log_warning(logger, f"Page preprocessing failed; OCR'ing the page as rendered: {e}")
+        return pix
+
+def _layout_regions(page, pix) -> list:
+    """The header block and tables of a page as page rectangles, or an empty list to OCR the whole page."""
+    if not OCR_LAYOUT_REGIONS:
+        return []
+    try:
+        if page.rotation:
+            return []
+        from layout_analysis import find_target_regions
+        fractions = find_target_regions(_samples_view(pix), pix.width, pix.height, pix.n, pix.stride)
+        area = page.rect
+    except Exception as e:
+        log_warning(logger, f"Layout analysis failed; OCR'ing the whole page: {e}")
+        return []
+    return [
+        (area.x0 + x0 * area.width, area.y0 + y0 * area.height, area.x0 + x1 * area.width, area.y0 + y1 * area.height)
+        for x0, y0, x1, y1 in fractions
+    ]
+
+def _ocr_ladder(render, control=None, dpis=None, stop_when_empty=False) -> tuple:
+    """OCRs ``render(dpi)``'s pixmaps up the DPI ladder, stopping at the first resolution Tesseract is confident about.
+
+    Most bulletins print model numbers large enough to read at the lowest
+    DPI; small or faint print scores low and is rendered again at the next
+    one. ``dpis`` overrides OCR_DPI_LADDER; with ``stop_when_empty`` the
+    climb ends at a rung that gives no text at all. Returns (text, dpi,
+    confidence) of the most confident attempt.
+    """
+    best = None
+    for rung, dpi in enumerate(dpis or OCR_DPI_LADDER):
+        if rung and control is not None:
+            control.check()
+        results = [_ocr_pixmap(_prepare_pixmap(pix), control, dpi) for pix in render(dpi)]
+        text = "\n".join(part for part, _ in results)
+        # Regions are weighted by how much text they gave; an empty one says nothing about quality
+        weight = sum(len(part.strip()) for part, _ in results)
+        confidence = sum(len(part.strip()) * score for part, score in results) / weight if weight else max((score for _, score in results), default=0)
+        if best is None or confidence > best[2]:
+            best = (text, dpi, confidence)
+        if confidence >= OCR_MIN_CONFIDENCE or (stop_when_empty and not weight):
+            break
+    return best
+
+def _ocr_page(page, pix, control=None) -> tuple:
+    """OCRs one page, reading only its header block and tables when layout analysis finds them.
+
+    ``pix`` is the page already rendered at the first rung of the DPI ladder;
+    it doubles as the render layout analysis runs on. When the regions give
+    no text Tesseract is confident about, the whole page is OCR'd instead:
+    from the first rung if the regions were empty, otherwise only at the
+    highest DPI the regions already climbed to, keeping whichever reading is
+    more confident. A page therefore takes at most one pass more than the
+    ladder has rungs.
+    Returns (text, dpi, confidence, number of regions read or 0 for the whole page).
+    """
+    first_dpi = OCR_DPI_LADDER[0]
+    dpis = OCR_DPI_LADDER
+    regions = _layout_regions(page, pix)
+    found = None
+    if regions:
+        found = _ocr_ladder(lambda dpi: [page.get_pixmap(dpi=dpi, clip=rect) for rect in regions], control, stop_when_empty=True)
+        if not found[0].strip():
+            found = None
+        elif found[2] >= OCR_MIN_CONFIDENCE:
+            return (*found, len(regions))
+        else:
+            # Low-confidence regions climbed the whole ladder; lower rungs would not read the page better
+            dpis = OCR_DPI_LADDER[-1:]
+            if control is not None:
+                control.check()
+    whole = _ocr_ladder(lambda dpi: [pix] if dpi == first_dpi else [page.get_pixmap(dpi=dpi)], control, dpis)
+    if found is not None and found[2] > whole[2]:
+        return (*found, len(regions))
+    return (*whole, 0)
+
+def extract_text_from_pdf(pdf_path: Path | str, control=None, source: bytes | None = None, page_cache=None, ocr_pages: list | None = None) -> str:
+    """Extract text from a PDF file, using OCR if needed.
+
+    ``control`` is an optional JobControl; OCR then honours pause and cancel
+    between pages and raises ProcessingCancelled when the job is cancelled.
+    ``source`` holds the file's bytes when they were prefetched. See
+    extract_text_with_ocr for ``page_cache`` and ``ocr_pages``.
+    """
     try:
         pdf_path = Path(pdf_path)
         text = ""
         
-        # FIXED: Use simple fitz.open() without password parameter
-        with fitz.open(str(pdf_path)) as doc:
+        with _open_pdf(source if source is not None else pdf_path) as doc:
             text = "".join(page.get_text() for page in doc)
 
         # If text is found and OCR is not explicitly needed, return it.
@@ -88,45 +350,92 @@ def extract_text_from_pdf(pdf_path: Path | str) -> str:
         # If no text was found, or it's very short, attempt OCR if available.
         if TESSERACT_AVAILABLE:
             log_info(logger, f"Attempting OCR on {pdf_path.name}")
-            return extract_text_with_ocr(pdf_path)
+            return extract_text_with_ocr(pdf_path, control, source, page_cache, ocr_pages)
         else:
             log_warning(logger, f"No text found in {pdf_path.name} and OCR is not available.")
             return "" # Return empty string if no text and no OCR
+    except ProcessingCancelled:
+        raise
     except Exception as exc:
         log_error(logger, f"Failed to extract text from {pdf_path.name}: {exc}")
         return ""
 
-def extract_text_with_ocr(pdf_path: Path | str) -> str:
-    """Extract text from a PDF using OCR on its rendered images."""
+def extract_text_with_ocr(pdf_path: Path | str, control=None, source: bytes | None = None, page_cache=None, ocr_pages: list | None = None) -> str:
+    """Extract text from a PDF using OCR on its rendered images.
+
+    Pages are OCR'd by the process's loaded Tesseract engine when libtesseract
+    is available, or by a tesseract process per page otherwise. With a
+    ``control``, pause and cancel are honoured before every page and a
+    running recognition is stopped when the job is cancelled.
+
+    Each page is OCR'd at the first DPI in OCR_DPI_LADDER and rendered again
+    at the next one only while Tesseract's confidence is below
+    OCR_MIN_CONFIDENCE; the DPI chosen for every page is logged. With
+    OCR_LAYOUT_REGIONS, only the header block and tables found by
+    layout_analysis.py are OCR'd, falling back to the whole page. Every
+    render is cleaned up by image_preprocessing.py before Tesseract sees it.
+
+    ``page_cache`` (e.g. a CacheStore) maps page keys to OCR text through
+    ``get_page_text`` and ``put_page_text``. A page whose embedded image or
+    rendered pixels were OCR'd before, in any document, reuses that text.
+
+    ``ocr_pages``, if given, receives one entry per page: the DPI and
+    confidence it was read at, ``reused`` for text from ``page_cache``, or
+    the ``error`` that stopped it.
+    """
     if not TESSERACT_AVAILABLE:
         log_warning(logger, "Tesseract OCR not available, cannot perform OCR.")
         return ""
 
+    pdf_path = Path(pdf_path)
     try:
-        import pytesseract
-        from PIL import Image
-        import io
-
         all_text = []
-        # FIXED: Use simple fitz.open() without password parameter
-        with fitz.open(str(pdf_path)) as doc:
+        pages_per_dpi = {}
+        with _open_pdf(source if source is not None else pdf_path) as doc:
             for page_num, page in enumerate(doc):
+                if control is not None:
+                    control.check()
                 try:
-                    # Render the page at a higher resolution for better OCR accuracy
-                    pix = page.get_pixmap(dpi=300)
-                    img = Image.open(io.BytesIO(pix.tobytes("png")))
+                    page_key = page_image_key(page) if page_cache is not None else None
+                    page_text = page_cache.get_page_text(page_key) if page_key else None
+                    if page_text is None:
+                        # Start at the bottom of the DPI ladder; _ocr_page climbs it if needed
+                        pix = page.get_pixmap(dpi=OCR_DPI_LADDER[0])
+                        if page_cache is not None and page_key is None:
+                            page_key = pixmap_key(pix)
+                            page_text = page_cache.get_page_text(page_key)
+                    if page_text is not None:
+                        all_text.append(page_text)
+                        if ocr_pages is not None:
+                            ocr_pages.append({"page": page_num + 1, "reused": True})
+                        log_info(logger, f"Reused OCR text for page {page_num+1} of {pdf_path.name}")
+                        continue
 
                     # Use Tesseract to do OCR on the image
-                    page_text = pytesseract.image_to_string(img)
+                    page_text, dpi, confidence, regions = _ocr_page(page, pix, control)
                     all_text.append(page_text)
-                    log_info(logger, f"OCR processed page {page_num+1} of {pdf_path.name}")
+                    if page_key:
+                        page_cache.put_page_text(page_key, page_text)
+                    pages_per_dpi[dpi] = pages_per_dpi.get(dpi, 0) + 1
+                    if ocr_pages is not None:
+                        ocr_pages.append({"page": page_num + 1, "dpi": dpi, "confidence": round(confidence), "regions": regions})
+                    scope = f"{regions} region(s)" if regions else "whole page"
+                    log_info(logger, f"OCR processed page {page_num+1} of {pdf_path.name} at {dpi} dpi, {scope} (confidence {confidence:.0f})")
+                except ProcessingCancelled:
+                    raise
                 except Exception as e:
                     log_warning(logger, f"OCR failed for page {page_num+1} in {pdf_path.name}: {e}")
+                    if ocr_pages is not None:
+                        ocr_pages.append({"page": page_num + 1, "error": str(e)})
                     continue
 
         result = "\n\n".join(all_text)
-        log_info(logger, f"OCR extraction complete for {pdf_path.name}: {len(result)} chars")
+        dpi_summary = ", ".join(f"{count} at {dpi} dpi" for dpi, count in sorted(pages_per_dpi.items()))
+        log_info(logger, f"OCR extraction complete for {pdf_path.name}: {len(result)} chars" + (f" ({dpi_summary})" if dpi_summary else ""))
         return result
+    except ProcessingCancelled:
+        log_info(logger, f"OCR cancelled for {pdf_path.name}")
+        raise
     except Exception as e:
         log_error(logger, f"OCR extraction failed for {pdf_path.name}: {e}")
         return ""
@@ -0,0 +1,147 @@
+# pipeline.py
+# Stage registry and scheduler used to turn one document into a result
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Protocol
+
+from custom_exceptions import KYOQAToolError
+
+# Where a stage runs. Stages already execute inside a pool worker process, and
+# OCR shells out to tesseract, so process and subprocess isolation sit below this level.
+INLINE = "inline"
+THREAD = "thread"
+EXECUTORS = (INLINE, THREAD)
+
+_thread_executor = None
+
+
+class PipelineError(KYOQAToolError):
+    """Raised when the registered stages cannot produce what they declare."""
+
+
+def _get_thread_executor() -> ThreadPoolExecutor:
+    global _thread_executor
+    if _thread_executor is None:
+        _thread_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="pipeline-stage")
+    return _thread_executor
+
+
+class Stage:
+    """One step of the pipeline.
+
+    ``func`` is called with the declared ``inputs`` as keyword arguments and
+    returns a dict holding exactly the declared ``outputs``. A ``cacheable``
+    stage must depend on nothing but the document itself, so its outputs can be
+    reused by any later run; bump ``version`` when its behaviour changes, or
+    make it a string naming the settings the outputs depend on.
+    """
+
+    def __init__(self, name: str, func, inputs=(), outputs=(), cacheable: bool = False, executor: str = INLINE, version: int | str = 1):
+        if executor not in EXECUTORS:
+            raise PipelineError(f"Stage '{name}' has unknown executor '{executor}'.")
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.cacheable = cacheable
+        self.executor = executor
+        self.version = version
+
+    def __repr__(self):
+        return f"Stage({self.name!r})"
+
+    def run(self, values: dict) -> dict:
+        outputs = self.func(**{key: values[key] for key in self.inputs}) or {}
+        missing = [key for key in self.outputs if key not in outputs]
+        if missing:
+            raise PipelineError(f"Stage '{self.name}' did not produce: {', '.join(missing)}")
+        return {key: outputs[key] for key in self.outputs}
+
+    def worth_caching(self, outputs: dict) -> bool:
+        """False when an output is missing or empty text, so a failed extraction is retried instead of cached."""
+        return self.cacheable and all(value is not None and value != "" for value in outputs.values())
+
+
+class StageOutputCache(Protocol):
+    """Where cacheable stage outputs are kept between runs, e.g. cache_store.StoreStageCache."""
+
+    def get(self, stage: Stage, document_key: str): ...
+
+    def put(self, stage: Stage, document_key: str, outputs: dict): ...
+
+
+class Pipeline:
+    """Runs registered stages as soon as their inputs are available.
+
+    Inline stages run on the calling thread, in registration order when
+    several are ready. Thread stages run alongside them, so an optional step
+    such as translation does not hold up the ones the result depends on.
+    Every stage is timed; cacheable stages are looked up before they run, and
+    empty outputs are never cached so a failed extraction is retried.
+    """
+
+    def __init__(self, stages=()):
+        self.stages = []
+        for stage in stages:
+            self.register(stage)
+
+    def register(self, stage: Stage) -> Stage:
+        """Adds a stage; its outputs must not clash with an existing stage's."""
+        produced = {key for existing in self.stages for key in existing.outputs}
+        clashes = produced.intersection(stage.outputs)
+        if clashes or any(existing.name == stage.name for existing in self.stages):
+            raise PipelineError(f"Stage '{stage.name}' clashes with a registered stage: {', '.join(sorted(clashes)) or stage.name}")
+        self.stages.append(stage)
+        return stage
+
+    def unregister(self, name: str):
+        self.stages = [stage for stage in self.stages if stage.name != name]
+
+    def _timed_run(self, stage: Stage, values: dict, cache, document_key):
+        started = time.perf_counter()
+        outputs = None
+        if stage.cacheable and cache is not None and document_key:
+            outputs = cache.get(stage, document_key)
+        if outputs is None:
+            outputs = stage.run(values)
+            if cache is not None and document_key and stage.worth_caching(outputs):
+                cache.put(stage, document_key, outputs)
+        return outputs, time.perf_counter() - started
+
+    def run(self, values: dict, cache: StageOutputCache = None, document_key: str = None, control=None):
+        """Runs every stage over ``values`` and returns (values, timings in seconds).
+
+        ``control`` is checked before each stage starts, so pause and cancel
+        take effect between stages as well as inside them.
+        """
+        values = dict(values)
+        timings = {}
+        pending = list(self.stages)
+        running = {}
+        try:
+            while pending or running:
+                ready = [stage for stage in pending if all(key in values for key in stage.inputs)]
+                for stage in ready:
+                    pending.remove(stage)
+                    if control is not None:
+                        control.check()
+                    if stage.executor == THREAD:
+                        future = _get_thread_executor().submit(self._timed_run, stage, dict(values), cache, document_key)
+                        running[future] = stage
+                        continue
+                    outputs, timings[stage.name] = self._timed_run(stage, values, cache, document_key)
+                    values.update(outputs)
+                if ready:
+                    continue
+                if not running:
+                    names = ", ".join(stage.name for stage in pending)
+                    raise PipelineError(f"Stages waiting on inputs nothing produces: {names}")
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    outputs, timings[stage.name] = future.result()
+                    values.update(outputs)
+        finally:
+            for future in running:
+                future.cancel()
+        return values, timings
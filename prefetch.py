@@ -0,0 +1,93 @@
+# prefetch.py
+# Read-ahead of upcoming PDFs so slow network shares overlap with processing
+import os
+import threading
+
+PREFETCH_AHEAD = 8
+PREFETCH_BYTE_BUDGET = 256 * 1024 * 1024
+# Bigger files are opened from their path by the worker instead of being copied through memory
+PREFETCH_MAX_FILE_BYTES = 64 * 1024 * 1024
+
+
+class Prefetcher:
+    """Reads PDFs into memory on a background thread, in the order they will be processed.
+
+    At most ``max_ahead`` documents and ``byte_budget`` bytes are held at
+    once; ``take`` hands a document's bytes over and frees its share of the
+    budget. Files that are too big, unreadable or asked for a second time
+    come back as None, and the caller falls back to opening the path.
+    """
+
+    def __init__(self, paths, max_ahead: int = PREFETCH_AHEAD, byte_budget: int = PREFETCH_BYTE_BUDGET, max_file_bytes: int = PREFETCH_MAX_FILE_BYTES):
+        self._order = [str(p) for p in paths]
+        self._pending = set(self._order)
+        self.max_ahead = max(1, max_ahead)
+        self.byte_budget = byte_budget
+        self.max_file_bytes = min(max_file_bytes, byte_budget)
+        self._loaded = {}
+        self._loaded_bytes = 0
+        self._closed = False
+        self._stalled = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._read_ahead, name="pdf-prefetch", daemon=True)
+
+    def start(self) -> "Prefetcher":
+        self._thread.start()
+        return self
+
+    def close(self):
+        """Stops reading ahead and drops anything not taken yet."""
+        with self._condition:
+            self._closed = True
+            self._loaded.clear()
+            self._loaded_bytes = 0
+            self._condition.notify_all()
+
+    def _has_room(self, size: int) -> bool:
+        return len(self._loaded) < self.max_ahead and self._loaded_bytes + size <= self.byte_budget
+
+    def _read_ahead(self):
+        for path in self._order:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = None
+            with self._condition:
+                if size is not None and size <= self.max_file_bytes and not self._has_room(size):
+                    self._stalled = True
+                    self._condition.notify_all()
+                    self._condition.wait_for(lambda: self._closed or self._has_room(size))
+                    self._stalled = False
+                if self._closed:
+                    return
+                if path not in self._pending:
+                    continue
+            data = None
+            if size is not None and size <= self.max_file_bytes:
+                try:
+                    with open(path, "rb") as f:
+                        data = f.read()
+                except OSError:
+                    data = None
+            with self._condition:
+                if self._closed:
+                    return
+                if path not in self._pending:
+                    continue
+                self._loaded[path] = data
+                self._loaded_bytes += len(data or b"")
+                self._condition.notify_all()
+
+    def take(self, path):
+        """Returns the bytes of ``path`` once they have been read, or None to read it directly."""
+        path = str(path)
+        with self._condition:
+            if path not in self._pending:
+                return None
+            # Taken out of order while the budget is full of earlier files: don't wait on them
+            self._condition.wait_for(lambda: self._closed or path in self._loaded or self._stalled)
+            self._pending.discard(path)
+            data = self._loaded.pop(path, None)
+            self._loaded_bytes -= len(data or b"")
+            self._condition.notify_all()
+            return data
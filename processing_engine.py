@@ -1,35 +1,60 @@
 # processing_engine.py
 # Compatible version that works with existing data_harvesters.py
 import shutil
-import time
+import hashlib
 import zipfile
 import json
-from queue import Queue
+import threading
+from queue import Queue, Empty
 from pathlib import Path
 from datetime import datetime
-import openpyxl
-from openpyxl.styles import PatternFill, Alignment
-from openpyxl.utils import get_column_letter
 
 # Import from our other modules
-from config import META_COLUMN_NAME, OUTPUT_DIR, PDF_TXT_DIR
-from custom_exceptions import FileLockError
-from data_harvesters import bulletproof_extraction  # Use the function that exists
-from file_utils import cleanup_temp_files, get_temp_dir, is_file_locked
-from ocr_utils import extract_text_from_pdf, _is_ocr_needed
-from recycle_utils import apply_recycles
+from cache_store import MISS_CORRUPT, MISS_FORCED, MISS_UNREADABLE, CacheStore, StoreStageCache
+from config import CACHE_DB_PATH, CACHE_DIR, CACHE_MAX_MB, CACHE_MEMORY_MB, CACHE_TTL_DAYS, OUTPUT_DIR, PDF_TXT_DIR
+from custom_exceptions import FileLockError, ProcessingCancelled
+from data_harvesters import bulletproof_extraction, pattern_fingerprint  # Use the function that exists
+from file_utils import cached_content_hash, cleanup_temp_files, get_temp_dir, is_file_locked
+from job_control import JobControl
+from ocr_utils import diagnose_unreadable_pdf, extract_text_from_pdf, _is_ocr_needed, _ocr_settings
+from pipeline import Pipeline, Stage
+from prefetch import Prefetcher
+from recycle_utils import RECYCLING_RULES, apply_recycles
+from run_state import record_run
+from sharding import load_partial_results, select_shard, write_partial_results
+from version import VERSION
+from workbook_updater import WorkbookUpdater
 
 # Cache directory for storing processed results
-CACHE_DIR = Path(__file__).parent / ".cache"
 CACHE_DIR.mkdir(exist_ok=True)
+# Per-file JSON caches written before the SQLite store existed
+LEGACY_CACHE_DIRS = (CACHE_DIR / "results", CACHE_DIR / "stages")
 
-def get_cache_path(pdf_path: Path) -> Path:
-    """Generates a unique cache file path based on the PDF's name and size."""
+def remove_legacy_cache():
+    """Deletes the JSON result and stage caches the SQLite store replaced, if they are still on disk."""
+    for folder in LEGACY_CACHE_DIRS:
+        if folder.is_dir():
+            shutil.rmtree(folder, ignore_errors=True)
+
+# Results and stage outputs live in one SQLite database; each worker opens its own connection
+# and keeps recently used entries in memory for the rest of the session
+CACHE_STORE = CacheStore(CACHE_DB_PATH, memory_bytes=CACHE_MEMORY_MB * 1024 * 1024)
+# Outputs of cacheable pipeline stages; they depend only on the PDF's content, so a re-run keeps them
+STAGE_CACHE = StoreStageCache(CACHE_STORE)
+# Reported for an unchanged PDF that an earlier run found unreadable; it is not opened again
+KNOWN_FAILURE_STATUS = "Fail (cached)"
+
+def get_document_key(pdf_path: Path, source: bytes = None) -> str | None:
+    """Identifies a PDF by the SHA-256 of its content, or None if it cannot be read."""
     try:
-        pdf_size = pdf_path.stat().st_size
-        return CACHE_DIR / f"{pdf_path.stem}_{pdf_size}.json"
-    except FileNotFoundError:
-        return CACHE_DIR / f"{pdf_path.stem}_unknown.json"
+        return cached_content_hash(pdf_path, source, CACHE_STORE)
+    except OSError:
+        return None
+
+def cache_fingerprint() -> str:
+    """Changes whenever the patterns, recycle rules, OCR settings or tool version behind a cached result change."""
+    payload = json.dumps([VERSION, pattern_fingerprint(), RECYCLING_RULES, _ocr_settings()])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
 
 def clear_review_folder():
     """Deletes all .txt files in the PDF_TXT directory."""
@@ -40,95 +65,299 @@ def clear_review_folder():
             except OSError as e:
                 print(f"Error deleting review file {f}: {e}")
 
-def clear_cache_folder():
-    """Deletes cached JSON results to force reprocessing."""
-    if CACHE_DIR.exists():
-        for f in CACHE_DIR.glob("*.json"):
-            try:
-                f.unlink()
-            except OSError as e:
-                print(f"Error deleting cache file {f}: {e}")
+def cache_budget() -> tuple:
+    """Returns the configured (max_bytes, ttl_seconds) for cache eviction."""
+    return CACHE_MAX_MB * 1024 * 1024, CACHE_TTL_DAYS * 86400 or None
 
-def process_single_pdf(pdf_path: Path, progress_queue: Queue, ignore_cache: bool = False) -> dict:
-    """Processes a single PDF, now with caching capabilities."""
-    filename = pdf_path.name
-    cache_path = get_cache_path(pdf_path)
+def clear_cache_folder():
+    """Deletes cached results to force reprocessing; extracted text is kept."""
+    CACHE_STORE.clear_results()
 
-    # Step 1: Check for a cached result
-    if not ignore_cache and cache_path.exists():
-        try:
-            with open(cache_path, 'r', encoding='utf-8') as f:
-                cached_data = json.load(f)
-            progress_queue.put({"type": "log", "tag": "info", "msg": f"Loaded from cache: {filename}"})
-            
-            if cached_data.get("status") == "Needs Review":
-                progress_queue.put({"type": "review_item", "data": cached_data.get("review_info")})
-            progress_queue.put({"type": "file_complete", "status": cached_data.get("status")})
-            if cached_data.get("ocr_used"):
-                 progress_queue.put({"type": "increment_counter", "counter": "ocr"})
-            return cached_data
-        except (json.JSONDecodeError, KeyError):
-             progress_queue.put({"type": "log", "tag": "warning", "msg": f"Corrupt cache for {filename}. Reprocessing..."})
-
-    # Step 2: If no cache, perform full processing
-    final_status = ""
-    review_info = None
+def _probe_stage(pdf_path, source, filename, progress_queue):
     progress_queue.put({"type": "status", "msg": filename, "led": "Queued"})
-    
-    ocr_required = _is_ocr_needed(pdf_path)
+    ocr_required = _is_ocr_needed(pdf_path, source)
     if ocr_required:
         progress_queue.put({"type": "status", "msg": filename, "led": "OCR"})
         progress_queue.put({"type": "increment_counter", "counter": "ocr"})
-    
-    extracted_text = extract_text_from_pdf(pdf_path)
-    # Apply recycle rules before harvesting
-    extracted_text = apply_recycles(extracted_text)
-    if not extracted_text or not extracted_text.strip():
-        final_status = "Fail"
-        result = {"filename": filename, "models": "Error: Text Extraction Failed", "author": "", "status": final_status, "ocr_used": ocr_required}
+    return {"ocr_required": ocr_required}
+
+def _extract_stage(pdf_path, source, control):
+    ocr_pages = []
+    raw_text = extract_text_from_pdf(pdf_path, control, source, page_cache=CACHE_STORE, ocr_pages=ocr_pages)
+    return {"raw_text": raw_text, "ocr_pages": ocr_pages}
+
+def _recycle_stage(raw_text):
+    return {"text": apply_recycles(raw_text)}
+
+def _harvest_stage(text, filename, progress_queue):
+    if not text or not text.strip():
+        return {"data": None}
+    progress_queue.put({"type": "status", "msg": filename, "led": "AI"})
+    return {"data": bulletproof_extraction(text, filename)}
+
+def _write_review_file(pdf_path, filename, text, data, reason="No models found") -> dict:
+    """Writes the text a reviewer checks for a PDF and returns the review item pointing at it."""
+    review_txt_path = PDF_TXT_DIR / f"{filename}.txt"
+    header = f"--- Original Filename: {filename} ---\n--- QA Number Found: {data.get('full_qa_number', 'None')} ---\n\n"
+    with open(review_txt_path, 'w', encoding='utf-8') as f:
+        f.write(header + text)
+    return {"filename": filename, "reason": reason, "txt_path": str(review_txt_path), "pdf_path": str(pdf_path)}
+
+def _review_stage(pdf_path, filename, text, data, ocr_required, ocr_pages, progress_queue):
+    if data is None:
+        result = {"filename": filename, "models": "Error: Text Extraction Failed", "author": "", "status": "Fail", "ocr_used": ocr_required, "ocr_pages": ocr_pages}
+        return {"result": result}
+
+    review_info = None
+    models_found = data.get("models")
+    if not models_found or models_found == "Not Found":
+        final_status = "Needs Review"
+        review_info = _write_review_file(pdf_path, filename, text, data)
+        progress_queue.put({"type": "review_item", "data": review_info})
+        data = {**data, "models": "Review Needed"}
     else:
-        progress_queue.put({"type": "status", "msg": filename, "led": "AI"})
-        # Use bulletproof_extraction function that exists in your data_harvesters.py
-        data = bulletproof_extraction(extracted_text, filename)
-        models_found = data.get("models")
-
-        if not models_found or models_found == "Not Found":
-            final_status = "Needs Review"
-            review_txt_path = PDF_TXT_DIR / f"{filename}.txt"
-            header = f"--- Original Filename: {filename} ---\n--- QA Number Found: {data.get('full_qa_number', 'None')} ---\n\n"
-            with open(review_txt_path, 'w', encoding='utf-8') as f:
-                f.write(header + extracted_text)
-            review_info = {"filename": filename, "reason": "No models found", "txt_path": str(review_txt_path), "pdf_path": str(pdf_path)}
-            progress_queue.put({"type": "review_item", "data": review_info})
-            data["models"] = "Review Needed"
-        else:
-            final_status = "Pass"
-            progress_queue.put({"type": "log", "tag": "success", "msg": f"Finished: {filename}. Found: {models_found}"})
-        
-        result = {"filename": filename, **data, "status": final_status, "ocr_used": ocr_required, "review_info": review_info}
+        final_status = "Pass"
+        progress_queue.put({"type": "log", "tag": "success", "msg": f"Finished: {filename}. Found: {models_found}"})
+    return {"result": {"filename": filename, **data, "status": final_status, "ocr_used": ocr_required, "ocr_pages": ocr_pages, "review_info": review_info}}
+
+def build_default_pipeline() -> Pipeline:
+    """probe -> extract -> recycle -> harvest -> review. Register extra stages on PDF_PIPELINE."""
+    return Pipeline([
+        Stage("probe", _probe_stage, inputs=("pdf_path", "source", "filename", "progress_queue"), outputs=("ocr_required",)),
+        # Extracted text depends on the OCR settings as well as the PDF, so they are part of the stage's version
+        Stage("extract", _extract_stage, inputs=("pdf_path", "source", "control"), outputs=("raw_text", "ocr_pages"), cacheable=True,
+              version=f"2:{_ocr_settings()}"),
+        Stage("recycle", _recycle_stage, inputs=("raw_text",), outputs=("text",)),
+        Stage("harvest", _harvest_stage, inputs=("text", "filename", "progress_queue"), outputs=("data",)),
+        Stage("review", _review_stage, inputs=("pdf_path", "filename", "text", "data", "ocr_required", "ocr_pages", "progress_queue"), outputs=("result",)),
+    ])
+
+PDF_PIPELINE = build_default_pipeline()
+
+def _cached_text(document_key: str) -> str:
+    """The recycled text of a PDF whose extract stage output is cached, or an empty string."""
+    extract = next(stage for stage in PDF_PIPELINE.stages if stage.name == "extract")
+    outputs = STAGE_CACHE.get(extract, document_key) or {}
+    return apply_recycles(outputs.get("raw_text") or "")
+
+def _result_for_file(cached_data: dict, pdf_path: Path, document_key: str) -> dict:
+    """Adapts a cached result to the PDF it was found for.
+
+    Results are keyed by content, so a copy of a PDF under another name hits
+    the result stored for the first one. The copy keeps its own filename and,
+    if it needs review, gets its own review file.
+    """
+    result = {**cached_data, "filename": pdf_path.name}
+    if result.get("status") == "Needs Review":
+        reason = (cached_data.get("review_info") or {}).get("reason", "No models found")
+        result["review_info"] = _write_review_file(pdf_path, pdf_path.name, _cached_text(document_key), result, reason)
+    return result
+
+def process_single_pdf(pdf_path: Path, progress_queue: Queue, ignore_cache: bool = False, control: JobControl = None, source: bytes = None) -> dict:
+    """Processes a single PDF, now with caching capabilities.
+
+    ``source`` holds the PDF's bytes when they were prefetched; the file is
+    then not opened again.
+
+    ``ignore_cache`` skips the cached result but still reuses cached stage
+    outputs such as extracted text, which do not depend on the patterns.
+    With a ``control``, the PDF waits while the job is paused and raises
+    ProcessingCancelled (without caching anything) when it is cancelled.
+
+    The returned result's ``cache`` entry records whether it was a cache hit,
+    and what that saved, or why it was a miss (see summarize_cache_stats).
+
+    A PDF that yields no text for a lasting reason (corrupt, password
+    protected, blank even after OCR) is remembered by its content hash and
+    reported as KNOWN_FAILURE_STATUS without being opened until the failures
+    are cleared, e.g. by a job with ``retry_failed``.
+    """
+    if control is not None:
+        control.check()
+    filename = pdf_path.name
+    document_key = get_document_key(pdf_path, source)
+    fingerprint = cache_fingerprint()
+
+    # Step 1: Skip known-bad PDFs, then check for a cached result
+    failure = CACHE_STORE.get_failure(document_key) if document_key else None
+    if failure is not None:
+        reason = failure.get("reason", "Unreadable PDF")
+        progress_queue.put({"type": "log", "tag": "warning", "msg": f"Skipped known-bad PDF: {filename} ({reason}). Retry failed PDFs to try it again."})
+        progress_queue.put({"type": "file_complete", "status": KNOWN_FAILURE_STATUS})
+        progress_queue.put({"type": "increment_counter", "counter": "cached"})
+        return {"filename": filename, "models": f"Error: {reason}", "author": "", "status": KNOWN_FAILURE_STATUS, "ocr_used": False,
+                "cache": {"hit": True, "bytes": len(source) if source is not None else _file_size(pdf_path), "seconds": failure.get("seconds", 0.0)}}
+    if document_key is None:
+        cached_data, miss_reason = None, MISS_UNREADABLE
+    elif ignore_cache:
+        cached_data, miss_reason = None, MISS_FORCED
+    else:
+        cached_data, miss_reason = CACHE_STORE.lookup_result(document_key, fingerprint, filename)
+    if cached_data is not None:
+        cached_data = _result_for_file(cached_data, pdf_path, document_key)
+        progress_queue.put({"type": "log", "tag": "info", "msg": f"Loaded from cache: {filename}"})
+        if cached_data.get("status") == "Needs Review":
+            progress_queue.put({"type": "review_item", "data": cached_data.get("review_info")})
+        progress_queue.put({"type": "file_complete", "status": cached_data.get("status")})
+        if cached_data.get("ocr_used"):
+            progress_queue.put({"type": "increment_counter", "counter": "ocr"})
+        progress_queue.put({"type": "increment_counter", "counter": "cached"})
+        # The stage times recorded when the result was cached are the time this hit saved
+        saved_seconds = sum((cached_data.pop("stage_times", None) or {}).values())
+        cached_data["cache"] = {"hit": True, "bytes": len(source) if source is not None else _file_size(pdf_path), "seconds": saved_seconds}
+        return cached_data
+    if miss_reason == MISS_CORRUPT:
+        progress_queue.put({"type": "log", "tag": "warning", "msg": f"Corrupt cache for {filename}. Reprocessing..."})
+
+    # Step 2: If no cache, run the stage pipeline
+    initial = {"pdf_path": pdf_path, "source": source, "filename": filename, "progress_queue": progress_queue, "control": control}
+    values, timings = PDF_PIPELINE.run(initial, cache=STAGE_CACHE, document_key=document_key, control=control)
+    result = values["result"]
+    final_status = result["status"]
+    if document_key and not (values.get("raw_text") or "").strip():
+        reason = diagnose_unreadable_pdf(pdf_path, source, values.get("ocr_pages"))
+        if reason:
+            CACHE_STORE.put_failure(document_key, {"reason": reason, "filename": filename, "seconds": sum(timings.values())})
+            result["models"] = f"Error: {reason}"
+            progress_queue.put({"type": "log", "tag": "warning", "msg": f"{filename}: {reason}. It will be skipped until failed PDFs are retried."})
 
     # Step 3: Save the result to cache before returning
-    with open(cache_path, 'w', encoding='utf-8') as f:
-        json.dump(result, f, indent=4)
+    result["stage_times"] = timings
+    if document_key:
+        CACHE_STORE.put_result(document_key, fingerprint, result)
 
     progress_queue.put({"type": "file_complete", "status": final_status})
+    result["cache"] = {"hit": False, "reason": miss_reason}
     return result
 
-def run_processing_job(job_info: dict, progress_queue: Queue, cancel_event):
-    """Main processing job function - this is what the main app calls."""
-    excel_path_str = job_info["excel_path"]
-    input_path = job_info["input_path"]
+def _file_size(pdf_path: Path) -> int:
+    try:
+        return pdf_path.stat().st_size
+    except OSError:
+        return 0
+
+def summarize_cache_stats(results) -> dict:
+    """Totals cache hits, misses by reason, and the PDF bytes and processing seconds that hits saved."""
+    stats = {"hits": 0, "misses": {}, "bytes_saved": 0, "seconds_saved": 0.0}
+    for result in results:
+        cache = result.get("cache")
+        if not cache:
+            continue
+        if cache.get("hit"):
+            stats["hits"] += 1
+            stats["bytes_saved"] += cache.get("bytes", 0)
+            stats["seconds_saved"] += cache.get("seconds", 0.0)
+        else:
+            reason = cache.get("reason", "unknown")
+            stats["misses"][reason] = stats["misses"].get(reason, 0) + 1
+    return stats
+
+def format_cache_stats(stats: dict) -> str:
+    lookups = stats["hits"] + sum(stats["misses"].values())
+    if not lookups:
+        return ""
+    text = (f"Cache: {stats['hits']} of {lookups} PDF(s) loaded from cache ({stats['hits'] / lookups:.0%}), "
+            f"{stats['bytes_saved'] / 1048576:.1f} MB and about {stats['seconds_saved']:.0f}s of processing saved")
+    if stats["misses"]:
+        text += "; misses: " + ", ".join(f"{count} {reason}" for reason, count in sorted(stats["misses"].items(), key=lambda item: -item[1]))
+    return text
+
+def warm_text_cache(pdf_path: Path, source: bytes = None, control: JobControl = None, refresh: bool = False) -> dict:
+    """Runs only the extract stage so a later job finds the PDF's text (and page OCR) cached.
+
+    Nothing is harvested, reviewed or written to a workbook. PDFs whose text
+    is already cached are skipped unless ``refresh`` is set, so an interrupted
+    warm-up picks up where it stopped.
+    """
+    filename = pdf_path.name
+    document_key = get_document_key(pdf_path, source)
+    if document_key is None:
+        return {"filename": filename, "status": "Unreadable"}
+    extract = next(stage for stage in PDF_PIPELINE.stages if stage.name == "extract")
+    if not refresh and STAGE_CACHE.get(extract, document_key) is not None:
+        return {"filename": filename, "status": "Already cached"}
+    outputs = extract.run({"pdf_path": pdf_path, "source": source, "control": control})
+    if not extract.worth_caching(outputs):
+        return {"filename": filename, "status": "No text"}
+    STAGE_CACHE.put(extract, document_key, outputs)
+    return {"filename": filename, "status": "Cached"}
+
+def summarize_stage_times(results) -> str:
+    """Totals per-stage time over freshly processed results, slowest first."""
+    totals = {}
+    for result in results:
+        for stage, seconds in (result.get("stage_times") or {}).items():
+            totals[stage] = totals.get(stage, 0.0) + seconds
+    return ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in sorted(totals.items(), key=lambda item: -item[1]))
+
+def _iter_pdf_results(pdf_files: list, progress_queue: Queue, control: JobControl, ignore_cache: bool, worker_pool=None):
+    """Yields one result per PDF, either in this process or on the shared worker pool."""
+    if worker_pool is None:
+        prefetcher = Prefetcher(pdf_files).start()
+        try:
+            for pdf_path in pdf_files:
+                source = prefetcher.take(pdf_path)
+                yield process_single_pdf(pdf_path, progress_queue, ignore_cache=ignore_cache, control=control, source=source)
+        except ProcessingCancelled:
+            return
+        finally:
+            prefetcher.close()
+            CACHE_STORE.flush()
+        return
+
+    for result, events in worker_pool.imap_pdfs(pdf_files, ignore_cache=ignore_cache, control=control):
+        for event in events:
+            progress_queue.put(event)
+        yield result
+
+def run_processing_job(job_info: dict, progress_queue: Queue, cancel_event, worker_pool=None):
+    """Main processing job function - this is what the main app calls.
+
+    ``cancel_event`` is either a JobControl, which also supports pause, or a
+    plain Event that only cancels. Cancel and pause are checked between
+    pages, so they take effect without waiting for the current document.
+
+    When a pre-warmed ``worker_pool`` is given, PDFs are processed on it in
+    parallel; otherwise they are processed one by one in this thread. Pass
+    the pool's own ``control`` so its workers see cancel and pause.
+
+    The cloned workbook is loaded on a WorkbookUpdater thread at job start
+    and each result is written to it as it arrives, leaving only the save
+    for the end of the batch.
+
+    Multi-machine batches use three optional keys: ``shard`` (index, count)
+    keeps only this machine's share of the input, ``partial_results_path``
+    writes the results there instead of updating a workbook, and
+    ``merge_partials`` skips processing and applies previously written
+    partial results to the cloned workbook.
+
+    With ``retry_failed``, PDFs remembered as unreadable are processed again.
+    """
+    excel_path_str = job_info.get("excel_path")
+    input_path = job_info.get("input_path")
     is_rerun = job_info.get("is_rerun", False)
-    pause_event = job_info.get("pause_event")
+    control = cancel_event if isinstance(cancel_event, JobControl) else JobControl(cancel_event)
+    shard = job_info.get("shard")
+    partial_results_path = job_info.get("partial_results_path")
+    merge_partials = job_info.get("merge_partials")
+    updater = None
 
     try:
         progress_queue.put({"type": "log", "tag": "info", "msg": "Processing job started."})
+        remove_legacy_cache()
+        CACHE_STORE.refresh()
+        CACHE_STORE.evict_in_background(*cache_budget())
+        if job_info.get("retry_failed"):
+            retried = CACHE_STORE.clear_failures()
+            progress_queue.put({"type": "log", "tag": "info", "msg": f"Retrying {retried} known-bad PDF(s)."})
 
-        if is_rerun:
+        if partial_results_path:
+            cloned_excel_path = None
+            clear_review_folder()
+        elif is_rerun:
             cloned_excel_path = Path(excel_path_str)
             progress_queue.put({"type": "log", "tag": "info", "msg": f"Re-running process on: {cloned_excel_path.name}"})
             clear_review_folder()
-            clear_cache_folder()
         else:
             progress_queue.put({"type": "status", "msg": "Cleaning review folder...", "led": "Setup"})
             clear_review_folder()
@@ -142,9 +371,15 @@ def run_processing_job(job_info: dict, progress_queue: Queue, cancel_event):
             shutil.copy(base_excel_path, cloned_excel_path)
             progress_queue.put({"type": "log", "tag": "success", "msg": f"Cloned file saved to: {cloned_excel_path}"})
 
+        if cloned_excel_path is not None:
+            # Load and index the workbook while the first PDFs are processing
+            updater = WorkbookUpdater(cloned_excel_path).start()
+
         # Determine files to process
         files_to_process = []
-        if isinstance(input_path, list):
+        if merge_partials:
+            pass
+        elif isinstance(input_path, list):
             files_to_process = [Path(f) for f in input_path]
         else:
             input_path = Path(input_path)
@@ -153,128 +388,131 @@ def run_processing_job(job_info: dict, progress_queue: Queue, cancel_event):
                 if f.suffix.lower() in ['.pdf', '.zip'] and PDF_TXT_DIR not in f.parents
             ]
         
+        pdf_files = [f for f in files_to_process if f.suffix.lower() == '.pdf']
+        if shard:
+            shard_index, shard_count = shard
+            pdf_files = select_shard(pdf_files, shard_index, shard_count, CACHE_STORE)
+            # Workers read the digests from the database instead of hashing the files again
+            CACHE_STORE.flush()
+            progress_queue.put({"type": "log", "tag": "info", "msg": f"Shard {shard_index}/{shard_count}: {len(pdf_files)} PDF(s) selected."})
+
         results_map = {}
-        for i, file_path in enumerate(files_to_process):
-            # Handle pause functionality
-            if pause_event and pause_event.is_set():
-                progress_queue.put({"type": "status", "msg": f"Paused. Waiting to resume...", "led": "Paused"})
-                while pause_event.is_set():
-                    if cancel_event.is_set(): 
-                        break
-                    time.sleep(0.5)
-
-            # Handle cancellation
-            if cancel_event.is_set(): 
-                break
-                
-            progress_queue.put({"type": "progress", "current": i + 1, "total": len(files_to_process)})
-            
-            if file_path.suffix.lower() == '.pdf':
-                result = process_single_pdf(file_path, progress_queue, ignore_cache=is_rerun)
-                results_map[result["filename"]] = result
+        if merge_partials:
+            results_map = load_partial_results(merge_partials)
+            progress_queue.put({"type": "log", "tag": "info", "msg": f"Loaded {len(results_map)} result(s) from {len(merge_partials)} partial file(s)."})
+        if updater is not None:
+            updater.expect([*results_map, *(f.name for f in pdf_files)])
+        for result in results_map.values():
+            updater.apply(result)
+        pdf_results = _iter_pdf_results(pdf_files, progress_queue, control, is_rerun, worker_pool)
+        for i, result in enumerate(pdf_results):
+            results_map[result["filename"]] = result
+            if updater is not None:
+                updater.apply(result)
+            progress_queue.put({"type": "progress", "current": i + 1, "total": len(pdf_files)})
         
-        if cancel_event.is_set():
+        if control.cancelled:
+            if updater is not None:
+                updater.abandon()
             progress_queue.put({"type": "finish", "status": "Cancelled"})
             return
 
-        # Update Excel file
+        stage_summary = summarize_stage_times(results_map.values())
+        if stage_summary:
+            progress_queue.put({"type": "log", "tag": "info", "msg": f"Time per stage: {stage_summary}"})
+        cache_stats = summarize_cache_stats(results_map.values())
+        cache_summary = format_cache_stats(cache_stats)
+        if cache_summary:
+            progress_queue.put({"type": "log", "tag": "info", "msg": cache_summary})
+        record_run({"pdfs": len(pdf_files), "rerun": is_rerun, "cache": cache_stats})
+
+        # Only now, after misses have been told apart, drop results from older patterns or rules
+        stale = CACHE_STORE.invalidate_stale(cache_fingerprint())
+        if stale:
+            progress_queue.put({"type": "log", "tag": "info", "msg": f"Dropped {stale} cached result(s) from older patterns or rules."})
+
+        if partial_results_path:
+            saved_path = write_partial_results(partial_results_path, results_map, shard)
+            progress_queue.put({"type": "log", "tag": "success", "msg": f"Partial results for {len(results_map)} PDF(s) saved to: {saved_path}"})
+            progress_queue.put({"type": "result_path", "path": str(saved_path)})
+            progress_queue.put({"type": "finish", "status": "Complete"})
+            return
+
+        # Apply anything still queued, then add rows for PDFs missing from the sheet
         progress_queue.put({"type": "status", "msg": f"Updating '{cloned_excel_path.name}'...", "led": "Saving"})
-        
-        workbook = openpyxl.load_workbook(cloned_excel_path)
-        sheet = workbook.active
-        headers = [cell.value for cell in sheet[1]]
-        
-        # Add Processing Status column if it doesn't exist
-        if "Processing Status" not in headers:
-            sheet.cell(row=1, column=len(headers) + 1).value = "Processing Status"
-            headers.append("Processing Status")
-            
-        try:
-            desc_col_idx = headers.index("Short description") + 1
-            meta_col_idx = headers.index(META_COLUMN_NAME) + 1
-            author_col_idx = headers.index("Author") + 1
-            status_col_idx = headers.index("Processing Status") + 1
-        except ValueError as e:
-            raise ValueError(f"Could not find required column in Excel: {e}")
-
-        updates_made = 0
-        appends_made = 0
-        pdfs_found_in_sheet = set()
-        
-        # Update existing rows
-        for row_idx in range(2, sheet.max_row + 1):
-            description = str(sheet.cell(row=row_idx, column=desc_col_idx).value or "")
-            for filename, data in results_map.items():
-                if Path(filename).stem in description:
-                    sheet.cell(row=row_idx, column=meta_col_idx).value = data["models"]
-                    sheet.cell(row=row_idx, column=author_col_idx).value = data.get("author", "")
-                    sheet.cell(row=row_idx, column=status_col_idx).value = f"{data['status']}{' (OCR)' if data['ocr_used'] else ''}"
-                    updates_made += 1
-                    pdfs_found_in_sheet.add(filename)
-                    break
-
-        # Add new rows for PDFs not found in sheet
-        pdfs_to_add = [data for filename, data in results_map.items() if filename not in pdfs_found_in_sheet]
-        if pdfs_to_add:
-            for data in pdfs_to_add:
-                new_row = [""] * len(headers)
-                new_row[desc_col_idx - 1] = data.get("short_description", data["filename"])
-                new_row[meta_col_idx - 1] = data["models"]
-                new_row[author_col_idx - 1] = data.get("author", "")
-                new_row[status_col_idx - 1] = f"{data['status']}{' (OCR)' if data['ocr_used'] else ''}"
-                sheet.append(new_row)
-                appends_made += 1
-
-        progress_queue.put({"type": "log", "tag": "info", "msg": f"{updates_made} existing rows updated, {appends_made} new rows appended."})
-        
-        # Apply formatting
-        progress_queue.put({"type": "status", "msg": "Applying final formatting...", "led": "Saving"})
-        green_fill = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
-        red_fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
-        yellow_fill = PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid")
-        blue_fill = PatternFill(start_color="DDEBF7", end_color="DDEBF7", fill_type="solid")
-        wrap_alignment = Alignment(wrap_text=True, vertical='top')
-        
-        for row in sheet.iter_rows(min_row=2):
-            status_val = str(row[status_col_idx-1].value or "")
-            fill_to_apply = None
-            if "Pass" in status_val: 
-                fill_to_apply = green_fill
-            elif "Fail" in status_val: 
-                fill_to_apply = red_fill
-            elif "Review" in status_val: 
-                fill_to_apply = yellow_fill
-                
-            for cell in row:
-                if fill_to_apply: 
-                    cell.fill = fill_to_apply
-                cell.alignment = wrap_alignment
-                
-            if "OCR" in status_val: 
-                row[status_col_idx - 1].fill = blue_fill
-        
-        # Adjust column widths
-        for i, column_cells in enumerate(sheet.columns):
-            max_length = 0
-            column = get_column_letter(i + 1)
-            for cell in column_cells:
-                try:
-                    if len(str(cell.value or "")) > max_length: 
-                        max_length = len(str(cell.value))
-                except: 
-                    pass
-            adjusted_width = (max_length + 2) if max_length < 50 else 50
-            sheet.column_dimensions[column].width = adjusted_width
+        updater.finish()
+        progress_queue.put({"type": "log", "tag": "info", "msg": f"{updater.updates_made} existing rows updated, {updater.appends_made} new rows appended."})
 
         # Save the workbook
         progress_queue.put({"type": "status", "msg": "Saving final XLSX file... Please be patient.", "led": "Saving"})
-        workbook.save(cloned_excel_path)
+        updater.save()
         progress_queue.put({"type": "log", "tag": "success", "msg": f"Successfully saved all changes to: {cloned_excel_path.name}"})
 
         progress_queue.put({"type": "result_path", "path": str(cloned_excel_path)})
         progress_queue.put({"type": "finish", "status": "Complete"})
 
     except Exception as e:
+        if updater is not None:
+            updater.abandon()
         error_message = f"A critical error occurred: {e}"
         progress_queue.put({"type": "log", "tag": "error", "msg": error_message})
-        progress_queue.put({"type": "finish", "status": f"Error: {e}"})
\ No newline at end of file
+        progress_queue.put({"type": "finish", "status": f"Error: {e}"})
+
+def _execute_job(job_info: dict, log_cb=None, progress_cb=None, status_cb=None, review_cb=None, cancel_cb=None):
+    """Runs a job to completion, forwarding its progress events to plain callbacks.
+
+    Used by the command line, where there is no Tk loop to drain the queue.
+    Returns the final status reported by the job.
+    """
+    progress_queue = Queue()
+    cancel_event = threading.Event()
+    job_thread = threading.Thread(target=run_processing_job, args=(job_info, progress_queue, cancel_event), daemon=True)
+    job_thread.start()
+
+    final_status = None
+    while job_thread.is_alive() or not progress_queue.empty():
+        try:
+            msg = progress_queue.get(timeout=0.2)
+        except Empty:
+            if cancel_cb and cancel_cb():
+                cancel_event.set()
+            continue
+
+        msg_type = msg.get("type")
+        if msg_type == "log" and log_cb:
+            log_cb(msg["msg"])
+        elif msg_type == "progress" and progress_cb:
+            progress_cb(f"Progress: {msg['current']}/{msg['total']}")
+        elif msg_type == "status" and status_cb:
+            status_cb(msg["msg"])
+        elif msg_type == "review_item" and review_cb:
+            review_cb(f"Needs review: {msg['data']['filename']}")
+        elif msg_type == "finish":
+            final_status = msg["status"]
+            if log_cb:
+                log_cb(f"Processing finished. Status: {final_status}")
+    return final_status
+
+def process_folder(folder, excel_path, log_cb=None, progress_cb=None, status_cb=None, review_cb=None, cancel_cb=None, **job_options):
+    """Processes every PDF in a folder against a copy of ``excel_path``."""
+    folder = Path(folder)
+    if not folder.is_dir():
+        raise FileNotFoundError(f"Input folder not found: {folder}")
+    job_info = {"excel_path": excel_path, "input_path": folder, **job_options}
+    return _execute_job(job_info, log_cb, progress_cb, status_cb, review_cb, cancel_cb)
+
+def process_zip_archive(zip_path, excel_path, log_cb=None, progress_cb=None, status_cb=None, review_cb=None, cancel_cb=None, **job_options):
+    """Extracts a ZIP of PDFs to the temp folder and processes it like a folder."""
+    zip_path = Path(zip_path)
+    extract_dir = get_temp_dir() / zip_path.stem
+    with zipfile.ZipFile(zip_path) as archive:
+        archive.extractall(extract_dir)
+    return process_folder(extract_dir, excel_path, log_cb, progress_cb, status_cb, review_cb, cancel_cb, **job_options)
+
+def merge_partial_results(partial_paths, excel_path, log_cb=None, progress_cb=None, status_cb=None, review_cb=None, cancel_cb=None):
+    """Applies partial results written by sharded runs to one copy of ``excel_path``."""
+    missing = [str(p) for p in partial_paths if not Path(p).is_file()]
+    if missing:
+        raise FileNotFoundError(f"Partial results not found: {', '.join(missing)}")
+    job_info = {"excel_path": excel_path, "merge_partials": [Path(p) for p in partial_paths]}
+    return _execute_job(job_info, log_cb, progress_cb, status_cb, review_cb, cancel_cb)
@@ -2,27 +2,60 @@
 # Version: 26.0.0
 # Last modified: 2025-07-03
 import json
+from datetime import datetime
 from config import CACHE_DIR
 
 STATE_FILE = CACHE_DIR / 'run_state.json'
+# How many finished runs are kept in the run record
+MAX_RECORDED_RUNS = 50
 
 
-def get_run_count() -> int:
+def _load_state() -> dict:
     try:
         with open(STATE_FILE, 'r', encoding='utf-8') as f:
             data = json.load(f)
-            return int(data.get('run_count', 0))
+            return data if isinstance(data, dict) else {}
     except Exception:
-        return 0
+        return {}
 
 
-def increment_run_count() -> int:
-    count = get_run_count() + 1
+def _save_state(state: dict):
     try:
         CACHE_DIR.mkdir(parents=True, exist_ok=True)
         with open(STATE_FILE, 'w', encoding='utf-8') as f:
-            json.dump({'run_count': count}, f)
+            json.dump(state, f)
     except Exception:
         pass
+
+
+def get_run_count() -> int:
+    try:
+        return int(_load_state().get('run_count', 0))
+    except Exception:
+        return 0
+
+
+def increment_run_count() -> int:
+    state = _load_state()
+    count = get_run_count() + 1
+    state['run_count'] = count
+    _save_state(state)
     return count
 
+
+def get_recorded_runs() -> list:
+    """Returns the recorded runs, oldest first."""
+    runs = _load_state().get('runs', [])
+    return runs if isinstance(runs, list) else []
+
+
+def record_run(record: dict) -> int:
+    """Counts a finished run and appends ``record`` (e.g. its cache statistics) to the run record."""
+    state = _load_state()
+    count = get_run_count() + 1
+    runs = get_recorded_runs()
+    runs.append({'run': count, 'finished': datetime.now().isoformat(timespec='seconds'), **record})
+    state['run_count'] = count
+    state['runs'] = runs[-MAX_RECORDED_RUNS:]
+    _save_state(state)
+    return count
@@ -0,0 +1,75 @@
+# sharding.py
+# Deterministic input sharding and portable partial results for multi-machine batches
+import json
+from datetime import datetime
+from pathlib import Path
+
+from file_utils import cached_content_hash
+from version import VERSION
+
+PARTIAL_RESULTS_FORMAT = "kyo-qa-partial-results"
+PARTIAL_RESULTS_VERSION = 1
+
+# Machine-local fields that mean nothing on the machine doing the merge
+_LOCAL_ONLY_FIELDS = ("review_info", "stage_times", "cache")
+
+
+def parse_shard(spec: str) -> tuple:
+    """Parses an "i/N" shard spec, where i is 1-based, into (index, count)."""
+    try:
+        index_text, count_text = spec.split("/")
+        index, count = int(index_text), int(count_text)
+    except (AttributeError, ValueError):
+        raise ValueError(f"Invalid shard '{spec}'. Use the form i/N, for example 2/4.")
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"Invalid shard '{spec}'. The index must be between 1 and N.")
+    return index, count
+
+
+def shard_for_hash(digest: str, count: int) -> int:
+    """Maps a hex content hash to a 1-based shard number."""
+    return int(digest[:16], 16) % count + 1
+
+
+def select_shard(pdf_files, index: int, count: int, memo=None) -> list:
+    """Keeps the PDFs whose content hash falls into shard ``index`` of ``count``.
+
+    Hashing the content rather than the path means every machine picks the
+    same split no matter where the share is mounted or how it is listed.
+    ``memo`` is passed to cached_content_hash.
+    """
+    return [pdf for pdf in pdf_files if shard_for_hash(cached_content_hash(pdf, memo=memo), count) == index]
+
+
+def write_partial_results(path, results_map: dict, shard=None) -> Path:
+    """Writes a shard's results to a self-contained JSON file and returns its path."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    results = [
+        {key: value for key, value in result.items() if key not in _LOCAL_ONLY_FIELDS}
+        for result in results_map.values()
+    ]
+    payload = {
+        "format": PARTIAL_RESULTS_FORMAT,
+        "format_version": PARTIAL_RESULTS_VERSION,
+        "tool_version": VERSION,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "shard": list(shard) if shard else None,
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+    return path
+
+
+def load_partial_results(paths) -> dict:
+    """Combines partial result files into one results map keyed by filename."""
+    results_map = {}
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+        if payload.get("format") != PARTIAL_RESULTS_FORMAT:
+            raise ValueError(f"{Path(path).name} is not a partial results file.")
+        for result in payload.get("results", []):
+            results_map[result["filename"]] = result
+    return results_map
@@ -0,0 +1,179 @@
+# tesseract_api.py
+# In-process Tesseract through its C API, so each worker loads the language model once
+import atexit
+import ctypes
+import ctypes.util
+import os
+import shutil
+import threading
+from pathlib import Path
+
+from custom_exceptions import ProcessingCancelled
+from logging_utils import setup_logger, log_info, log_warning
+
+logger = setup_logger("tesseract_api")
+
+OCR_LANGUAGE = "eng"
+# TessPageSegMode: full automatic layout analysis, the tesseract command's default (--psm 3)
+PSM_AUTO = 3
+
+# bool (*TessCancelFunc)(void* cancel_this, int words)
+_CANCEL_FUNC = ctypes.CFUNCTYPE(ctypes.c_bool, ctypes.c_void_p, ctypes.c_int)
+
+_SIGNATURES = {
+    "TessBaseAPICreate": ([], ctypes.c_void_p),
+    "TessBaseAPIInit3": ([ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p], ctypes.c_int),
+    "TessBaseAPISetPageSegMode": ([ctypes.c_void_p, ctypes.c_int], None),
+    # The image argument is a buffer's address (int) or a bytes object
+    "TessBaseAPISetImage": ([ctypes.c_void_p, ctypes.c_void_p, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int], None),
+    "TessBaseAPISetSourceResolution": ([ctypes.c_void_p, ctypes.c_int], None),
+    "TessBaseAPIRecognize": ([ctypes.c_void_p, ctypes.c_void_p], ctypes.c_int),
+    "TessBaseAPIGetUTF8Text": ([ctypes.c_void_p], ctypes.c_void_p),
+    "TessBaseAPIMeanTextConf": ([ctypes.c_void_p], ctypes.c_int),
+    "TessDeleteText": ([ctypes.c_void_p], None),
+    "TessBaseAPIClear": ([ctypes.c_void_p], None),
+    "TessBaseAPIEnd": ([ctypes.c_void_p], None),
+    "TessBaseAPIDelete": ([ctypes.c_void_p], None),
+    "TessMonitorCreate": ([], ctypes.c_void_p),
+    "TessMonitorSetCancelFunc": ([ctypes.c_void_p, _CANCEL_FUNC], None),
+    "TessMonitorDelete": ([ctypes.c_void_p], None),
+}
+
+
+def _library_candidates(tesseract_cmd: str) -> list:
+    """Libraries to try: the one installed next to the tesseract executable first, then the system's."""
+    candidates = []
+    resolved = shutil.which(tesseract_cmd) if tesseract_cmd else None
+    if resolved:
+        folder = Path(resolved).resolve().parent
+        for pattern in ("libtesseract*.dll", "tesseract*.dll", "libtesseract*.dylib", "libtesseract.so*"):
+            candidates.extend(str(path) for path in sorted(folder.glob(pattern)))
+    system = ctypes.util.find_library("tesseract")
+    if system:
+        candidates.append(system)
+    candidates.extend(("libtesseract.so.5", "libtesseract.so.4"))
+    return candidates
+
+
+def _load_library(path: str):
+    folder = Path(path).parent
+    if hasattr(os, "add_dll_directory") and folder.is_dir():
+        # The Windows installer keeps leptonica and friends beside libtesseract
+        os.add_dll_directory(str(folder))
+    lib = ctypes.CDLL(path)
+    for name, (argtypes, restype) in _SIGNATURES.items():
+        function = getattr(lib, name)
+        function.argtypes = argtypes
+        function.restype = restype
+    return lib
+
+
+def _tessdata_dir(tesseract_cmd: str):
+    resolved = shutil.which(tesseract_cmd) if tesseract_cmd else None
+    if resolved:
+        tessdata = Path(resolved).resolve().parent / "tessdata"
+        if tessdata.is_dir():
+            return str(tessdata)
+    return None
+
+
+class TesseractEngine:
+    """One initialised TessBaseAPI, reused for every page OCR'd in this process.
+
+    ``recognize`` takes raw pixel rows, so no temporary image file is written
+    and no tesseract process is started per page. With a job control, the
+    recognition is abandoned between words once the job is cancelled.
+    """
+
+    def __init__(self, lib, datapath: str = None, language: str = OCR_LANGUAGE):
+        self._lib = lib
+        self._lock = threading.Lock()
+        self._handle = lib.TessBaseAPICreate()
+        if lib.TessBaseAPIInit3(self._handle, datapath.encode("utf-8") if datapath else None, language.encode("utf-8")) != 0:
+            lib.TessBaseAPIDelete(self._handle)
+            self._handle = None
+            raise RuntimeError(f"Tesseract could not load the '{language}' language data")
+        # The C API starts in single-block mode; match the tesseract command so both paths read pages alike
+        lib.TessBaseAPISetPageSegMode(self._handle, PSM_AUTO)
+
+    def recognize(self, samples, width: int, height: int, bytes_per_pixel: int, bytes_per_line: int, control=None, dpi: int = None) -> tuple:
+        """OCRs one 8-bit grey, RGB or RGBA image; returns (text, mean word confidence from 0 to 100).
+
+        ``samples`` is the pixel data as bytes or the address of a buffer that
+        stays alive for the call, such as a pixmap's ``samples_ptr``. ``dpi``
+        is the resolution the image was rendered at.
+        """
+        lib = self._lib
+        with self._lock:
+            if self._handle is None:
+                raise RuntimeError("Tesseract engine is closed")
+            monitor = None
+            cancel = None
+            try:
+                lib.TessBaseAPISetImage(self._handle, samples, width, height, bytes_per_pixel, bytes_per_line)
+                if dpi:
+                    lib.TessBaseAPISetSourceResolution(self._handle, dpi)
+                if control is not None:
+                    cancel = _CANCEL_FUNC(lambda cancel_this, words: bool(control.cancelled))
+                    monitor = lib.TessMonitorCreate()
+                    lib.TessMonitorSetCancelFunc(monitor, cancel)
+                status = lib.TessBaseAPIRecognize(self._handle, monitor)
+                if control is not None and control.cancelled:
+                    raise ProcessingCancelled("OCR cancelled.")
+                if status != 0:
+                    raise RuntimeError(f"Tesseract could not recognise the page (status {status})")
+                confidence = lib.TessBaseAPIMeanTextConf(self._handle)
+                text_ptr = lib.TessBaseAPIGetUTF8Text(self._handle)
+                if not text_ptr:
+                    return "", confidence
+                try:
+                    return ctypes.string_at(text_ptr).decode("utf-8", errors="replace"), confidence
+                finally:
+                    lib.TessDeleteText(text_ptr)
+            finally:
+                lib.TessBaseAPIClear(self._handle)
+                if monitor is not None:
+                    lib.TessMonitorDelete(monitor)
+
+    def close(self):
+        with self._lock:
+            if self._handle is not None:
+                self._lib.TessBaseAPIEnd(self._handle)
+                self._lib.TessBaseAPIDelete(self._handle)
+                self._handle = None
+
+
+_engine = None
+_engine_pid = None
+_engine_lock = threading.Lock()
+
+
+def get_engine(tesseract_cmd: str):
+    """Returns this process's TesseractEngine, or None if libtesseract cannot be loaded.
+
+    The engine is created on first use and kept for the life of the process;
+    a failed attempt is remembered so callers fall back to the tesseract
+    command without trying again for every page.
+    """
+    global _engine, _engine_pid
+    with _engine_lock:
+        if _engine_pid == os.getpid():
+            return _engine
+        _engine, _engine_pid = None, os.getpid()
+        errors = []
+        for candidate in _library_candidates(tesseract_cmd):
+            try:
+                lib = _load_library(candidate)
+            except (OSError, AttributeError) as e:
+                errors.append(f"{candidate}: {e}")
+                continue
+            try:
+                _engine = TesseractEngine(lib, _tessdata_dir(tesseract_cmd))
+            except RuntimeError as e:
+                log_warning(logger, f"{e}; using the tesseract command instead.")
+                return None
+            atexit.register(_engine.close)
+            log_info(logger, f"Tesseract engine loaded in process {os.getpid()} from: {candidate}")
+            return _engine
+        log_info(logger, f"libtesseract not found; OCR uses the tesseract command ({'; '.join(errors) or 'no candidates'})")
+        return None
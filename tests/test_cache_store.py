@@ -0,0 +1,186 @@
+import sqlite3
+
+from cache_store import CacheStore, StoreStageCache
+from pipeline import Stage
+
+
+def test_writes_are_buffered_until_flush(tmp_path):
+    db_path = tmp_path / "cache.sqlite3"
+    store = CacheStore(db_path, batch_size=10)
+    store.put_result("abc", "fp1", {"filename": "a.pdf", "status": "Pass"})
+
+    assert store.get_result("abc", "fp1")["status"] == "Pass"
+    assert CacheStore(db_path).get_result("abc", "fp1") is None
+
+    store.flush()
+    assert CacheStore(db_path).get_result("abc", "fp1") == {"filename": "a.pdf", "status": "Pass"}
+    assert store.get_result("abc", "fp2") is None
+
+
+def test_full_batch_is_committed_in_one_go(tmp_path):
+    db_path = tmp_path / "cache.sqlite3"
+    store = CacheStore(db_path, batch_size=3)
+    for key in ("a", "b"):
+        store.put_result(key, "fp", {"filename": f"{key}.pdf", "status": "Pass"})
+    reader = CacheStore(db_path)
+    assert reader.get_result("a", "fp") is None
+
+    StoreStageCache(store).put(Stage("extract", None, version=2), "a", {"raw_text": "hello"})
+    assert reader.get_result("b", "fp")["filename"] == "b.pdf"
+    assert reader.get_stage("extract", 2, "a") == {"raw_text": "hello"}
+    assert StoreStageCache(store).get(Stage("extract", None, version=2), "a") == {"raw_text": "hello"}
+    assert StoreStageCache(store).get(Stage("extract", None, version=3), "a") is None
+
+
+def test_invalidate_by_status_and_fingerprint(tmp_path):
+    store = CacheStore(tmp_path / "cache.sqlite3")
+    store.put_result("a", "old", {"filename": "a.pdf", "status": "Pass"})
+    store.put_result("b", "new", {"filename": "b.pdf", "status": "Needs Review"})
+    store.put_result("c", "new", {"filename": "c.pdf", "status": "Pass"})
+    store.put_stage("extract", 1, "a", {"raw_text": "kept"})
+
+    assert store.invalidate(status="Needs Review") == 1
+    assert store.invalidate_stale("new") == 1
+    assert store.get_result("a", "old") is None
+    assert store.get_result("c", "new") is not None
+
+    assert store.clear_results() == 1
+    assert store.get_stage("extract", 1, "a") == {"raw_text": "kept"}
+
+
+def test_evict_drops_least_recently_used_first(tmp_path, monkeypatch):
+    clock = iter(range(100, 200))
+    monkeypatch.setattr("cache_store.time.time", lambda: next(clock))
+    store = CacheStore(tmp_path / "cache.sqlite3", batch_size=1)
+    for key in ("hot", "cold", "new"):
+        store.put_stage("extract", 1, key, {"raw_text": "x" * 100})
+    assert store.get_stage("extract", 1, "hot") is not None
+    store.flush()
+    with sqlite3.connect(store.db_path) as conn:
+        total = conn.execute("SELECT SUM(length(payload)) FROM stages").fetchone()[0]
+
+    removed, freed = store.evict(max_bytes=total - 1)
+
+    assert removed == 1 and freed > 0
+    assert store.get_stage("extract", 1, "cold") is None
+    assert store.get_stage("extract", 1, "hot") is not None
+    assert store.get_stage("extract", 1, "new") is not None
+
+
+def test_result_hit_keeps_its_text_fresh_and_ttl_expires_the_rest(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("cache_store.time.time", lambda: now[0])
+    store = CacheStore(tmp_path / "cache.sqlite3", batch_size=1)
+    for key in ("a", "b"):
+        store.put_stage("extract", 1, key, {"raw_text": key})
+        store.put_result(key, "fp", {"filename": f"{key}.pdf", "status": "Pass"})
+
+    now[0] = 5000.0
+    store.get_result("a", "fp")
+    store.flush()
+    removed, _ = store.compact(ttl_seconds=3600)
+
+    assert removed == 2
+    assert store.get_stage("extract", 1, "a") == {"raw_text": "a"}
+    assert store.get_stage("extract", 1, "b") is None
+    assert store.get_result("b", "fp") is None
+
+
+def test_payloads_are_stored_compressed_and_old_text_rows_still_read(tmp_path):
+    db_path = tmp_path / "cache.sqlite3"
+    store = CacheStore(db_path)
+    text = "Replace the fuser unit. " * 500
+    store.put_stage("extract", 1, "doc", {"raw_text": text})
+    store.flush()
+
+    with sqlite3.connect(db_path) as conn:
+        payload = conn.execute("SELECT payload FROM stages").fetchone()[0]
+        conn.execute("INSERT INTO pages VALUES ('legacy', '\"plain json\"', 0, 0)")
+    assert isinstance(payload, bytes) and len(payload) < len(text) // 10
+    assert CacheStore(db_path).get_stage("extract", 1, "doc") == {"raw_text": text}
+    assert CacheStore(db_path).get_page_text("legacy") == "plain json"
+
+
+def test_lookup_result_explains_misses(tmp_path):
+    from cache_store import MISS_CHANGED, MISS_NEW, MISS_PATTERN_CHANGE
+
+    store = CacheStore(tmp_path / "cache.sqlite3")
+    store.put_result("v1", "old", {"filename": "a.pdf", "status": "Pass"})
+    store.flush()
+
+    assert store.lookup_result("v1", "old", "a.pdf") == ({"filename": "a.pdf", "status": "Pass"}, None)
+    assert store.lookup_result("v1", "new", "a.pdf") == (None, MISS_PATTERN_CHANGE)
+    assert store.lookup_result("v2", "new", "a.pdf") == (None, MISS_CHANGED)
+    assert store.lookup_result("v3", "new", "b.pdf") == (None, MISS_NEW)
+
+
+def test_bundle_round_trip_merges_without_duplicates(tmp_path):
+    import pytest
+
+    laptop = CacheStore(tmp_path / "laptop.sqlite3")
+    laptop.put_stage("extract", 1, "doc", {"raw_text": "shared text"})
+    laptop.put_page_text("img:cover", "Kyocera Document Solutions")
+    laptop.put_result("doc", "fp", {"filename": "a.pdf", "status": "Pass"})
+    bundle = tmp_path / "team.kyocache"
+    assert laptop.export_bundle(bundle) == 2
+
+    newcomer = CacheStore(tmp_path / "new.sqlite3")
+    newcomer.put_page_text("img:cover", "local OCR wins")
+    assert newcomer.import_bundle(bundle) == 1
+    assert newcomer.import_bundle(bundle) == 0
+    assert newcomer.get_stage("extract", 1, "doc") == {"raw_text": "shared text"}
+    assert newcomer.get_page_text("img:cover") == "local OCR wins"
+    assert newcomer.get_result("doc", "fp") is None
+
+    not_a_bundle = tmp_path / "notes.txt"
+    not_a_bundle.write_text("hello")
+    with pytest.raises(ValueError):
+        newcomer.import_bundle(not_a_bundle)
+
+
+def test_failures_are_remembered_until_cleared(tmp_path):
+    store = CacheStore(tmp_path / "cache.sqlite3")
+    store.put_failure("bad", {"reason": "Password protected", "filename": "locked.pdf", "seconds": 4.0})
+    store.put_result("good", "fp", {"filename": "a.pdf", "status": "Pass"})
+    store.flush()
+
+    assert CacheStore(store.db_path).get_failure("bad")["reason"] == "Password protected"
+    assert store.get_failure("good") is None
+    assert store.clear_results() == 1
+    assert store.get_failure("bad") is not None
+    store.put_result("bad", "fp", {"filename": "locked.pdf", "status": "Fail"})
+    assert store.clear_failures() == 1
+    assert store.get_failure("bad") is None
+    assert store.get_result("bad", "fp") is None
+
+
+def test_memory_layer_serves_repeat_reads_until_another_process_deletes(tmp_path):
+    db_path = tmp_path / "cache.sqlite3"
+    writer = CacheStore(db_path)
+    writer.put_result("doc", "fp", {"filename": "a.pdf", "status": "Pass"})
+    writer.flush()
+    worker = CacheStore(db_path, memory_bytes=1024)
+    assert worker.lookup_result("doc", "fp")[0]["status"] == "Pass"
+
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DELETE FROM results")
+    assert worker.get_result("doc", "fp") == {"filename": "a.pdf", "status": "Pass"}
+
+    writer.put_result("other", "fp", {"filename": "b.pdf", "status": "Fail"})
+    assert writer.clear_results() == 1
+    assert worker.get_result("doc", "fp") == {"filename": "a.pdf", "status": "Pass"}
+    worker.refresh()
+    assert worker.get_result("doc", "fp") is None
+
+
+def test_repeat_read_is_served_from_memory_without_sql(tmp_path):
+    store = CacheStore(tmp_path / "cache.sqlite3", memory_bytes=1024)
+    store.put_result("doc", "fp", {"filename": "a.pdf", "status": "Pass"})
+    store.flush()
+    store.refresh()
+    statements = []
+    store._connection().set_trace_callback(statements.append)
+
+    assert store.lookup_result("doc", "fp")[0]["status"] == "Pass"
+    assert store.get_result("doc", "fp")["filename"] == "a.pdf"
+    assert statements == []
@@ -18,6 +18,9 @@ if 'PIL.Image' not in sys.modules:
 processing_stub = types.ModuleType("processing_engine")
 processing_stub.process_folder = lambda *a, **k: None
 processing_stub.process_zip_archive = lambda *a, **k: None
+processing_stub.merge_partial_results = lambda *a, **k: None
+processing_stub.CACHE_STORE = None
+processing_stub.cache_budget = lambda: (None, None)
 sys.modules.setdefault("processing_engine", processing_stub)
 
 # Stub Pillow's Image module
@@ -73,3 +76,20 @@ def test_main_runs(monkeypatch, tmp_path):
     cli_runner.main()
     assert zip_called
 
+
+
+def test_main_shard_writes_partial_results(monkeypatch, tmp_path):
+    called = {}
+
+    def fake_process_folder(folder, excel, *a, **job_options):
+        called['excel'] = excel
+        called.update(job_options)
+
+    monkeypatch.setattr(cli_runner, 'process_folder', fake_process_folder)
+    partial = tmp_path / "part.json"
+    monkeypatch.setattr(sys, 'argv', ['cli_runner.py', '--folder', str(tmp_path), '--shard', '2/3', '--partial-out', str(partial)])
+    cli_runner.main()
+
+    assert called['shard'] == (2, 3)
+    assert called['partial_results_path'] == partial
+    assert called['excel'] is None
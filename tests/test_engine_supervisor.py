@@ -0,0 +1,65 @@
+import queue
+
+from engine_supervisor import ENGINE_STOPPED_STATUS, EngineSupervisor
+from job_control import JobControl
+
+
+class FakeConn:
+    def __init__(self, messages):
+        self.messages = list(messages)
+
+    def recv(self):
+        if not self.messages:
+            raise EOFError
+        return self.messages.pop(0)
+
+
+class FakeProcess:
+    exitcode = -9
+
+    def join(self, timeout=None):
+        pass
+
+
+def _drain(q):
+    items = []
+    while not q.empty():
+        items.append(q.get_nowait())
+    return items
+
+
+def test_engine_crash_finishes_running_job_with_error():
+    q = queue.Queue()
+    supervisor = EngineSupervisor(q, JobControl())
+    process = FakeProcess()
+    supervisor._process = supervisor._job_process = process
+
+    supervisor._read_events(FakeConn([{"type": "log", "tag": "info", "msg": "working"}]), process)
+
+    messages = _drain(q)
+    assert messages[0]["msg"] == "working"
+    assert messages[-1] == {"type": "finish", "status": ENGINE_STOPPED_STATUS}
+    assert supervisor._process is None
+
+
+def test_finished_job_is_not_reported_twice():
+    q = queue.Queue()
+    supervisor = EngineSupervisor(q, JobControl())
+    process = FakeProcess()
+    supervisor._process = supervisor._job_process = process
+
+    supervisor._read_events(FakeConn([{"type": "finish", "status": "Complete"}]), process)
+
+    finishes = [m for m in _drain(q) if m["type"] == "finish"]
+    assert finishes == [{"type": "finish", "status": "Complete"}]
+
+
+def test_deliberate_shutdown_is_silent():
+    q = queue.Queue()
+    supervisor = EngineSupervisor(q, JobControl())
+    process = FakeProcess()
+    supervisor._job_process = process
+
+    supervisor._read_events(FakeConn([]), process)
+
+    assert _drain(q) == []
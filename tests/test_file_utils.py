@@ -3,7 +3,10 @@ from pathlib import Path
 
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
-from file_utils import is_file_locked, ensure_folders
+import os
+
+import file_utils
+from file_utils import is_file_locked, ensure_folders, cached_content_hash
 
 
 def test_is_file_locked(tmp_path: Path):
@@ -53,3 +56,47 @@ def test_ensure_folders_renames_pdf_txt(tmp_path: Path, monkeypatch):
     assert (tmp_path / 'NEED_REVIEW').exists()
 
 
+def test_cached_content_hash_reuses_unchanged_file(tmp_path: Path, monkeypatch):
+    pdf = tmp_path / "doc.pdf"
+    pdf.write_bytes(b"%PDF-1.4 first")
+    first = cached_content_hash(pdf)
+
+    def fail(_):
+        raise AssertionError("unchanged file was read again")
+
+    monkeypatch.setattr(file_utils, "content_hash", fail)
+    assert cached_content_hash(pdf) == first
+
+
+def test_cached_content_hash_rehashes_modified_file(tmp_path: Path):
+    pdf = tmp_path / "doc.pdf"
+    pdf.write_bytes(b"%PDF-1.4 first")
+    first = cached_content_hash(pdf)
+    pdf.write_bytes(b"%PDF-1.4 second!")
+    stat = os.stat(pdf)
+    os.utime(pdf, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert cached_content_hash(pdf) != first
+
+
+def test_cached_content_hash_is_remembered_across_processes(tmp_path: Path, monkeypatch):
+    from cache_store import CacheStore
+
+    pdf = tmp_path / "doc.pdf"
+    pdf.write_bytes(b"%PDF-1.4 first")
+    store = CacheStore(tmp_path / "cache.db")
+    first = cached_content_hash(pdf, memo=store)
+    store.flush()
+
+    def fail(_):
+        raise AssertionError("unchanged file was read again")
+
+    # A new session: empty in-process memo, fresh connection to the same database
+    monkeypatch.setattr(file_utils, "_content_hash_memo", {})
+    monkeypatch.setattr(file_utils, "content_hash", fail)
+    assert cached_content_hash(pdf, memo=CacheStore(tmp_path / "cache.db")) == first
+
+    monkeypatch.undo()
+    pdf.write_bytes(b"%PDF-1.4 second!")
+    stat = os.stat(pdf)
+    os.utime(pdf, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert cached_content_hash(pdf, memo=CacheStore(tmp_path / "cache.db")) != first
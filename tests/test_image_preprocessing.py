@@ -0,0 +1,124 @@
+import sys
+import types
+
+import pytest
+
+import image_preprocessing
+
+STEPS = ("OCR_TRIM_MARGINS", "OCR_DENOISE", "OCR_DESKEW", "OCR_BINARIZE")
+
+
+def _installed_opencv():
+    """The real cv2 and numpy, which tests/__init__.py stubs out, or None when they are not installed."""
+    stubs = {name: sys.modules.pop(name) for name in ("cv2", "numpy") if not hasattr(sys.modules.get(name), "__file__")}
+    try:
+        import cv2
+        import numpy
+    except ImportError:
+        return None
+    finally:
+        sys.modules.update(stubs)
+    return cv2, numpy
+
+
+OPENCV = _installed_opencv()
+
+
+@pytest.fixture
+def opencv(monkeypatch):
+    if OPENCV is None:
+        pytest.skip("OpenCV and NumPy are not installed")
+    cv2, np = OPENCV
+    monkeypatch.setitem(sys.modules, "cv2", cv2)
+    monkeypatch.setitem(sys.modules, "numpy", np)
+    return cv2, np
+
+
+def _only(monkeypatch, step):
+    for flag in STEPS:
+        monkeypatch.setattr(image_preprocessing, flag, flag == step)
+
+
+def _pixmap(np, gray):
+    rgb = np.ascontiguousarray(np.dstack([gray] * 3))
+    height, width = gray.shape
+    return types.SimpleNamespace(samples_mv=memoryview(rgb).cast("B"), width=width, height=height, n=3, stride=width * 3)
+
+
+def _ruled_page(cv2, np, tilt=0.0):
+    page = np.full((1000, 800), 255, np.uint8)
+    for y in range(200, 800, 40):
+        cv2.rectangle(page, (150, y), (650, y + 12), 0, -1)
+    rotation = cv2.getRotationMatrix2D((400, 500), tilt, 1.0)
+    return cv2.warpAffine(page, rotation, (800, 1000), borderValue=255)
+
+
+def _ink(cv2, gray):
+    return cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
+
+
+def test_page_is_left_alone_when_every_step_is_off(monkeypatch):
+    for flag in STEPS:
+        monkeypatch.setattr(image_preprocessing, flag, False)
+    pix = types.SimpleNamespace(width=2, height=2, n=3, stride=6)
+
+    assert image_preprocessing.preprocess_page(pix) is pix
+
+
+def test_page_is_left_alone_without_opencv(monkeypatch):
+    monkeypatch.setitem(sys.modules, "cv2", None)
+    pix = types.SimpleNamespace(width=2, height=2, n=3, stride=6)
+
+    assert image_preprocessing.preprocess_page(pix) is pix
+
+
+def test_trim_removes_the_white_margin(opencv, monkeypatch):
+    cv2, np = opencv
+    _only(monkeypatch, "OCR_TRIM_MARGINS")
+    page = np.full((600, 400), 255, np.uint8)
+    page[200:260, 100:300] = 0
+
+    prepared = image_preprocessing.preprocess_page(_pixmap(np, page))
+
+    padding = image_preprocessing.TRIM_PADDING
+    assert (prepared.width, prepared.height, prepared.n) == (200 + 2 * padding, 60 + 2 * padding, 1)
+    assert prepared.stride == prepared.width
+    assert len(prepared.samples_mv) == prepared.width * prepared.height
+
+
+def test_deskew_straightens_a_rotated_block_of_lines(opencv, monkeypatch):
+    cv2, np = opencv
+    _only(monkeypatch, "OCR_DESKEW")
+    for tilt in (4.0, -4.0):
+        page = _ruled_page(cv2, np, tilt)
+        assert abs(image_preprocessing._skew_angle(_ink(cv2, page))) > 3
+
+        prepared = image_preprocessing.preprocess_page(_pixmap(np, page))
+
+        assert abs(image_preprocessing._skew_angle(_ink(cv2, prepared._array))) < image_preprocessing.MIN_DESKEW_DEGREES
+
+
+def test_binarize_leaves_only_black_and_white(opencv, monkeypatch):
+    cv2, np = opencv
+    _only(monkeypatch, "OCR_BINARIZE")
+    # Grey text on a background that darkens across the page, like a faxed bulletin
+    page = np.tile(np.linspace(250, 150, 800).astype(np.uint8), (1000, 1))
+    page[_ruled_page(cv2, np) == 0] = 60
+
+    prepared = image_preprocessing.preprocess_page(_pixmap(np, page))
+
+    assert set(np.unique(prepared._array)) == {0, 255}
+    assert prepared._array[206, 400] == 0 and prepared._array[100, 790] == 255
+
+
+def test_denoise_keeps_the_shape_and_removes_specks(opencv, monkeypatch):
+    cv2, np = opencv
+    _only(monkeypatch, "OCR_DENOISE")
+    page = _ruled_page(cv2, np)
+    page[100, 100] = 0
+
+    prepared = image_preprocessing.preprocess_page(_pixmap(np, page))
+
+    assert prepared._array.shape == page.shape and prepared._array.dtype == np.uint8
+    assert prepared._array[100, 100] == 255
+    assert prepared._array[206, 400] == 0
@@ -0,0 +1,43 @@
+import threading
+import time
+
+import pytest
+
+from custom_exceptions import ProcessingCancelled
+from job_control import JobControl
+
+
+def test_check_passes_when_running():
+    JobControl().check()
+
+
+def test_cancel_wakes_paused_waiter():
+    control = JobControl()
+    control.pause()
+    outcome = []
+
+    def worker():
+        try:
+            control.check()
+            outcome.append("ran")
+        except ProcessingCancelled:
+            outcome.append("cancelled")
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    time.sleep(0.05)
+    assert outcome == []
+
+    control.cancel()
+    thread.join(timeout=1)
+    assert outcome == ["cancelled"]
+
+
+def test_reset_clears_cancel_and_pause():
+    control = JobControl()
+    control.cancel()
+    with pytest.raises(ProcessingCancelled):
+        control.check()
+    control.reset()
+    assert not control.cancelled and not control.paused
+    control.check()
@@ -0,0 +1,20 @@
+from layout_analysis import select_regions
+
+
+def test_header_blocks_and_tables_are_kept_and_merged():
+    header = [(40, 20, 200, 30), (230, 25, 150, 30)]
+    body_text = [(40, 600, 400, 20)]
+    table = [(40, 300, 420, 120)]
+
+    regions = select_regions(header + body_text, table, 500, 700)
+
+    assert len(regions) == 2
+    top, models = regions
+    assert top[0] < 40 / 500 and top[2] > 380 / 500 and top[3] < 0.1
+    assert models[1] < 300 / 700 < models[3]
+    assert all(0 <= value <= 1 for region in regions for value in region)
+
+
+def test_nothing_found_or_most_of_the_page_means_whole_page_ocr():
+    assert select_regions([(40, 600, 400, 20)], [], 500, 700) == []
+    assert select_regions([], [(10, 10, 480, 680)], 500, 700) == []
@@ -107,3 +107,301 @@ def test_extract_text_from_pdf_ocr_failure(monkeypatch, caplog):
     assert any(
         "OCR extraction failed" in record.message for record in caplog.records
     )
+
+
+def test_run_tesseract_killed_on_cancel(monkeypatch, tmp_path):
+    import os
+    import threading
+    import time
+    import pytest
+    from custom_exceptions import ProcessingCancelled
+    from job_control import JobControl
+
+    slow_tesseract = tmp_path / "tesseract"
+    slow_tesseract.write_text("#!/bin/sh\nexec sleep 30\n")
+    os.chmod(slow_tesseract, 0o755)
+    monkeypatch.setattr(ocr_utils, "get_tesseract_cmd", lambda: str(slow_tesseract))
+
+    class FakeImage:
+        def save(self, path):
+            open(path, "wb").close()
+
+    control = JobControl(threading.Event())
+    threading.Timer(0.2, control.cancel).start()
+    started = time.monotonic()
+    with pytest.raises(ProcessingCancelled):
+        ocr_utils._run_tesseract(FakeImage(), control)
+    assert time.monotonic() - started < 1.5
+
+
+class _PageCache(dict):
+    def get_page_text(self, key):
+        return self.get(key)
+
+    def put_page_text(self, key, text):
+        self[key] = text
+
+
+def test_identical_scanned_pages_are_ocrd_once(monkeypatch):
+    class ScannedPage:
+        rect = types.SimpleNamespace(width=612, height=792)
+        rotation = 0
+
+        def __init__(self, stream):
+            self.parent = types.SimpleNamespace(xref_stream_raw=lambda xref: stream)
+            self.rendered = 0
+
+        def get_text(self, *args, **kwargs):
+            return ""
+
+        def get_images(self, full=False):
+            return [(7,)]
+
+        def get_image_rects(self, xref):
+            return [(0, 0, 612, 792)]
+
+        def get_pixmap(self, dpi=300):
+            self.rendered += 1
+            return types.SimpleNamespace(tobytes=lambda fmt: b"")
+
+    cover, body = ScannedPage(b"cover scan"), ScannedPage(b"body scan")
+    second_cover = ScannedPage(b"cover scan")
+    first, second = DummyDoc(), DummyDoc()
+    first.pages = [cover, body]
+    second.pages = [second_cover]
+    docs = iter([first, second])
+    monkeypatch.setattr(ocr_utils, "TESSERACT_AVAILABLE", True)
+    monkeypatch.setattr(ocr_utils, "_open_pdf", lambda source: next(docs))
+    monkeypatch.setattr(ocr_utils, "_tesseract_engine", lambda: None)
+    monkeypatch.setattr(ocr_utils, "_pixmap_image", lambda pix: pix)
+    ocr_calls = []
+    monkeypatch.setattr(ocr_utils, "_ocr_image", lambda img, control=None, dpi=None: (ocr_calls.append(img) or f"text {len(ocr_calls)}", 95))
+    cache = _PageCache()
+
+    assert ocr_utils.extract_text_with_ocr("a.pdf", page_cache=cache) == "text 1\n\ntext 2"
+    assert ocr_utils.extract_text_with_ocr("b.pdf", page_cache=cache) == "text 1"
+    assert len(ocr_calls) == 2
+    assert second_cover.rendered == 0
+
+
+def test_pages_without_one_image_are_keyed_by_pixels(monkeypatch):
+    class RenderedPage(DummyPage):
+        def get_images(self, full=False):
+            return []
+
+        def get_pixmap(self, dpi=300):
+            return types.SimpleNamespace(width=1, height=1, samples=b"\x00", tobytes=lambda fmt: b"")
+
+    doc = DummyDoc()
+    doc.pages = [RenderedPage(), RenderedPage()]
+    monkeypatch.setattr(ocr_utils, "TESSERACT_AVAILABLE", True)
+    monkeypatch.setattr(ocr_utils, "_open_pdf", lambda source: doc)
+    monkeypatch.setattr(ocr_utils, "_tesseract_engine", lambda: None)
+    monkeypatch.setattr(ocr_utils, "_pixmap_image", lambda pix: pix)
+    ocr_calls = []
+    monkeypatch.setattr(ocr_utils, "_ocr_image", lambda img, control=None, dpi=None: (ocr_calls.append(img) or "disclaimer", 95))
+
+    assert ocr_utils.extract_text_with_ocr("c.pdf", page_cache=_PageCache()) == "disclaimer\n\ndisclaimer"
+    assert len(ocr_calls) == 1
+
+
+def test_diagnose_unreadable_pdf_reports_only_lasting_problems(monkeypatch):
+    def broken(source):
+        raise RuntimeError("cannot find startxref")
+
+    locked = DummyDoc()
+    locked.needs_pass, locked.is_pdf = True, True
+    scanned = DummyDoc()
+    scanned.needs_pass, scanned.is_pdf = False, True
+
+    monkeypatch.setattr(ocr_utils, "_open_pdf", broken)
+    assert ocr_utils.diagnose_unreadable_pdf("bad.pdf") == "Corrupt PDF (cannot find startxref)"
+    monkeypatch.setattr(ocr_utils, "_open_pdf", lambda source: locked)
+    assert ocr_utils.diagnose_unreadable_pdf("locked.pdf") == "Password protected"
+    monkeypatch.setattr(ocr_utils, "_open_pdf", lambda source: scanned)
+    assert ocr_utils.diagnose_unreadable_pdf("scan.pdf") is None
+    assert ocr_utils.diagnose_unreadable_pdf("scan.pdf", ocr_pages=[{"page": 1, "error": "tesseract crashed"}]) is None
+    read = [{"page": 1, "error": "tesseract crashed"}, {"page": 2, "dpi": 200, "confidence": 0, "regions": 0}]
+    assert ocr_utils.diagnose_unreadable_pdf("scan.pdf", ocr_pages=read) == "No text found, even with OCR"
+
+
+def test_pages_go_to_the_loaded_engine_without_a_png(monkeypatch):
+    class Engine:
+        def recognize(self, samples, width, height, bytes_per_pixel, bytes_per_line, control=None, dpi=None):
+            calls.append((samples, width, height, bytes_per_pixel, bytes_per_line))
+            return "engine text", 90
+
+    class RawPage(DummyPage):
+        def get_images(self, full=False):
+            return []
+
+        def get_pixmap(self, dpi=300):
+            return types.SimpleNamespace(samples=b"\xff" * 6, width=2, height=1, n=3, stride=6)
+
+    doc = DummyDoc()
+    doc.pages = [RawPage()]
+    calls = []
+    monkeypatch.setattr(ocr_utils, "TESSERACT_AVAILABLE", True)
+    monkeypatch.setattr(ocr_utils, "_open_pdf", lambda source: doc)
+    monkeypatch.setattr(ocr_utils, "_tesseract_engine", lambda: Engine())
+
+    assert ocr_utils.extract_text_with_ocr("d.pdf") == "engine text"
+    assert calls == [(b"\xff" * 6, 2, 1, 3, 6)]
+
+
+def test_pixmap_reaches_pil_without_a_png_round_trip(monkeypatch):
+    def no_png(fmt):
+        raise AssertionError("pixmap was encoded")
+
+    pixels = memoryview(bytearray(b"\x10\x20\x30" * 4))
+    pix = types.SimpleNamespace(n=3, width=2, height=2, stride=6, samples_mv=pixels, tobytes=no_png)
+    calls = []
+    monkeypatch.setitem(sys.modules, "PIL", types.SimpleNamespace(Image=types.SimpleNamespace(frombuffer=lambda *args: calls.append(args) or "image")))
+
+    assert ocr_utils._pixmap_image(pix) == "image"
+    assert calls == [("RGB", (2, 2), pixels, "raw", "RGB", 6, 1)]
+    assert ocr_utils.pixmap_key(pix).startswith(f"pix:{ocr_utils._ocr_settings()}:2x2:")
+
+
+def test_low_confidence_pages_climb_the_dpi_ladder(monkeypatch):
+    class LadderPage(DummyPage):
+        def __init__(self, small_print):
+            self.small_print = small_print
+            self.rendered = []
+
+        def get_images(self, full=False):
+            return []
+
+        def get_pixmap(self, dpi=300):
+            self.rendered.append(dpi)
+            return types.SimpleNamespace(dpi=dpi, small_print=self.small_print)
+
+    def fake_ocr(pix, control=None, dpi=None):
+        if pix.small_print and dpi < 300:
+            return "TASKa1fa 4O53ci", 41
+        return f"TASKalfa 4053ci at {dpi}", 93
+
+    large, small = LadderPage(False), LadderPage(True)
+    doc = DummyDoc()
+    doc.pages = [large, small]
+    monkeypatch.setattr(ocr_utils, "TESSERACT_AVAILABLE", True)
+    monkeypatch.setattr(ocr_utils, "_open_pdf", lambda source: doc)
+    monkeypatch.setattr(ocr_utils, "OCR_DPI_LADDER", (150, 300))
+    monkeypatch.setattr(ocr_utils, "OCR_MIN_CONFIDENCE", 80)
+    monkeypatch.setattr(ocr_utils, "_ocr_pixmap", fake_ocr)
+    monkeypatch.setattr(ocr_utils, "_prepare_pixmap", lambda pix: pix)
+    monkeypatch.setattr(ocr_utils, "_layout_regions", lambda page, pix: [])
+
+    ocr_pages = []
+    text = ocr_utils.extract_text_with_ocr("e.pdf", ocr_pages=ocr_pages)
+
+    assert text == "TASKalfa 4053ci at 150\n\nTASKalfa 4053ci at 300"
+    assert [(page["page"], page["dpi"], page["confidence"]) for page in ocr_pages] == [(1, 150, 93), (2, 300, 93)]
+    assert large.rendered == [150]
+    assert small.rendered == [150, 300]
+
+
+def test_tesseract_tsv_confidence_ignores_non_words():
+    tsv = "\n".join([
+        "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext",
+        "1\t1\t0\t0\t0\t0\t0\t0\t100\t100\t-1\t",
+        "5\t1\t1\t1\t1\t1\t5\t5\t20\t10\t96.5\tTASKalfa",
+        "5\t1\t1\t1\t1\t2\t30\t5\t20\t10\t71.5\t4053ci",
+    ])
+    assert ocr_utils._mean_confidence(tsv) == 84.0
+    assert ocr_utils._mean_confidence(tsv.splitlines()[0]) == 0.0
+
+
+def test_only_layout_regions_are_ocrd_unless_they_come_back_empty(monkeypatch):
+    class FormPage:
+        def __init__(self, region_text):
+            self.region_text = region_text
+            self.clips = []
+
+        def get_pixmap(self, dpi=300, clip=None):
+            self.clips.append(clip)
+            return types.SimpleNamespace(clip=clip)
+
+    def fake_ocr(pix, control=None, dpi=None):
+        if pix.clip is None:
+            return "whole page", 90
+        return page.region_text, (95 if page.region_text else 0)
+
+    monkeypatch.setattr(ocr_utils, "OCR_DPI_LADDER", (150, 300))
+    monkeypatch.setattr(ocr_utils, "_ocr_pixmap", fake_ocr)
+    monkeypatch.setattr(ocr_utils, "_prepare_pixmap", lambda pix: pix)
+    monkeypatch.setattr(ocr_utils, "_layout_regions", lambda page, pix: [(0, 0, 600, 200), (0, 300, 600, 500)])
+
+    page = FormPage("QA 2PJ-0001")
+    first_render = page.get_pixmap(dpi=150)
+    assert ocr_utils._ocr_page(page, first_render) == ("QA 2PJ-0001\nQA 2PJ-0001", 150, 95, 2)
+    assert page.clips == [None, (0, 0, 600, 200), (0, 300, 600, 500)]
+
+    page = FormPage("")
+    assert ocr_utils._ocr_page(page, page.get_pixmap(dpi=150)) == ("whole page", 150, 90, 0)
+
+
+def test_whole_page_fallback_starts_where_the_regions_stopped(monkeypatch):
+    class FormPage:
+        def __init__(self, whole_confidence):
+            self.whole_confidence = whole_confidence
+            self.renders = []
+
+        def get_pixmap(self, dpi=300, clip=None):
+            self.renders.append((dpi, clip is not None))
+            return types.SimpleNamespace(clip=clip, dpi=dpi)
+
+    def fake_ocr(pix, control=None, dpi=None):
+        if pix.clip is None:
+            return "whole page", page.whole_confidence
+        return "QA 2PJ-0001", 50
+
+    monkeypatch.setattr(ocr_utils, "OCR_DPI_LADDER", (150, 300))
+    monkeypatch.setattr(ocr_utils, "OCR_MIN_CONFIDENCE", 80)
+    monkeypatch.setattr(ocr_utils, "_ocr_pixmap", fake_ocr)
+    monkeypatch.setattr(ocr_utils, "_prepare_pixmap", lambda pix: pix)
+    monkeypatch.setattr(ocr_utils, "_layout_regions", lambda page, pix: [(0, 0, 600, 200)])
+
+    page = FormPage(70)
+    assert ocr_utils._ocr_page(page, page.get_pixmap(dpi=150)) == ("whole page", 300, 70, 0)
+    assert page.renders == [(150, False), (150, True), (300, True), (300, False)]
+
+    page = FormPage(30)
+    assert ocr_utils._ocr_page(page, page.get_pixmap(dpi=150)) == ("QA 2PJ-0001", 150, 50, 1)
+
+
+def test_cleaned_up_page_is_what_gets_ocrd(monkeypatch):
+    rendered = types.SimpleNamespace(width=1240, height=1754, n=3)
+    cleaned = types.SimpleNamespace(width=1100, height=1500, n=1)
+    seen = []
+
+    def fake_ocr(pix, control=None, dpi=None):
+        seen.append(pix)
+        return "QA 2PJ-0001", 95
+
+    monkeypatch.setattr(ocr_utils, "OCR_DPI_LADDER", (150,))
+    monkeypatch.setattr(ocr_utils, "_ocr_pixmap", fake_ocr)
+    monkeypatch.setattr("image_preprocessing.preprocess_page", lambda pix: cleaned)
+    assert ocr_utils._ocr_ladder(lambda dpi: [rendered]) == ("QA 2PJ-0001", 150, 95)
+    assert seen == [cleaned]
+
+    def broken(pix):
+        raise ValueError("bad buffer")
+
+    monkeypatch.setattr("image_preprocessing.preprocess_page", broken)
+    ocr_utils._ocr_ladder(lambda dpi: [rendered])
+    assert seen[-1] is rendered
+
+
+def test_every_ocr_setting_is_part_of_the_cache_keys(monkeypatch):
+    # _ocr_settings() is in page keys, the extract stage's version and the result fingerprint
+    seen = {ocr_utils._ocr_settings()}
+    for flag in ("OCR_LAYOUT_REGIONS", "OCR_TRIM_MARGINS", "OCR_DENOISE", "OCR_DESKEW", "OCR_BINARIZE"):
+        monkeypatch.setattr(ocr_utils, flag, not getattr(ocr_utils, flag))
+        seen.add(ocr_utils._ocr_settings())
+    monkeypatch.setattr(ocr_utils, "OCR_MIN_CONFIDENCE", 70)
+    seen.add(ocr_utils._ocr_settings())
+    monkeypatch.setattr(ocr_utils, "OCR_DPI_LADDER", (300,))
+    seen.add(ocr_utils._ocr_settings())
+
+    assert len(seen) == 8
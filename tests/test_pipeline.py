@@ -0,0 +1,92 @@
+import threading
+
+import pytest
+
+from cache_store import CacheStore, StoreStageCache
+from pipeline import THREAD, Pipeline, PipelineError, Stage
+
+
+def test_stages_run_when_inputs_are_ready():
+    calls = []
+
+    def upper(text):
+        calls.append("upper")
+        return {"upper": text.upper()}
+
+    def load(path):
+        calls.append("load")
+        return {"text": f"text of {path}"}
+
+    pipeline = Pipeline([
+        Stage("upper", upper, inputs=("text",), outputs=("upper",)),
+        Stage("load", load, inputs=("path",), outputs=("text",)),
+    ])
+    values, timings = pipeline.run({"path": "a.pdf"})
+
+    assert values["upper"] == "TEXT OF A.PDF"
+    assert calls == ["load", "upper"]
+    assert set(timings) == {"load", "upper"}
+
+
+def test_thread_stage_runs_alongside_inline_stages():
+    inline_done = threading.Event()
+
+    def side_task(text):
+        # Only finishes if the inline stage was not held up behind it
+        assert inline_done.wait(5)
+        return {"side": len(text)}
+
+    def main_task(text):
+        inline_done.set()
+        return {"main": text}
+
+    pipeline = Pipeline([
+        Stage("side", side_task, inputs=("text",), outputs=("side",), executor=THREAD),
+        Stage("main", main_task, inputs=("text",), outputs=("main",)),
+    ])
+    values, _ = pipeline.run({"text": "abc"})
+
+    assert values["side"] == 3 and values["main"] == "abc"
+
+
+def test_cacheable_stage_is_reused_but_empty_output_is_not(tmp_path):
+    calls = []
+
+    def extract(path):
+        calls.append(path)
+        return {"text": "" if path == "empty.pdf" else "hello"}
+
+    pipeline = Pipeline([Stage("extract", extract, inputs=("path",), outputs=("text",), cacheable=True)])
+    cache = StoreStageCache(CacheStore(tmp_path / "cache.sqlite3"))
+    for _ in range(2):
+        pipeline.run({"path": "a.pdf"}, cache=cache, document_key="a_100")
+        pipeline.run({"path": "empty.pdf"}, cache=cache, document_key="empty_10")
+
+    assert calls == ["a.pdf", "empty.pdf", "empty.pdf"]
+
+
+def test_stage_version_keeps_outputs_for_other_settings_apart(tmp_path):
+    calls = []
+
+    def extract(path):
+        calls.append(path)
+        return {"text": "hello", "pages": []}
+
+    cache = StoreStageCache(CacheStore(tmp_path / "cache.sqlite3"))
+    for settings in ("150-300@80", "150-300@80", "300@80"):
+        stage = Stage("extract", extract, inputs=("path",), outputs=("text", "pages"), cacheable=True, version=f"2:{settings}")
+        Pipeline([stage]).run({"path": "a.pdf"}, cache=cache, document_key="a_100")
+
+    assert calls == ["a.pdf", "a.pdf"]
+
+
+def test_unsatisfiable_stage_raises():
+    pipeline = Pipeline([Stage("orphan", lambda missing: {}, inputs=("missing",))])
+    with pytest.raises(PipelineError):
+        pipeline.run({})
+
+
+def test_duplicate_outputs_are_rejected():
+    pipeline = Pipeline([Stage("a", lambda: {"x": 1}, outputs=("x",))])
+    with pytest.raises(PipelineError):
+        pipeline.register(Stage("b", lambda: {"x": 2}, outputs=("x",)))
@@ -0,0 +1,51 @@
+import threading
+
+from prefetch import Prefetcher
+
+
+def _files(tmp_path, sizes):
+    paths = []
+    for i, size in enumerate(sizes):
+        path = tmp_path / f"doc{i}.pdf"
+        path.write_bytes(bytes([i]) * size)
+        paths.append(path)
+    return paths
+
+
+def test_take_returns_bytes_in_order(tmp_path):
+    paths = _files(tmp_path, [10, 20, 30])
+    prefetcher = Prefetcher(paths, max_ahead=1).start()
+
+    assert [len(prefetcher.take(p)) for p in paths] == [10, 20, 30]
+    assert prefetcher.take(paths[0]) is None
+    prefetcher.close()
+
+
+def test_byte_budget_limits_read_ahead(tmp_path):
+    paths = _files(tmp_path, [40, 40, 40])
+    prefetcher = Prefetcher(paths, byte_budget=100).start()
+    assert prefetcher.take(paths[0]) is not None
+    threading.Event().wait(0.1)
+
+    assert prefetcher._loaded_bytes <= 100
+    assert prefetcher.take(paths[1]) is not None and prefetcher.take(paths[2]) is not None
+    prefetcher.close()
+
+
+def test_oversized_and_missing_files_fall_back_to_path(tmp_path):
+    paths = _files(tmp_path, [500, 5]) + [tmp_path / "missing.pdf"]
+    prefetcher = Prefetcher(paths, max_file_bytes=100).start()
+
+    assert prefetcher.take(paths[0]) is None
+    assert prefetcher.take(paths[1]) == bytes([1]) * 5
+    assert prefetcher.take(paths[2]) is None
+    prefetcher.close()
+
+
+def test_out_of_order_take_does_not_deadlock(tmp_path):
+    paths = _files(tmp_path, [10, 10, 10])
+    prefetcher = Prefetcher(paths, max_ahead=1).start()
+
+    assert prefetcher.take(paths[2]) is None
+    assert prefetcher.take(paths[0]) is not None
+    prefetcher.close()
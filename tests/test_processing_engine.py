@@ -119,3 +119,28 @@ def test_process_zip_archive_calls_process_folder(monkeypatch, tmp_path):
 
     assert isinstance(called["folder"], Path)
     assert called["excel"] == excel
+
+
+def test_identical_pdfs_under_different_names_keep_their_own_results(tmp_path, monkeypatch):
+    from cache_store import CacheStore, StoreStageCache
+
+    store = CacheStore(tmp_path / "cache.sqlite3")
+    monkeypatch.setattr(processing_engine, "CACHE_STORE", store)
+    monkeypatch.setattr(processing_engine, "STAGE_CACHE", StoreStageCache(store))
+    monkeypatch.setattr(processing_engine, "PDF_TXT_DIR", tmp_path)
+    monkeypatch.setattr(processing_engine, "_is_ocr_needed", lambda p, source=None: False)
+    monkeypatch.setattr(processing_engine, "extract_text_from_pdf", lambda p, control=None, source=None, page_cache=None: "QA 2PJ-0001")
+    monkeypatch.setattr(processing_engine, "bulletproof_extraction", lambda text, filename: {"models": "Not Found", "full_qa_number": "2PJ-0001"})
+    first, second = tmp_path / "QA_A.pdf", tmp_path / "QA_B.pdf"
+    first.write_bytes(b"%PDF-1.4 same content")
+    second.write_bytes(b"%PDF-1.4 same content")
+
+    processing_engine.process_single_pdf(first, queue.Queue())
+    result = processing_engine.process_single_pdf(second, queue.Queue())
+
+    assert result["cache"]["hit"]
+    assert result["filename"] == "QA_B.pdf"
+    assert result["review_info"]["filename"] == "QA_B.pdf"
+    assert result["review_info"]["pdf_path"] == str(second)
+    assert "QA 2PJ-0001" in Path(result["review_info"]["txt_path"]).read_text(encoding="utf-8")
+    assert Path(result["review_info"]["txt_path"]).name == "QA_B.pdf.txt"
@@ -9,3 +9,15 @@ def test_increment_run_count(tmp_path, monkeypatch):
     assert temp_file.exists()
     assert run_state.get_run_count() == 1
 
+
+
+def test_record_run_keeps_count_and_history(tmp_path, monkeypatch):
+    monkeypatch.setattr(run_state, 'STATE_FILE', tmp_path / 'state.json')
+    monkeypatch.setattr(run_state, 'MAX_RECORDED_RUNS', 2)
+    run_state.increment_run_count()
+    for hits in (1, 2, 3):
+        run_state.record_run({'cache': {'hits': hits}})
+
+    assert run_state.get_run_count() == 4
+    assert [run['cache']['hits'] for run in run_state.get_recorded_runs()] == [2, 3]
+    assert run_state.get_recorded_runs()[-1]['run'] == 4
@@ -0,0 +1,52 @@
+import pytest
+
+import sharding
+
+
+def test_parse_shard():
+    assert sharding.parse_shard("2/4") == (2, 4)
+    for bad in ("0/4", "5/4", "x/4", "2"):
+        with pytest.raises(ValueError):
+            sharding.parse_shard(bad)
+
+
+def test_select_shard_partitions_by_content(tmp_path):
+    pdfs = []
+    for i in range(12):
+        pdf = tmp_path / f"doc{i}.pdf"
+        pdf.write_bytes(f"content {i}".encode())
+        pdfs.append(pdf)
+
+    shards = [sharding.select_shard(pdfs, index, 3) for index in (1, 2, 3)]
+
+    assert sorted(p.name for shard in shards for p in shard) == sorted(p.name for p in pdfs)
+    # Same content under a different name lands in the same shard
+    renamed = tmp_path / "renamed.pdf"
+    renamed.write_bytes(pdfs[0].read_bytes())
+    home = next(i for i, shard in enumerate(shards, 1) if pdfs[0] in shard)
+    assert sharding.select_shard([renamed], home, 3) == [renamed]
+
+
+def test_partial_results_round_trip(tmp_path):
+    results = {
+        "a.pdf": {"filename": "a.pdf", "models": "PF-740", "status": "Pass", "ocr_used": False, "review_info": None},
+    }
+    first = sharding.write_partial_results(tmp_path / "p1.json", results, (1, 2))
+    second = sharding.write_partial_results(
+        tmp_path / "p2.json",
+        {"b.pdf": {"filename": "b.pdf", "models": "Review Needed", "status": "Needs Review", "ocr_used": True,
+                   "review_info": {"txt_path": "C:/local/b.txt"}}},
+        (2, 2),
+    )
+
+    merged = sharding.load_partial_results([first, second])
+
+    assert set(merged) == {"a.pdf", "b.pdf"}
+    assert "review_info" not in merged["b.pdf"]
+
+
+def test_load_rejects_foreign_json(tmp_path):
+    other = tmp_path / "other.json"
+    other.write_text("{}")
+    with pytest.raises(ValueError):
+        sharding.load_partial_results([other])
@@ -0,0 +1,80 @@
+import ctypes
+
+import pytest
+
+from custom_exceptions import ProcessingCancelled
+from tesseract_api import TesseractEngine
+
+
+class FakeTesseract:
+    """Stands in for libtesseract: records calls and returns text from a C buffer."""
+
+    def __init__(self, init_status=0, words=3):
+        self.init_status = init_status
+        self.words = words
+        self.calls = []
+        self.cancel = None
+        self.text = ctypes.create_string_buffer("Fuser unit\n".encode("utf-8"))
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append(name)
+
+    def TessBaseAPICreate(self):
+        return 1
+
+    def TessBaseAPIInit3(self, handle, datapath, language):
+        self.calls.append(("init", datapath, language))
+        return self.init_status
+
+    def TessBaseAPISetPageSegMode(self, handle, mode):
+        self.calls.append(("psm", mode))
+
+    def TessMonitorCreate(self):
+        return 2
+
+    def TessMonitorSetCancelFunc(self, monitor, cancel):
+        self.cancel = cancel
+
+    def TessBaseAPIRecognize(self, handle, monitor):
+        self.calls.append("recognize")
+        for word in range(self.words):
+            if self.cancel is not None and self.cancel(None, word):
+                return -1
+        return 0
+
+    def TessBaseAPIMeanTextConf(self, handle):
+        return 91
+
+    def TessBaseAPIGetUTF8Text(self, handle):
+        return ctypes.addressof(self.text)
+
+
+def test_engine_is_initialised_once_and_reused_for_every_page():
+    lib = FakeTesseract()
+    engine = TesseractEngine(lib, "/opt/tessdata")
+
+    assert engine.recognize(b"\x00" * 12, 2, 2, 3, 6, dpi=150) == ("Fuser unit\n", 91)
+    assert engine.recognize(b"\x00" * 4, 2, 2, 1, 2) == ("Fuser unit\n", 91)
+    assert lib.calls.count(("init", b"/opt/tessdata", b"eng")) == 1
+    assert lib.calls.index(("psm", 3)) > lib.calls.index(("init", b"/opt/tessdata", b"eng"))
+    assert lib.calls.count("recognize") == 2
+    assert lib.calls.count("TessBaseAPIClear") == 2
+
+    engine.close()
+    with pytest.raises(RuntimeError):
+        engine.recognize(b"\x00", 1, 1, 1, 1)
+
+
+def test_cancel_stops_recognition_between_words():
+    class Control:
+        cancelled = True
+
+    lib = FakeTesseract()
+    with pytest.raises(ProcessingCancelled):
+        TesseractEngine(lib).recognize(b"\x00", 1, 1, 1, 1, Control())
+    assert "TessMonitorDelete" in lib.calls
+
+
+def test_missing_language_data_is_reported():
+    with pytest.raises(RuntimeError):
+        TesseractEngine(FakeTesseract(init_status=-1))
@@ -0,0 +1,115 @@
+import types
+from collections import defaultdict
+from pathlib import Path
+
+import workbook_updater
+from workbook_updater import WorkbookUpdater
+
+
+class FakeSheet:
+    """Just enough of an openpyxl worksheet for WorkbookUpdater."""
+
+    def __init__(self, rows):
+        self.rows = [[types.SimpleNamespace(value=v) for v in row] for row in rows]
+        self.column_dimensions = defaultdict(types.SimpleNamespace)
+
+    @property
+    def max_row(self):
+        return len(self.rows)
+
+    @property
+    def max_column(self):
+        return max(len(row) for row in self.rows)
+
+    def cell(self, row, column):
+        cells = self.rows[row - 1]
+        while len(cells) < column:
+            cells.append(types.SimpleNamespace(value=None))
+        return cells[column - 1]
+
+    def __getitem__(self, row_idx):
+        self.cell(row_idx, self.max_column)
+        return self.rows[row_idx - 1]
+
+    def iter_rows(self):
+        return iter(self.rows)
+
+    def append(self, values):
+        self.rows.append([types.SimpleNamespace(value=v) for v in values])
+
+    def values(self):
+        return [[cell.value for cell in row] for row in self.rows]
+
+
+def _updater(monkeypatch, rows):
+    sheet = FakeSheet(rows)
+    workbook = types.SimpleNamespace(active=sheet, save=lambda path: None)
+    monkeypatch.setattr(workbook_updater.openpyxl, "load_workbook", lambda path: workbook, raising=False)
+    monkeypatch.setattr(workbook_updater, "get_column_letter", lambda idx: "ABCDEFG"[idx - 1])
+    monkeypatch.setattr(workbook_updater, "Alignment", lambda **kw: None)
+    return WorkbookUpdater("clone.xlsx").start(), sheet
+
+
+def _result(filename, models, status="Pass"):
+    return {"filename": filename, "models": models, "author": "", "status": status, "ocr_used": False, "short_description": filename}
+
+
+def test_results_update_matching_rows_and_append_the_rest(monkeypatch):
+    updater, sheet = _updater(monkeypatch, [
+        ["Short description", "Models", "Author"],
+        ["Service bulletin QA_P001", None, None],
+        ["Unrelated row", None, None],
+    ])
+    updater.apply(_result("QA_P001.pdf", "TASKalfa 3554ci"))
+    updater.apply(_result("QA_P999.pdf", "ECOSYS M2540"))
+    updater.finish()
+
+    values = sheet.values()
+    assert values[0][3] == "Processing Status"
+    assert values[1][1:] == ["TASKalfa 3554ci", "", "Pass"]
+    assert values[2][1] is None
+    assert values[3][:2] == ["QA_P999.pdf", "ECOSYS M2540"]
+    assert (updater.updates_made, updater.appends_made) == (1, 1)
+    assert sheet.column_dimensions["A"].width == len("Service bulletin QA_P001") + 2
+
+
+def test_shared_row_goes_to_the_same_pdf_whatever_the_arrival_order(monkeypatch):
+    for order in (("QA_P002.pdf", "QA_P001.pdf"), ("QA_P001.pdf", "QA_P002.pdf")):
+        updater, sheet = _updater(monkeypatch, [
+            ["Short description", "Models", "Author", "Processing Status"],
+            ["QA_P001 and QA_P002", None, None, None],
+        ])
+        for filename in order:
+            updater.apply(_result(filename, f"models of {filename}"))
+        updater.finish()
+
+        assert sheet.values()[1][1] == "models of QA_P001.pdf"
+        assert sheet.values()[2][:2] == ["QA_P002.pdf", "models of QA_P002.pdf"]
+        assert updater.appends_made == 1
+
+
+def test_longest_stem_wins_a_row_when_results_stream_in(monkeypatch):
+    filenames = ["QA_20146_E035.pdf", "QA_20146_E035 LEAFLET_2.pdf"]
+    for order in (filenames, filenames[::-1]):
+        updater, sheet = _updater(monkeypatch, [
+            ["Short description", "Models", "Author", "Processing Status"],
+            ["QA_20146_E035 LEAFLET_2 toner leaflet", None, None, None],
+            ["QA_20146_E035 firmware bulletin", None, None, None],
+        ])
+        updater.expect(filenames)
+        for filename in order:
+            updater.apply(_result(filename, Path(filename).stem))
+        updater.finish()
+
+        assert [row[1] for row in sheet.values()[1:]] == ["QA_20146_E035 LEAFLET_2", "QA_20146_E035"]
+        assert (updater.updates_made, updater.appends_made) == (2, 0)
+
+
+def test_missing_column_is_reported(monkeypatch):
+    updater, _ = _updater(monkeypatch, [["Short description", "Author"]])
+    try:
+        updater.finish()
+    except ValueError as e:
+        assert "Could not find required column" in str(e)
+    else:
+        raise AssertionError("finish() should raise for a missing column")
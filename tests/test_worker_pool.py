@@ -0,0 +1,208 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import worker_pool
+from job_control import JobControl
+
+
+def _fake_task(pdf_path, ignore_cache=False, interactive=False, source=None):
+    return {"filename": pdf_path, "status": "Pass"}, [{"type": "log", "msg": pdf_path}]
+
+
+def _thread_pool(monkeypatch, created):
+    def fake_create(self):
+        executor = ThreadPoolExecutor(max_workers=self.max_workers + worker_pool.INTERACTIVE_WORKERS)
+        created.append(executor)
+        return executor
+
+    monkeypatch.setattr(worker_pool.WorkerPool, "_create_executor", fake_create)
+    monkeypatch.setattr(worker_pool, "process_pdf_task", _fake_task)
+    monkeypatch.setattr(worker_pool, "_commit_cache", lambda: None)
+    monkeypatch.setattr(worker_pool, "_refresh_cache", lambda: None)
+
+
+def test_drain_queue_returns_all_items():
+    q = queue.Queue()
+    for i in range(3):
+        q.put(i)
+    assert worker_pool.drain_queue(q) == [0, 1, 2]
+    assert q.empty()
+
+
+def test_pool_is_reused_across_jobs(monkeypatch):
+    created = []
+    _thread_pool(monkeypatch, created)
+    pool = worker_pool.WorkerPool(max_workers=2)
+
+    first = list(pool.imap_pdfs(["a.pdf", "b.pdf"]))
+    second = list(pool.imap_pdfs(["c.pdf"]))
+
+    assert sorted(r["filename"] for r, _ in first) == ["a.pdf", "b.pdf"]
+    assert second[0][1] == [{"type": "log", "msg": "c.pdf"}]
+    assert len(created) == 1
+    pool.shutdown(wait=True)
+
+
+def test_imap_stops_when_cancelled(monkeypatch):
+    _thread_pool(monkeypatch, [])
+    pool = worker_pool.WorkerPool(max_workers=1)
+    control = JobControl(threading.Event())
+    control.cancel()
+
+    assert list(pool.imap_pdfs(["a.pdf", "b.pdf"], control=control)) == []
+    pool.shutdown(wait=True)
+
+
+def test_crashing_pdf_is_isolated(monkeypatch):
+    created = []
+    _thread_pool(monkeypatch, created)
+
+    def crashing_task(pdf_path, ignore_cache=False, interactive=False, source=None):
+        if pdf_path == "bad.pdf":
+            raise worker_pool.BrokenProcessPool("worker died")
+        return _fake_task(pdf_path, ignore_cache)
+
+    monkeypatch.setattr(worker_pool, "process_pdf_task", crashing_task)
+    pool = worker_pool.WorkerPool(max_workers=2)
+
+    results = {r["filename"]: r for r, _ in pool.imap_pdfs(["good.pdf", "bad.pdf"])}
+
+    assert results["good.pdf"]["status"] == "Pass"
+    assert results["bad.pdf"]["status"] == worker_pool.CRASH_STATUS
+    assert len(created) == 2
+    pool.shutdown(wait=True)
+
+
+def test_interactive_request_jumps_batch_queue(monkeypatch):
+    _thread_pool(monkeypatch, [])
+    order, first_started, release = [], threading.Event(), threading.Event()
+
+    def slow_task(pdf_path, ignore_cache=False, interactive=False, source=None):
+        order.append(pdf_path)
+        if pdf_path == "a.pdf":
+            first_started.set()
+            release.wait(5)
+        return _fake_task(pdf_path, ignore_cache)
+
+    monkeypatch.setattr(worker_pool, "process_pdf_task", slow_task)
+    pool = worker_pool.WorkerPool(max_workers=1)
+    batch = [pool._submit(worker_pool.BATCH_PRIORITY, worker_pool.process_pdf_task, name) for name in ("a.pdf", "b.pdf", "c.pdf")]
+    first_started.wait(5)
+    recheck = pool.submit_interactive("x.pdf")
+    release.set()
+
+    assert recheck.result(5)[0]["filename"] == "x.pdf"
+    for future in batch:
+        future.result(5)
+    assert order == ["a.pdf", "x.pdf", "b.pdf", "c.pdf"]
+    pool.shutdown(wait=True)
+
+
+def test_interactive_request_runs_while_batch_is_paused(monkeypatch):
+    _thread_pool(monkeypatch, [])
+    started = threading.Event()
+    pool = worker_pool.WorkerPool(max_workers=1, control=JobControl(threading.Event()))
+
+    def pausable_task(pdf_path, ignore_cache=False, interactive=False, source=None):
+        if not interactive:
+            started.set()
+            pool.control.check()
+        return _fake_task(pdf_path, ignore_cache)
+
+    monkeypatch.setattr(worker_pool, "process_pdf_task", pausable_task)
+    pool.control.pause()
+    batch = [pool._submit(worker_pool.BATCH_PRIORITY, worker_pool.process_pdf_task, name) for name in ("a.pdf", "b.pdf")]
+    assert started.wait(5)
+
+    recheck = pool.submit_interactive("x.pdf")
+
+    assert recheck.result(5)[0]["filename"] == "x.pdf"
+    assert not batch[0].done()
+    pool.control.resume()
+    assert [future.result(5)[0]["filename"] for future in batch] == ["a.pdf", "b.pdf"]
+    pool.shutdown(wait=True)
+
+
+def test_cheap_pdfs_are_grouped_into_work_units(monkeypatch):
+    monkeypatch.setattr(worker_pool, "_is_cheap_pdf", lambda path: path.startswith("small"))
+    paths = ["small1.pdf", "big.pdf", "small2.pdf", "small3.pdf", "scan.pdf"]
+
+    units = list(worker_pool.plan_work_units(paths, batch_size=2))
+
+    assert units == [("big.pdf",), ("small1.pdf", "small2.pdf"), ("scan.pdf",), ("small3.pdf",)]
+
+
+def test_work_units_are_planned_from_file_size_alone(monkeypatch, tmp_path):
+    monkeypatch.setattr(worker_pool, "SMALL_PDF_BYTES", 10)
+    small, large = tmp_path / "small.pdf", tmp_path / "large.pdf"
+    small.write_bytes(b"not a pdf")
+    large.write_bytes(b"x" * 11)
+    paths = [str(small), str(large), str(tmp_path / "missing.pdf")]
+
+    units = worker_pool.plan_work_units(paths)
+
+    assert next(units) == (str(large),)
+    assert list(units) == [(str(tmp_path / "missing.pdf"),), (str(small),)]
+
+
+def test_crash_inside_work_unit_isolates_each_member(monkeypatch):
+    _thread_pool(monkeypatch, [])
+    monkeypatch.setattr(worker_pool, "_is_cheap_pdf", lambda path: True)
+    batches = []
+
+    def crashing_task(pdf_path, ignore_cache=False, interactive=False, source=None):
+        if pdf_path == "bad.pdf":
+            raise worker_pool.BrokenProcessPool("worker died")
+        return _fake_task(pdf_path, ignore_cache)
+
+    def recording_batch(pdf_paths, ignore_cache=False, sources=None):
+        batches.append(tuple(pdf_paths))
+        return [crashing_task(path, ignore_cache) for path in pdf_paths]
+
+    monkeypatch.setattr(worker_pool, "process_pdf_batch", recording_batch)
+    pool = worker_pool.WorkerPool(max_workers=2)
+
+    results = {r["filename"]: r["status"] for r, _ in pool.imap_pdfs(["a.pdf", "bad.pdf", "c.pdf"])}
+
+    assert results == {"a.pdf": "Pass", "bad.pdf": worker_pool.CRASH_STATUS, "c.pdf": "Pass"}
+    assert batches[0] == ("a.pdf", "bad.pdf", "c.pdf")
+    assert ("bad.pdf",) in batches[1:]
+    pool.shutdown(wait=True)
+
+
+def test_imap_pdfs_runs_the_given_task(monkeypatch):
+    _thread_pool(monkeypatch, [])
+    monkeypatch.setattr(worker_pool, "_is_cheap_pdf", lambda path: True)
+
+    def warm_batch(pdf_paths, ignore_cache=False, sources=None):
+        return [({"filename": path, "status": "Cached"}, []) for path in pdf_paths]
+
+    pool = worker_pool.WorkerPool(max_workers=2)
+    outcomes = [outcome for outcome, _ in pool.imap_pdfs(["a.pdf", "b.pdf"], task=warm_batch)]
+
+    assert sorted(o["filename"] for o in outcomes) == ["a.pdf", "b.pdf"]
+    assert {o["status"] for o in outcomes} == {"Cached"}
+    pool.shutdown(wait=True)
+
+
+
+def test_running_pdfs_drain_announcements_as_they_arrive():
+    import multiprocessing
+
+    running = worker_pool._RunningPdfs(multiprocessing.get_context("spawn").SimpleQueue())
+    # Far more announcements than a pipe buffers, as a long session would send
+    paths = [f"{'long-share-folder-name/' * 10}{i}.pdf" for i in range(2000)]
+
+    def announce():
+        for path in paths:
+            running.channel.put(("start", path))
+            if path != paths[-1]:
+                running.channel.put(("done", path))
+
+    producer = threading.Thread(target=announce, daemon=True)
+    producer.start()
+    producer.join(30)
+
+    assert not producer.is_alive()
+    assert running.stop() == {paths[-1]}
@@ -0,0 +1,199 @@
+# workbook_updater.py
+# Loads the cloned workbook while PDFs are processing and applies results as they arrive
+import queue
+import threading
+from pathlib import Path
+
+import openpyxl
+from openpyxl.styles import PatternFill, Alignment
+from openpyxl.utils import get_column_letter
+
+from config import META_COLUMN_NAME
+
+STATUS_COLUMN_NAME = "Processing Status"
+MAX_COLUMN_WIDTH = 50
+
+_FINISHED = object()
+
+
+def status_text(data: dict) -> str:
+    return f"{data['status']}{' (OCR)' if data['ocr_used'] else ''}"
+
+
+def match_rows(rows, filenames) -> dict:
+    """Maps each PDF to the rows whose description names it, as {filename: [row indexes]}.
+
+    A row belongs to the PDF with the longest stem in its description, so
+    "QA_20146_E035 LEAFLET_2" is not taken by "QA_20146_E035"; equal stems
+    go to the first filename in sorted order.
+    """
+    stems = sorted(((Path(filename).stem, filename) for filename in filenames), key=lambda item: (-len(item[0]), item[1]))
+    owners = {}
+    for row_idx, description in rows:
+        owner = next((filename for stem, filename in stems if stem in description), None)
+        if owner is not None:
+            owners.setdefault(owner, []).append(row_idx)
+    return owners
+
+
+class WorkbookUpdater:
+    """Keeps the cloned workbook open on its own thread for the whole job.
+
+    The workbook is loaded, indexed and formatted as soon as the job starts,
+    results are written to their rows while later PDFs are still processing,
+    and only appending unmatched PDFs and saving are left for the end.
+
+    A row belongs to the PDF whose stem is the longest one found in its short
+    description (see match_rows). Once ``expect`` has named the job's PDFs,
+    rows are matched up front and each result is written as it arrives;
+    results for PDFs that were not announced are matched in ``finish``. Either
+    way the outcome does not depend on the order results arrive in. Column
+    widths only ever grow.
+    """
+
+    def __init__(self, excel_path):
+        self.excel_path = Path(excel_path)
+        self.updates_made = 0
+        self.appends_made = 0
+        self._results = queue.Queue()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="workbook-updater", daemon=True)
+        self._fills = {
+            "Pass": PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid"),
+            "Fail": PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid"),
+            "Review": PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid"),
+        }
+        self._ocr_fill = PatternFill(start_color="DDEBF7", end_color="DDEBF7", fill_type="solid")
+        self._wrap_alignment = Alignment(wrap_text=True, vertical='top')
+
+    def start(self) -> "WorkbookUpdater":
+        self._thread.start()
+        return self
+
+    def expect(self, filenames):
+        """Names the PDFs whose results are coming, so their rows can be written as soon as each arrives."""
+        if self._error is not None:
+            raise self._error
+        self._results.put(("expect", list(filenames)))
+
+    def apply(self, data: dict):
+        """Queues one result for its row; raises at once if the workbook could not be loaded."""
+        if self._error is not None:
+            raise self._error
+        self._results.put(data)
+
+    def abandon(self):
+        """Stops the updater without touching the file, e.g. when the job is cancelled."""
+        self._results.put(_FINISHED)
+
+    def finish(self):
+        """Waits for queued results, then appends PDFs that matched no row and sets column widths."""
+        self._results.put(_FINISHED)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        if self._deferred:
+            owned = {row_idx for rows in self._owners.values() for row_idx in rows}
+            late = match_rows([(row_idx, description) for row_idx, description in self._rows if row_idx not in owned], self._deferred)
+            for filename in sorted(self._deferred):
+                self._write_rows(filename, self._deferred[filename], late.get(filename))
+        for filename in sorted(self._unmatched):
+            data = self._unmatched[filename]
+            new_row = [""] * len(self._headers)
+            new_row[self._desc_col - 1] = data.get("short_description", data["filename"])
+            self.sheet.append(new_row)
+            self._track_width(self._desc_col, new_row[self._desc_col - 1])
+            self._write_row(self.sheet.max_row, data)
+            self.appends_made += 1
+        for col_idx, max_length in self._widths.items():
+            adjusted_width = (max_length + 2) if max_length < MAX_COLUMN_WIDTH else MAX_COLUMN_WIDTH
+            self.sheet.column_dimensions[get_column_letter(col_idx)].width = adjusted_width
+
+    def save(self):
+        self.workbook.save(self.excel_path)
+
+    def _run(self):
+        try:
+            self._load()
+            while True:
+                data = self._results.get()
+                if data is _FINISHED:
+                    return
+                if isinstance(data, tuple):
+                    self._expect(data[1])
+                else:
+                    self._apply(data)
+        except Exception as e:
+            self._error = e
+
+    def _load(self):
+        self.workbook = openpyxl.load_workbook(self.excel_path)
+        self.sheet = self.workbook.active
+        self._headers = [cell.value for cell in self.sheet[1]]
+
+        # Add Processing Status column if it doesn't exist
+        if STATUS_COLUMN_NAME not in self._headers:
+            self.sheet.cell(row=1, column=len(self._headers) + 1).value = STATUS_COLUMN_NAME
+            self._headers.append(STATUS_COLUMN_NAME)
+
+        try:
+            self._desc_col = self._headers.index("Short description") + 1
+            self._meta_col = self._headers.index(META_COLUMN_NAME) + 1
+            self._author_col = self._headers.index("Author") + 1
+            self._status_col = self._headers.index(STATUS_COLUMN_NAME) + 1
+        except ValueError as e:
+            raise ValueError(f"Could not find required column in Excel: {e}")
+
+        self._widths = {col_idx: 0 for col_idx in range(1, self.sheet.max_column + 1)}
+        self._rows = []
+        self._expected = set()
+        self._owners = {}
+        self._deferred = {}
+        self._unmatched = {}
+        for row_idx, row in enumerate(self.sheet.iter_rows(), start=1):
+            for col_idx, cell in enumerate(row, start=1):
+                self._track_width(col_idx, cell.value)
+            if row_idx > 1:
+                self._format_row(row_idx)
+                self._rows.append((row_idx, str(row[self._desc_col - 1].value or "")))
+
+    def _expect(self, filenames):
+        self._expected.update(filenames)
+        self._owners = match_rows(self._rows, self._expected)
+
+    def _apply(self, data: dict):
+        filename = data["filename"]
+        if filename in self._expected:
+            self._write_rows(filename, data, self._owners.get(filename))
+        else:
+            self._deferred[filename] = data
+
+    def _write_rows(self, filename: str, data: dict, rows):
+        if not rows:
+            self._unmatched[filename] = data
+            return
+        for row_idx in rows:
+            self._write_row(row_idx, data)
+            self.updates_made += 1
+
+    def _write_row(self, row_idx: int, data: dict):
+        for col_idx, value in ((self._meta_col, data["models"]), (self._author_col, data.get("author", "")), (self._status_col, status_text(data))):
+            self.sheet.cell(row=row_idx, column=col_idx).value = value
+            self._track_width(col_idx, value)
+        self._format_row(row_idx)
+
+    def _format_row(self, row_idx: int):
+        row = self.sheet[row_idx]
+        status_val = str(row[self._status_col - 1].value or "")
+        fill_to_apply = next((fill for word, fill in self._fills.items() if word in status_val), None)
+        for cell in row:
+            if fill_to_apply:
+                cell.fill = fill_to_apply
+            cell.alignment = self._wrap_alignment
+        if "OCR" in status_val:
+            row[self._status_col - 1].fill = self._ocr_fill
+
+    def _track_width(self, col_idx: int, value):
+        length = len(str(value or ""))
+        if length > self._widths.get(col_idx, 0):
+            self._widths[col_idx] = length
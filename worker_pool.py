@@ -0,0 +1,487 @@
+# worker_pool.py
+# Persistent, pre-warmed worker processes shared by every job in a session
+import os
+import queue
+import itertools
+import threading
+import multiprocessing
+import multiprocessing.connection
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from pathlib import Path
+
+from custom_exceptions import ProcessingCancelled
+from job_control import JobControl
+from prefetch import Prefetcher
+from logging_utils import setup_logger, log_info, log_warning, log_error
+
+logger = setup_logger("worker_pool")
+
+CRASH_STATUS = "Fail (crash)"
+
+# Lower numbers are dispatched first
+BATCH_PRIORITY = 10
+# Workers beyond max_workers that batch work never uses, so a re-check runs even while the batch is paused
+INTERACTIVE_WORKERS = 1
+
+# Small PDFs are grouped so one task's IPC covers several of them
+MICRO_BATCH_SIZE = 8
+SMALL_PDF_BYTES = 256 * 1024
+
+# Inside a worker: the channel used to announce which PDF it is working on,
+# and the session's cancel/pause token shared with the parent
+_running_channel = None
+_worker_control = None
+# Set while a work unit runs, so its PDFs' cache writes are committed together
+_in_work_unit = False
+
+
+def default_worker_count() -> int:
+    """Leaves one core free for the GUI and the Excel update."""
+    return max(1, min(4, (os.cpu_count() or 2) - 1))
+
+
+def drain_queue(event_queue) -> list:
+    """Empties a queue into a list without blocking."""
+    events = []
+    while True:
+        try:
+            events.append(event_queue.get_nowait())
+        except queue.Empty:
+            return events
+
+
+def crash_result(pdf_path) -> tuple:
+    """Builds the result reported for a PDF that killed its worker process."""
+    filename = Path(pdf_path).name
+    result = {"filename": filename, "models": "Error: Processing crashed", "author": "", "status": CRASH_STATUS, "ocr_used": False}
+    events = [
+        {"type": "log", "tag": "error", "msg": f"Worker crashed while processing {filename}. Marked as {CRASH_STATUS}."},
+        {"type": "file_complete", "status": CRASH_STATUS},
+    ]
+    return result, events
+
+
+def _is_cheap_pdf(pdf_path) -> bool:
+    try:
+        return os.path.getsize(pdf_path) <= SMALL_PDF_BYTES
+    except OSError:
+        return False
+
+
+def plan_work_units(pdf_paths, batch_size: int = MICRO_BATCH_SIZE):
+    """Yields work units: PDFs up to SMALL_PDF_BYTES in groups of ``batch_size``, the rest alone.
+
+    Planning only looks at file sizes. No PDF is opened in the engine
+    process, so a file that crashes MuPDF still only takes down a worker,
+    and each unit can be dispatched as soon as it is planned.
+    """
+    cheap = []
+    for pdf_path in pdf_paths:
+        if batch_size > 1 and _is_cheap_pdf(pdf_path):
+            cheap.append(pdf_path)
+            if len(cheap) == batch_size:
+                yield tuple(cheap)
+                cheap = []
+        else:
+            yield (pdf_path,)
+    if cheap:
+        yield tuple(cheap)
+
+
+def _with_sources(prefetcher, unit, ignore_cache) -> tuple:
+    """Builds a work unit's task arguments with whatever bytes have been read ahead."""
+    return unit, ignore_cache, [prefetcher.take(path) for path in unit]
+
+
+def _exit_with_parent():
+    """Blocks until the process that owns the pool dies, then exits instead of lingering as an orphan."""
+    parent = multiprocessing.parent_process()
+    if parent is not None:
+        multiprocessing.connection.wait([parent.sentinel])
+        os._exit(1)
+
+
+def lower_process_priority():
+    """Drops this process (and the tesseract processes it starts) below normal CPU priority."""
+    try:
+        if os.name == "nt":
+            import ctypes
+
+            BELOW_NORMAL_PRIORITY_CLASS = 0x4000
+            kernel32 = ctypes.windll.kernel32
+            kernel32.SetPriorityClass(kernel32.GetCurrentProcess(), BELOW_NORMAL_PRIORITY_CLASS)
+        else:
+            os.nice(10)
+    except (OSError, AttributeError) as e:
+        log_warning(logger, f"Could not lower process priority: {e}")
+
+
+def _warm_worker(running_channel=None, control=None, low_priority=False):
+    """Pool initializer: pays the import, regex and Tesseract probe cost once per worker."""
+    global _running_channel, _worker_control
+    _running_channel = running_channel
+    _worker_control = control
+    if low_priority:
+        lower_process_priority()
+    threading.Thread(target=_exit_with_parent, name="parent-watch", daemon=True).start()
+    import data_harvesters  # noqa: F401 - compiles the harvest patterns on import
+    import ocr_utils  # noqa: F401 - reuses the parent's Tesseract location
+    import processing_engine  # noqa: F401
+
+
+def _worker_pid() -> int:
+    return os.getpid()
+
+
+def _commit_cache():
+    from processing_engine import CACHE_STORE
+
+    CACHE_STORE.flush()
+
+
+def _refresh_cache():
+    """Drops this worker's in-memory cache entries if another process deleted entries since the last work unit."""
+    from processing_engine import CACHE_STORE
+
+    CACHE_STORE.refresh()
+
+
+@contextmanager
+def _announced(pdf_path: str):
+    """Tells the parent this worker is on ``pdf_path`` until the block ends, so a crash can be pinned on it."""
+    if _running_channel is None:
+        yield
+        return
+    # SimpleQueue writes straight to the pipe, so the parent sees this even if MuPDF kills us next
+    _running_channel.put(("start", pdf_path))
+    try:
+        yield
+    finally:
+        _running_channel.put(("done", pdf_path))
+
+
+def process_pdf_task(pdf_path: str, ignore_cache: bool = False, interactive: bool = False, source: bytes = None):
+    """Processes one PDF inside a worker and returns its result with the progress events it produced.
+
+    Interactive requests ignore the batch's pause and cancel. ``source`` is
+    the file's prefetched bytes, if any. Cache writes are committed before
+    the result is returned, unless the PDF is part of a work unit.
+    """
+    from processing_engine import process_single_pdf
+
+    events = queue.Queue()
+    control = None if interactive else _worker_control
+    if not _in_work_unit:
+        _refresh_cache()
+    try:
+        with _announced(pdf_path):
+            result = process_single_pdf(Path(pdf_path), events, ignore_cache=ignore_cache, control=control, source=source)
+    finally:
+        if not _in_work_unit:
+            _commit_cache()
+    return result, drain_queue(events)
+
+
+def process_pdf_batch(pdf_paths, ignore_cache: bool = False, sources=None) -> list:
+    """Processes a work unit of PDFs in one task and returns a (result, events) pair for each.
+
+    The unit's cache writes are committed together in one transaction.
+    """
+    global _in_work_unit
+    sources = sources or [None] * len(pdf_paths)
+    _refresh_cache()
+    _in_work_unit = True
+    try:
+        return [process_pdf_task(pdf_path, ignore_cache, False, source) for pdf_path, source in zip(pdf_paths, sources)]
+    finally:
+        _in_work_unit = False
+        _commit_cache()
+
+
+def warm_pdf_batch(pdf_paths, ignore_cache: bool = False, sources=None) -> list:
+    """Fills the text cache for a work unit without harvesting or writing any result.
+
+    Returns (outcome, events) pairs shaped like process_pdf_batch's, so the
+    pool's crash handling applies unchanged. ``ignore_cache`` re-extracts
+    text that is already cached.
+    """
+    from processing_engine import warm_text_cache
+
+    sources = sources or [None] * len(pdf_paths)
+    _refresh_cache()
+    try:
+        outcomes = []
+        for pdf_path, source in zip(pdf_paths, sources):
+            with _announced(pdf_path):
+                outcomes.append((warm_text_cache(Path(pdf_path), source, _worker_control, refresh=ignore_cache), []))
+        return outcomes
+    finally:
+        _commit_cache()
+
+
+class _RunningPdfs:
+    """The PDFs an executor's workers are on, kept current by reading their announcements as they arrive.
+
+    The channel is drained continuously on a thread, so workers never block
+    on a full pipe however many PDFs a session goes through.
+    """
+
+    def __init__(self, channel):
+        self.channel = channel
+        self._paths = set()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._read, name="worker-pool-running", daemon=True)
+        self._thread.start()
+
+    def _read(self):
+        while True:
+            try:
+                message = self.channel.get()
+            except (EOFError, OSError):
+                return
+            if message is None:
+                return
+            kind, pdf_path = message
+            with self._lock:
+                if kind == "start":
+                    self._paths.add(pdf_path)
+                else:
+                    self._paths.discard(pdf_path)
+
+    def paths(self) -> set:
+        with self._lock:
+            return set(self._paths)
+
+    def stop(self, timeout: float = 5.0) -> set:
+        """Stops reading once every announcement already sent is in, and returns the PDFs still running."""
+        self.channel.put(None)
+        self._thread.join(timeout)
+        return self.paths()
+
+
+class WorkerPool:
+    """A process pool that is created once and reused by every Start and Re-run.
+
+    Each PDF runs in a supervised child process. If a worker dies inside native
+    code the pool is recycled and only the document that caused it is failed.
+    ``control`` is handed to every worker, so cancelling or pausing it reaches
+    documents that are already being processed.
+
+    Batch work is held in a priority queue and handed to the executor only
+    when one of ``max_workers`` slots is free. Interactive requests skip the
+    queue and run on a worker kept aside for them, so they never wait behind
+    the batch, even while it is paused.
+    """
+
+    def __init__(self, max_workers: int | None = None, control: JobControl | None = None, low_priority: bool = False):
+        self.max_workers = max_workers or default_worker_count()
+        self.control = control or JobControl.for_processes()
+        self.low_priority = low_priority
+        self._executor = None
+        self._running = None
+        self._crashed_running = set()
+        self._lock = threading.Lock()
+        self._pending = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._free_slots = threading.Semaphore(self.max_workers)
+        self._dispatcher = None
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        import ocr_utils
+
+        # Spawned workers inherit the environment, so they skip the Tesseract probe
+        os.environ.setdefault(ocr_utils.TESSERACT_CMD_ENV, ocr_utils.get_tesseract_cmd())
+        mp_context = multiprocessing.get_context("spawn")
+        self._running = _RunningPdfs(mp_context.SimpleQueue())
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers + INTERACTIVE_WORKERS,
+            mp_context=mp_context,
+            initializer=_warm_worker,
+            initargs=(self._running.channel, self.control, self.low_priority),
+        )
+
+    def _ensure_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._create_executor()
+            return self._executor
+
+    def start(self) -> "WorkerPool":
+        """Starts every worker and blocks until all of them have warmed up."""
+        executor = self._ensure_executor()
+        pings = [executor.submit(_worker_pid) for _ in range(self.max_workers + INTERACTIVE_WORKERS)]
+        pids = {ping.result() for ping in pings}
+        log_info(logger, f"Worker pool ready: {len(pids)} warm worker process(es)")
+        return self
+
+    def start_in_background(self) -> threading.Thread:
+        """Warms the pool without blocking the caller (e.g. the Tk main loop)."""
+        def _start():
+            try:
+                self.start()
+            except Exception as e:
+                log_warning(logger, f"Worker pool warm-up failed: {e}")
+
+        thread = threading.Thread(target=_start, name="worker-pool-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def _submit(self, priority: int, fn, *args, prepare=None) -> Future:
+        """Queues a task; the dispatcher hands it to a worker as soon as one is free.
+
+        ``prepare``, if given, is called at dispatch time and returns the
+        task's arguments, so prefetched bytes are only claimed when needed.
+        """
+        future = Future()
+        self._pending.put((priority, next(self._sequence), fn, args, prepare, future))
+        with self._lock:
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch_loop, name="worker-pool-dispatch", daemon=True)
+                self._dispatcher.start()
+        return future
+
+    def submit_interactive(self, pdf_path, ignore_cache: bool = True) -> Future:
+        """Runs one PDF ahead of any queued batch work, e.g. a re-check from the Review window.
+
+        The future resolves to (result, events) and is unaffected by the
+        batch's pause and cancel. It bypasses the batch slots, so the reserved
+        worker picks it up even when every batch worker is paused.
+        """
+        future = Future()
+        future.set_running_or_notify_cancel()
+        self._hand_off(future, process_pdf_task, (str(pdf_path), ignore_cache, True), holds_slot=False)
+        return future
+
+    def _dispatch_loop(self):
+        while True:
+            self._free_slots.acquire()
+            _, _, fn, args, prepare, future = self._pending.get()
+            if not future.set_running_or_notify_cancel():
+                self._free_slots.release()
+                continue
+            self._hand_off(future, fn, args, prepare=prepare)
+
+    def _hand_off(self, future: Future, fn, args, prepare=None, holds_slot: bool = True):
+        """Submits a task to the executor and resolves ``future`` with its outcome."""
+        try:
+            if prepare is not None:
+                args = prepare()
+            executor = self._ensure_executor()
+            task = executor.submit(fn, *args)
+        except Exception as e:
+            if holds_slot:
+                self._free_slots.release()
+            future.set_exception(e)
+            return
+        task.add_done_callback(lambda done, used=executor: self._task_done(future, used, done, holds_slot))
+
+    def _task_done(self, future: Future, executor, task, holds_slot: bool = True):
+        if holds_slot:
+            self._free_slots.release()
+        if task.cancelled():
+            # Only a recycle or shutdown cancels work inside the executor; let imap_pdfs queue it again
+            future.set_exception(BrokenProcessPool("The worker pool was recycled before this work unit started."))
+            return
+        error = task.exception()
+        if error is None:
+            future.set_result(task.result())
+            return
+        if isinstance(error, BrokenProcessPool):
+            self._recycle(executor)
+        future.set_exception(error)
+
+    def _recycle(self, executor):
+        """Discards a broken executor, remembering which PDFs its workers were still on."""
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+            running, self._running = self._running, None
+        if running is not None:
+            still_running = running.stop()
+            with self._lock:
+                self._crashed_running.update(still_running)
+        executor.shutdown(wait=False, cancel_futures=True)
+        log_warning(logger, "A worker process died; the worker pool has been recycled.")
+
+    def _take_crash_suspects(self, broken: list) -> set:
+        """Returns the broken PDFs that were actually running when a worker died."""
+        with self._lock:
+            suspects = self._crashed_running.intersection(broken)
+            self._crashed_running.difference_update(broken)
+        return suspects or set(broken)
+
+    def _run_isolated(self, pdf_path: str, ignore_cache: bool, task=None):
+        """Re-runs a suspect PDF on its own so a second crash can be pinned on it."""
+        try:
+            return self._submit(BATCH_PRIORITY, task or process_pdf_batch, (pdf_path,), ignore_cache).result()[0]
+        except ProcessingCancelled:
+            return None
+        except BrokenProcessPool:
+            log_error(logger, f"{Path(pdf_path).name} crashed its worker process.")
+            return crash_result(pdf_path)
+
+    def imap_pdfs(self, pdf_paths, ignore_cache: bool = False, control: JobControl | None = None, task=None):
+        """Yields (result, events) for each PDF as soon as its work unit finishes.
+
+        ``task`` runs one work unit in a worker and defaults to
+        process_pdf_batch; warm_pdf_batch only fills the text cache.
+
+        Small PDFs travel in micro-batches (see plan_work_units); large ones
+        are sent one at a time, each as soon as it is planned. When a worker crashes,
+        every unfinished unit fails with BrokenProcessPool. PDFs that had not
+        been picked up yet are simply queued again; those that had are retried
+        one at a time, and one that crashes alone becomes "Fail (crash)".
+        Iteration stops as soon as ``control`` (by default the pool's own)
+        is cancelled.
+        """
+        control = control or self.control
+        task = task or process_pdf_batch
+        queued = [str(p) for p in pdf_paths]
+        while queued:
+            prefetcher = Prefetcher(queued).start()
+            futures = {}
+            broken = []
+            try:
+                for unit in plan_work_units(queued):
+                    futures[self._submit(BATCH_PRIORITY, task, unit, ignore_cache, prepare=partial(_with_sources, prefetcher, unit, ignore_cache))] = unit
+                for future in as_completed(futures):
+                    if control.cancelled:
+                        return
+                    try:
+                        outcomes = future.result()
+                    except ProcessingCancelled:
+                        return
+                    except BrokenProcessPool:
+                        broken.extend(futures[future])
+                        continue
+                    yield from outcomes
+            finally:
+                for future in futures:
+                    future.cancel()
+                prefetcher.close()
+            if not broken:
+                return
+
+            suspects = self._take_crash_suspects(broken)
+            queued = [path for path in broken if path not in suspects]
+            for path in broken:
+                if path not in suspects:
+                    continue
+                outcome = None if control.cancelled else self._run_isolated(path, ignore_cache, task)
+                if outcome is None:
+                    return
+                yield outcome
+
+    def shutdown(self, wait: bool = False):
+        """Stops the worker processes; the pool can be started again afterwards."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            running, self._running = self._running, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+        if running is not None:
+            running.stop()